@@ -0,0 +1,5 @@
+"""Client benchmarks against a local mock of the getimg API.
+
+Run `python -m bench` for the full suite, `python -m bench.server` to serve
+the mock API on its own.
+"""
@@ -0,0 +1,86 @@
+import sys
+import typing
+import argparse
+import tempfile
+from pathlib import Path
+
+from core.logger import logger, setup_logger
+from bench.server import MockOptions, MockServer
+from bench.suite import SCENARIOS, Bench, compare, format_comparison, format_results, load_results, save_results
+
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Benchmark the client against a local mock getimg server",
+    )
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("-n", "--count", type=int, default=20, help="operations per round")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="requests in flight for batch and concurrent")
+    parser.add_argument("-r", "--rounds", type=int, default=3, help="timed rounds per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed rounds before measuring")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc round")
+    parser.add_argument("--real-limits", action="store_true", help="use the rate limits from config.toml")
+
+    server = parser.add_argument_group("mock server")
+    server.add_argument("--latency", type=float, default=MockOptions.latency, help="seconds before each response")
+    server.add_argument("--jitter", type=float, default=MockOptions.jitter, help="standard deviation of the latency")
+    server.add_argument("--error-rate", type=float, default=MockOptions.error_rate, help="fraction of 500 responses")
+    server.add_argument("--throttle-rate", type=float, default=MockOptions.throttle_rate, help="fraction of 429 responses")
+    server.add_argument("--image-size", type=int, default=MockOptions.image_size, help="side of generated images")
+    server.add_argument("--bandwidth", type=float, default=MockOptions.bandwidth, help="response bytes per second, 0 for unlimited")
+
+    results = parser.add_argument_group("results")
+    results.add_argument("-o", "--output", type=Path, help="results file (default: bench/results/<time>-<version>.json)")
+    results.add_argument("--compare", help="baseline results file, or `latest` for the newest saved run")
+    results.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression")
+    results.add_argument("--no-save", action="store_true", help="do not store the results")
+    parser.add_argument("--debug", action="store_true", help="show client logging")
+
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    return args
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    args = parse_args(argv)
+    setup_logger(args.debug)
+    if not args.debug:
+        logger.disable("core")
+
+    baseline = load_results(args.compare) if args.compare else None
+    options = MockOptions(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, image_size=args.image_size, bandwidth=args.bandwidth,
+    )
+
+    with tempfile.TemporaryDirectory(prefix="image_generator_bench_") as workdir, MockServer(options) as server:
+        bench = Bench(
+            server, workdir,
+            count=args.count, concurrency=args.concurrency, rounds=args.rounds,
+            warmup=args.warmup, memory=not args.no_memory, real_limits=args.real_limits,
+        )
+        results = bench.run_all(args.scenarios or SCENARIOS)
+
+    print(format_results(results))
+    if not args.no_save:
+        print(f"Saved to {save_results(results, args.output)}")
+
+    invalid = [name for name, result in results["results"].items() if not result["valid"]]
+    if invalid:
+        print(f"\nInvalid scenarios, their operations raised: {', '.join(invalid)}")
+
+    if baseline is not None:
+        rows = compare(baseline, results, args.threshold)
+        print(f"\nCompared with {baseline['meta']['version']}:")
+        print(format_comparison(rows))
+        if any(row[-1] for row in rows):
+            return 1
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import sys
+import json
+import time
+import zlib
+import base64
+import random
+import struct
+import typing
+import argparse
+import threading
+import contextlib
+import dataclasses
+import http.server
+from urllib.parse import urlparse
+
+from core.constants import URLs
+
+
+ENDPOINTS = {
+    urlparse(URLs.TEXT_TO_IMAGE).path: "text-to-image",
+    urlparse(URLs.CONTROL_NET).path: "controlnet",
+    urlparse(URLs.UP_SCALE).path: "upscale",
+    urlparse(URLs.FACE_FIX).path: "face-fix",
+}
+
+
+def make_png(width: int, height: int, seed: int = 0) -> bytes:
+    """RGB noise PNG, incompressible so it is as large as a real render"""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+
+@dataclasses.dataclass
+class MockOptions:
+    latency: float = 0.05
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    image_size: int = 512
+    bandwidth: float = 0.0
+    chunk_size: int = 64 * 1024
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("content-length") or 0)
+        body = self.rfile.read(length) if length else b""
+        endpoint = ENDPOINTS.get(self.path.rstrip("/"))
+        options = self.server.options
+        self.server.count(requests=1, bytes_in=len(body))
+
+        if endpoint is None:
+            return self.send_json(404, {"error": {"code": "not_found", "message": self.path}})
+        if not self.headers.get("authorization", "").startswith("Bearer "):
+            return self.send_json(401, {"error": {"code": "unauthorized"}})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.send_json(400, {"error": {"code": "invalid_json"}})
+
+        time.sleep(max(0.0, random.gauss(options.latency, options.jitter) if options.jitter else options.latency))
+
+        roll = random.random()
+        if roll < options.throttle_rate:
+            return self.send_json(429, {"error": {"code": "rate_limit_exceeded"}}, {"retry-after": "0"})
+        if roll < options.throttle_rate + options.error_rate:
+            return self.send_json(500, {"error": {"code": "internal_error"}})
+
+        seed = payload.get("seed") or random.randint(1, 2 ** 31)
+        image = self.server.image(*self.image_size(endpoint, payload))
+        self.send_json(200, {"image": image, "seed": seed, "cost": 0.0})
+
+    def image_size(self, endpoint: str, payload: typing.Dict) -> typing.Tuple[int, int]:
+        size = self.server.options.image_size
+        if endpoint == "upscale":
+            return size * (payload.get("scale") or 4), size * (payload.get("scale") or 4)
+        return payload.get("width") or size, payload.get("height") or size
+
+    def send_json(self, status: int, body: typing.Dict, headers: typing.Optional[typing.Dict[str, str]] = None) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        options = self.server.options
+        for start in range(0, len(content), options.chunk_size):
+            data = content[start:start + options.chunk_size]
+            self.wfile.write(data)
+            if options.bandwidth:
+                time.sleep(len(data) / options.bandwidth)
+        self.server.count(errors=int(status >= 400), bytes_out=len(content))
+
+    def log_message(self, format: str, *args: typing.Any) -> None:
+        pass
+
+
+class MockServer(http.server.ThreadingHTTPServer):
+    """Local stand-in for the four getimg endpoints in `URLs`.
+
+    Latency, error rates and image size are set through `MockOptions`,
+    images are random noise PNGs generated once per size and reused.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, options: typing.Optional[MockOptions] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), MockHandler)
+        self.options = options or MockOptions()
+        self.stats: typing.Dict[str, int] = {"requests": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0}
+
+        self._lock = threading.Lock()
+        self._images: typing.Dict[typing.Tuple[int, int], str] = {}
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def image(self, width: int, height: int) -> str:
+        with self._lock:
+            if (width, height) not in self._images:
+                self._images[width, height] = base64.b64encode(make_png(width, height)).decode()
+            return self._images[width, height]
+
+    def handle_error(self, request: typing.Any, client_address: typing.Any) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, **values: int) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-getimg", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.stop()
+
+    @contextlib.contextmanager
+    def redirect(self) -> typing.Iterator[None]:
+        """Route every generator to this server instead of api.getimg.ai"""
+        from core.api.backends import Backend, BackendRouter, get_backend_router, set_backend_router
+
+        original = get_backend_router()
+        set_backend_router(BackendRouter([Backend("mock", self.url)]))
+        try:
+            yield
+        finally:
+            set_backend_router(original)
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.server", description="Serve the mock getimg API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=MockOptions.latency, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=MockOptions.jitter, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=MockOptions.error_rate, help="fraction of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=MockOptions.throttle_rate, help="fraction of 429 responses")
+    parser.add_argument("--image-size", type=int, default=MockOptions.image_size, help="side of generated images")
+    parser.add_argument("--bandwidth", type=float, default=MockOptions.bandwidth, help="response bytes per second, 0 for unlimited")
+    args = parser.parse_args(argv)
+
+    options = MockOptions(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, image_size=args.image_size, bandwidth=args.bandwidth,
+    )
+    server = MockServer(options, port=args.port)
+    print(f"Serving mock getimg API on {server.url}")
+    for path in ENDPOINTS:
+        print(f"  {server.url}{path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+import os
+import sys
+import json
+import time
+import typing
+import asyncio
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import dataclasses
+from pathlib import Path
+
+from bench.server import MockServer, make_png
+from core.history import HistoryIndex, set_history
+from core.journal import set_journal
+from core.api.body import ImageFile
+from core.api.cache import set_cache
+from core.api.metrics import Metrics, set_metrics
+from core.api.limiter import RateLimiter, set_rate_limiter
+from core.api.transport import Transport, set_transport
+
+
+RESULTS_DIR = Path(__file__).parent.joinpath("results")
+PROMPT = "a lighthouse on a cliff at dusk, oil painting"
+
+Scenario = typing.Callable[["Context"], typing.Optional[typing.List[float]]]
+SCENARIOS: typing.Dict[str, Scenario] = {}
+
+
+def scenario(name: str) -> typing.Callable[[Scenario], Scenario]:
+    def register(func: Scenario) -> Scenario:
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+@dataclasses.dataclass
+class Context:
+    server: MockServer
+    workdir: Path
+    count: int
+    concurrency: int
+    round: int = 0
+    exceptions: int = 0
+    first_exception: typing.Optional[str] = None
+
+    _inputs: typing.Dict[int, ImageFile] = dataclasses.field(default_factory=dict)
+    _window: typing.Any = None
+
+    def fail(self, error: BaseException) -> None:
+        """Count an operation that raised instead of finishing"""
+        self.exceptions += 1
+        if self.first_exception is None:
+            self.first_exception = f"{type(error).__name__}: {error}"
+
+    def output_dir(self, name: str) -> Path:
+        directory = self.workdir.joinpath("out", f"{name}-{self.round}")
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    def input_image(self, size: int = 256) -> ImageFile:
+        if size not in self._inputs:
+            path = self.workdir.joinpath(f"input-{size}.png")
+            path.write_bytes(make_png(size, size, seed=1))
+            self._inputs[size] = ImageFile(path)
+        return self._inputs[size]
+
+    def preview_files(self) -> typing.List[str]:
+        directory = self.workdir.joinpath("previews")
+        if not directory.exists():
+            directory.mkdir()
+            for index in range(self.count):
+                size = self.server.options.image_size
+                directory.joinpath(f"{index}.png").write_bytes(make_png(size, size, seed=index))
+        return sorted(str(path) for path in directory.iterdir())
+
+    def main_window(self) -> typing.Any:
+        if self._window is None:
+            if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+                os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            from PyQt5 import QtWidgets
+            from core.gui.window import MainWindow
+
+            self._app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([sys.argv[0]])
+            self._window = MainWindow()
+        return self._window
+
+
+@scenario("generate_image")
+def bench_generate_image(ctx: Context) -> None:
+    from core.api.generators import TextToImage
+
+    for _ in range(ctx.count):
+        try:
+            TextToImage(PROMPT).generate_image()
+        except Exception as e:
+            ctx.fail(e)
+
+
+@scenario("generate_file")
+def bench_generate_file(ctx: Context) -> None:
+    from core.api.generators import TextToImage
+
+    directory = ctx.output_dir("generate_file")
+    for _ in range(ctx.count):
+        try:
+            TextToImage(PROMPT).generate_file(directory)
+        except Exception as e:
+            ctx.fail(e)
+
+
+@scenario("upscale_file")
+def bench_upscale_file(ctx: Context) -> None:
+    from core.api.generators import UpScale
+
+    directory = ctx.output_dir("upscale_file")
+    for _ in range(ctx.count):
+        try:
+            UpScale(ctx.input_image(), scale=2).generate_file(directory)
+        except Exception as e:
+            ctx.fail(e)
+
+
+@scenario("batch")
+def bench_batch(ctx: Context) -> None:
+    from core.api.batch import generate_variants
+    from core.api.generators import TextToImage
+
+    try:
+        for _ in generate_variants(TextToImage, ctx.count, seed=ctx.round * ctx.count + 1, concurrency=ctx.concurrency, prompt=PROMPT):
+            pass
+    except Exception as e:
+        ctx.fail(e)
+
+
+@scenario("concurrent")
+def bench_concurrent(ctx: Context) -> None:
+    from core.api.async_generators import AsyncTextToImage, gather_images, close_async_transport
+
+    async def run() -> None:
+        try:
+            jobs = [AsyncTextToImage(PROMPT) for _ in range(ctx.count)]
+            for result in await gather_images(jobs, ctx.concurrency, return_exceptions=True):
+                if isinstance(result, BaseException):
+                    ctx.fail(result)
+        finally:
+            await close_async_transport()
+
+    asyncio.run(run())
+
+
+@scenario("preview")
+def bench_preview(ctx: Context) -> typing.List[float]:
+    from core.gui.jobs import load_preview
+
+    window = ctx.main_window()
+    latencies = []
+    for filename in ctx.preview_files():
+        start = time.perf_counter()
+        window.leftImgPath = filename
+        window.show_preview(filename, load_preview(filename))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def quantile(values: typing.Sequence[float], q: float) -> typing.Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def git_version() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
+class Bench:
+    """Runs scenarios against a MockServer with isolated client state.
+
+    Cache and journal are off, history and metrics live in `workdir`, and
+    the rate limiter only caps concurrency unless `real_limits` is set, so
+    timings reflect the client and the mock server, nothing else. Every
+    round gets a fresh Metrics so phase breakdowns are per round.
+    """
+
+    def __init__(
+        self,
+        server: MockServer,
+        workdir: os.PathLike,
+        *,
+        count: int = 20,
+        concurrency: int = 4,
+        rounds: int = 3,
+        warmup: int = 1,
+        memory: bool = True,
+        real_limits: bool = False,
+    ) -> None:
+        self.server = server
+        self.ctx = Context(server, Path(workdir), count, concurrency)
+        self.rounds = rounds
+        self.warmup = warmup
+        self.memory = memory
+
+        key_path = self.ctx.workdir.joinpath("api.key")
+        key_path.write_text("bench")
+        set_transport(Transport(key_path=key_path, pool_maxsize=max(concurrency, Transport.POOL_MAXSIZE)))
+        set_cache(None)
+        set_journal(None)
+        set_history(HistoryIndex(self.ctx.workdir.joinpath("history.sqlite3")))
+        if real_limits:
+            set_rate_limiter(RateLimiter.from_config())
+        else:
+            set_rate_limiter(RateLimiter(rate=1e9, burst=count, concurrency=concurrency))
+
+    def _round(self, func: Scenario) -> typing.Tuple[float, typing.List[float], typing.List[typing.Dict]]:
+        """Time one round, operations that raise are counted in the context"""
+        metrics = Metrics(
+            export_path=self.ctx.workdir.joinpath("metrics.prom"),
+            export_interval=float("inf"),
+            keep=self.ctx.count * 4,
+        )
+        set_metrics(metrics)
+        start = time.perf_counter()
+        latencies = func(self.ctx)
+        elapsed = time.perf_counter() - start
+        self.ctx.round += 1
+
+        records = metrics.to_json()["recent"]
+        if latencies is None:
+            latencies = [record["phases"]["total"] for record in records]
+        return elapsed, latencies, records
+
+    def run(self, name: str) -> typing.Dict:
+        func = SCENARIOS[name]
+        with self.server.redirect():
+            for _ in range(self.warmup):
+                self._round(func)
+            self.ctx.exceptions, self.ctx.first_exception = 0, None
+
+            rounds, latencies, records = [], [], []
+            for _ in range(self.rounds):
+                elapsed, round_latencies, round_records = self._round(func)
+                rounds.append(elapsed)
+                latencies += round_latencies
+                records += round_records
+
+            exceptions = self.ctx.exceptions
+            peak_mb = None
+            if self.memory:
+                tracemalloc.start()
+                try:
+                    self._round(func)
+                    peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                finally:
+                    tracemalloc.stop()
+
+        phases: typing.Dict[str, float] = {}
+        for record in records:
+            for phase, seconds in record["phases"].items():
+                phases[phase] = phases.get(phase, 0.0) + seconds
+        seconds = statistics.median(rounds)
+        return {
+            "ops": self.ctx.count,
+            "rounds": rounds,
+            "seconds": seconds,
+            "ops_per_second": self.ctx.count / seconds if seconds else None,
+            "p50": quantile(latencies, 0.5),
+            "p95": quantile(latencies, 0.95),
+            "errors": sum(record["outcome"] not in {"ok", "cached"} for record in records),
+            "exceptions": exceptions,
+            "first_exception": self.ctx.first_exception,
+            "valid": not exceptions,
+            "attempts": sum(record["attempts"] for record in records),
+            "response_mb": sum(record["response_bytes"] for record in records) / 2 ** 20 / max(1, self.rounds),
+            "peak_mb": peak_mb,
+            "phases": {phase: total / len(records) for phase, total in phases.items()} if records else {},
+        }
+
+    def run_all(self, names: typing.Iterable[str]) -> typing.Dict:
+        results = {name: self.run(name) for name in names}
+        return {
+            "meta": {
+                "version": git_version(),
+                "created": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "count": self.ctx.count,
+                "concurrency": self.ctx.concurrency,
+                "rounds": self.rounds,
+                "server": dataclasses.asdict(self.server.options),
+            },
+            "results": results,
+        }
+
+
+def save_results(results: typing.Dict, path: typing.Optional[os.PathLike] = None) -> Path:
+    if path is None:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(results["meta"]["created"]))
+        path = RESULTS_DIR.joinpath(f"{stamp}-{results['meta']['version']}.json")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    return path
+
+
+def load_results(path: os.PathLike) -> typing.Dict:
+    """Load a results file, `latest` picks the newest one in RESULTS_DIR"""
+    if str(path) == "latest":
+        candidates = sorted(RESULTS_DIR.glob("*.json"), key=os.path.getmtime)
+        if not candidates:
+            raise FileNotFoundError(f"No results in {RESULTS_DIR}")
+        path = candidates[-1]
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+COMPARED = ("seconds", "p95", "peak_mb")
+
+
+def compare(
+    baseline: typing.Dict,
+    current: typing.Dict,
+    threshold: float = 0.1,
+) -> typing.List[typing.Tuple[str, str, float, float, float, bool]]:
+    """Rows of (scenario, metric, baseline, current, change, regressed), lower is better for all metrics.
+
+    Scenarios whose operations raised in either run are left out, their
+    timings do not measure finished work.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or not result.get("valid", True) or not base.get("valid", True):
+            continue
+        for metric in COMPARED:
+            before, after = base.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            rows.append((name, metric, before, after, change, change > threshold))
+    return rows
+
+
+def format_results(results: typing.Dict) -> str:
+    meta = results["meta"]
+    lines = [
+        f"version {meta['version']}, {meta['count']} ops x {meta['rounds']} rounds, concurrency {meta['concurrency']}",
+        f"{'scenario':<16} {'median s':>9} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'raised':>7} {'peak MB':>8}",
+    ]
+    ms = lambda value: f"{value * 1000:.1f}" if value is not None else "-"
+    for name, result in results["results"].items():
+        peak = f"{result['peak_mb']:.1f}" if result["peak_mb"] is not None else "-"
+        lines.append(
+            f"{name:<16} {result['seconds']:>9.3f} {result['ops_per_second'] or 0:>8.1f} "
+            f"{ms(result['p50']):>8} {ms(result['p95']):>8} {result['errors']:>7} {result['exceptions']:>7} {peak:>8}"
+            + ("  INVALID" if not result["valid"] else "")
+        )
+        if result["first_exception"]:
+            lines.append(f"{'':<16} first exception: {result['first_exception']}")
+        phases = sorted(result["phases"].items(), key=lambda item: -item[1])
+        details = ", ".join(f"{phase} {seconds * 1000:.1f}" for phase, seconds in phases if phase != "total")
+        if details:
+            lines.append(f"{'':<16} ms/op: {details}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows: typing.List[typing.Tuple[str, str, float, float, float, bool]]) -> str:
+    lines = [f"{'scenario':<16} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for name, metric, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{name:<16} {metric:<8} {before:>10.4f} {after:>10.4f} {change:>+8.1%}{flag}")
+    return "\n".join(lines)
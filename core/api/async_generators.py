@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import typing
+import weakref
+from pathlib import Path
+
+import aiohttp
+
+from core import exceptions
+from core.logger import logger, redact
+from core.api.retry import RetryState
+from core.api.metrics import current_timer
+from core.api.transport import Transport, get_transport
+from core.api.body import encode_body
+from core.api.stream import CHUNK_SIZE, ImageStreamDecoder, part_path
+from core.api.generators import TextToImage, ControlNet, UpScale, FaceFix, generator_name
+
+
+# aiohttp raises ServerTimeoutError for connect and read timeouts alike, so
+# only refused or unreachable connections count as never sent
+RETRY_EXCEPTIONS = (aiohttp.ClientConnectorError,)
+READ_RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+
+def timing_trace_config() -> aiohttp.TraceConfig:
+    """Books connect, upload and server wait on the current request timer"""
+
+    async def on_request_start(session, context, params) -> None:
+        context.timer = current_timer()
+        context.ready = context.sent = time.perf_counter()
+
+    async def on_connection_create_start(session, context, params) -> None:
+        context.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params) -> None:
+        context.ready = context.sent = time.perf_counter()
+        context.timer.add("connect", context.ready - context.connect_start)
+
+    async def on_request_chunk_sent(session, context, params) -> None:
+        context.sent = time.perf_counter()
+
+    async def on_request_end(session, context, params) -> None:
+        now = time.perf_counter()
+        context.timer.add("upload", context.sent - context.ready)
+        context.timer.add("wait", now - context.sent)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+class AsyncTransport:
+    """aiohttp counterpart of Transport, bound to one event loop"""
+
+    def __init__(self, transport: typing.Optional[Transport] = None) -> None:
+        self.transport = transport or get_transport()
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+
+    @property
+    def timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=None,
+            connect=self.transport.connect_timeout,
+            sock_read=self.transport.read_timeout,
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.transport.pool_maxsize)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout, trace_configs=[timing_trace_config()]
+            )
+        return self._session
+
+    def get_headers(self) -> typing.Dict[str, str]:
+        return self.transport.get_headers()
+
+    def post(self, url: str, **kwargs) -> typing.AsyncContextManager[aiohttp.ClientResponse]:
+        kwargs.setdefault("headers", self.get_headers())
+        return self.session.post(url, **kwargs)
+
+    async def post_json(self, url: str, **kwargs) -> typing.Dict:
+        async with self.post(url, **kwargs) as response:
+            return await response.json(content_type=None)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncTransport]" = weakref.WeakKeyDictionary()
+
+
+def get_async_transport() -> AsyncTransport:
+    loop = asyncio.get_running_loop()
+    if loop not in _transports:
+        _transports[loop] = AsyncTransport()
+    return _transports[loop]
+
+
+async def close_async_transport() -> None:
+    transport = _transports.pop(asyncio.get_running_loop(), None)
+    if transport is not None:
+        await transport.close()
+
+
+class AsyncGeneratorMixin:
+    @property
+    def async_transport(self) -> AsyncTransport:
+        return get_async_transport()
+
+    async def generate_image(self) -> typing.Tuple[str, int]:
+        async def read_body(response: aiohttp.ClientResponse, state: RetryState) -> typing.Dict:
+            timer = current_timer()
+            chunks = timer.atimed("download", response.content.iter_chunked(CHUNK_SIZE))
+            content = b"".join([chunk async for chunk in chunks])
+            with timer.phase("parse"):
+                return json.loads(content)
+
+        with self.track() as timer:
+            with timer.phase("payload"):
+                payload = self.get_payload()
+                self.request_format(payload)
+            cache = self.cache
+
+            if cache is not None and payload.get("seed") is not None:
+                key = cache.make_key(self.BASE_URL, payload)
+                suffix = f".{payload.get('output_format') or 'png'}"
+                cachepath = await cache.arun(key, lambda partpath: self._download(partpath, payload), suffix)
+                with timer.phase("decode"):
+                    imgb64 = base64.b64encode(await asyncio.to_thread(cachepath.read_bytes)).decode()
+                logger.info(f"Seed: {payload['seed']}")
+                return imgb64, payload["seed"]
+
+            resp_json = await self._send(payload, read_body)
+
+        imgb64, seed = resp_json["image"], resp_json["seed"]
+        logger.info(f"Seed: {seed}")
+        return imgb64, seed
+
+    async def _send(
+        self,
+        payload: typing.Dict,
+        read_body: typing.Callable[[aiohttp.ClientResponse, RetryState], typing.Awaitable[typing.Dict]],
+    ) -> typing.Dict:
+        timer = current_timer()
+        with timer.phase("payload"):
+            self.validate(payload)
+            body = encode_body(payload)
+        timer.request_bytes = len(body)
+        policy = self.retry_policy
+        state = policy.start(RETRY_EXCEPTIONS, READ_RETRY_EXCEPTIONS, self.rate_limiter.endpoint_name(self.BASE_URL))
+
+        logger.opt(lazy=True).debug("Payload: {}", lambda: redact(payload))
+
+        while True:
+            timeout = state.next_attempt()
+            timer.attempts = state.attempt
+            try:
+                with self.backends.request(generator_name(type(self))) as attempt:
+                    backend = attempt.backend
+                    timer.backend = backend.name
+                    url = backend.endpoint(self.BASE_URL)
+                    transport = backend.transport
+                    headers = transport.get_headers()
+                    headers["content-length"] = str(len(body))
+                    request_timeout = aiohttp.ClientTimeout(
+                        total=timeout,
+                        connect=transport.connect_timeout,
+                        sock_read=transport.read_timeout,
+                    )
+                    async with self.rate_limiter.aslot(url):
+                        attempt.start()
+                        async with self.async_transport.post(
+                            url, data=body, headers=headers, timeout=request_timeout
+                        ) as response:
+                            attempt.answer()
+                            timer.status = response.status
+                            policy.raise_for_status(response.status, response.headers.get("retry-after"))
+                            if response.status >= 400:
+                                content = await response.read()
+                                timer.response_bytes += len(content)
+                                resp_json = self.error_json(response.status, content)
+                            else:
+                                resp_json = await read_body(response, state)
+
+                if await asyncio.to_thread(self.check_error, resp_json) is not True:
+                    return resp_json
+                if not state.can_retry():
+                    raise exceptions.ResponseErrorCode(resp_json["error"]["code"])
+            except Exception as e:
+                delay = state.backoff(e)
+                if delay is None:
+                    raise
+                logger.warning(f"Attempt {state.attempt} failed ({e!r}), retrying in {delay:.1f}s")
+                with timer.phase("backoff"):
+                    await asyncio.sleep(delay)
+
+    async def _download(self, partpath: Path, payload: typing.Optional[typing.Dict] = None) -> typing.Dict:
+        async def read_body(response: aiohttp.ClientResponse, state: RetryState) -> typing.Dict:
+            timer = current_timer()
+            with open(partpath, "wb") as file:
+                decoder = ImageStreamDecoder(timer.wrap_file(file))
+                async for chunk in timer.atimed("download", response.content.iter_chunked(CHUNK_SIZE)):
+                    with timer.phase("decode"):
+                        decoder.feed(chunk)
+                    state.check_deadline()
+                with timer.phase("parse"):
+                    return decoder.close()
+
+        try:
+            return await self._send(payload or self.get_payload(), read_body)
+        except BaseException:
+            partpath.unlink(missing_ok=True)
+            raise
+
+    async def generate_file(
+        self,
+        directory: os.PathLike,
+        filename: typing.Optional[str] = None,
+    ) -> typing.Tuple[Path, int]:
+        with self.track() as timer:
+            with timer.phase("payload"):
+                payload = self.get_payload()
+                received = self.request_format(payload)
+            cache = self.cache
+
+            if cache is not None and payload.get("seed") is not None:
+                key = cache.make_key(self.BASE_URL, payload)
+                cachepath = await cache.arun(key, lambda partpath: self._download(partpath, payload), f".{received or 'png'}")
+                seed = payload["seed"]
+                with timer.phase("write"):
+                    partpath = cache.copy_to(cachepath, part_path(directory))
+            else:
+                partpath = part_path(directory)
+                seed = (await self._download(partpath, payload))["seed"]
+
+            with timer.phase("write"):
+                filepath = await asyncio.wrap_future(await asyncio.to_thread(self._save, partpath, filename, payload, seed))
+
+        logger.info(f"Seed: {seed}")
+        return filepath, seed
+
+
+class AsyncTextToImage(AsyncGeneratorMixin, TextToImage):
+    pass
+
+
+class AsyncControlNet(AsyncGeneratorMixin, ControlNet):
+    pass
+
+
+class AsyncUpScale(AsyncGeneratorMixin, UpScale):
+    pass
+
+
+class AsyncFaceFix(AsyncGeneratorMixin, FaceFix):
+    pass
+
+
+async def gather_images(
+    jobs: typing.Iterable[AsyncGeneratorMixin],
+    concurrency: int = 8,
+    return_exceptions: bool = False,
+) -> typing.List[typing.Union[typing.Tuple[str, int], BaseException]]:
+    """Generate `jobs` with at most `concurrency` in flight.
+
+    The loop's transport is closed afterwards if this call opened it, so
+    `asyncio.run(gather_images(...))` leaves no client session behind.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    owned = asyncio.get_running_loop() not in _transports
+
+    async def run(job: AsyncGeneratorMixin) -> typing.Tuple[str, int]:
+        async with semaphore:
+            return await job.generate_image()
+
+    try:
+        return await asyncio.gather(*(run(job) for job in jobs), return_exceptions=return_exceptions)
+    finally:
+        if owned:
+            await close_async_transport()
@@ -0,0 +1,222 @@
+import time
+import typing
+import threading
+import contextlib
+from pathlib import Path
+from urllib.parse import urlparse
+
+from core.logger import logger
+from core.utils import get_config
+from core.constants import URLs
+from core.api.transport import Transport, get_transport
+
+
+HOSTED_URL = "{0.scheme}://{0.netloc}".format(urlparse(URLs.TEXT_TO_IMAGE))
+
+
+class Backend:
+    """One server that speaks the getimg API.
+
+    Endpoints keep the path of the hosted URLs and swap the scheme and host
+    for `url`, so a self-hosted compatible server or a local stand-in such
+    as `python -m bench.server` only has to serve the same paths. Without
+    `key_path` requests carry the hosted API key.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str = HOSTED_URL,
+        *,
+        key_path: typing.Optional[str] = None,
+        weight: float = 1.0,
+        max_in_flight: int = 0,
+        generators: typing.Optional[typing.Sequence[str]] = None,
+    ) -> None:
+        if weight <= 0:
+            raise ValueError(f"Backend {name} needs a positive weight")
+        self.name = name
+        self.url = url.rstrip("/")
+        self.key_path = Path(key_path).expanduser() if key_path else None
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.generators = frozenset(generators) if generators is not None else None
+
+        self.in_flight = 0
+        self.latency: typing.Dict[str, float] = {}
+        self.failures = 0
+        self.down_until = 0.0
+
+        self._transport: typing.Optional[Transport] = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name!r}, {self.url!r})"
+
+    @property
+    def transport(self) -> Transport:
+        if self.key_path is None:
+            return get_transport()
+        with self._lock:
+            if self._transport is None:
+                self._transport = Transport(**{**get_config("transport"), "key_path": self.key_path})
+            return self._transport
+
+    def endpoint(self, base_url: str) -> str:
+        parts = urlparse(base_url)
+        return self.url + parts.path + (f"?{parts.query}" if parts.query else "")
+
+    def supports(self, generator: str) -> bool:
+        return self.generators is None or generator in self.generators
+
+    def close(self) -> None:
+        with self._lock:
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+
+
+class Attempt:
+    """One request on `backend`, timed from `start` to `answer`.
+
+    The sample leaves out waiting for a rate limiter slot and reading the
+    body, so it reflects how fast the backend answers, not local queueing
+    or the image size.
+    """
+
+    def __init__(self, backend: Backend) -> None:
+        self.backend = backend
+        self.latency: typing.Optional[float] = None
+        self._start: typing.Optional[float] = None
+
+    def start(self) -> None:
+        """The request is about to go out, any slot has been granted"""
+        self._start = time.perf_counter()
+
+    def answer(self) -> None:
+        """Response headers arrived"""
+        if self._start is not None and self.latency is None:
+            self.latency = time.perf_counter() - self._start
+
+
+class BackendRouter:
+    """Spreads requests over backends by expected time to finish.
+
+    A backend's cost for a request is its latency average for that
+    generator times the requests it would then have in flight, divided by
+    its weight, the cheapest one wins. Backends without samples yet are
+    costed like the fastest known one so they get tried. After
+    MAX_FAILURES failed attempts in a row a backend sits out for COOLDOWN
+    seconds, retries then land on the others.
+    """
+
+    ALPHA = 0.3
+    MAX_FAILURES = 3
+    COOLDOWN = 30.0
+
+    def __init__(self, backends: typing.Optional[typing.Sequence[Backend]] = None) -> None:
+        self.backends = list(backends) if backends else [Backend("hosted")]
+        names = [backend.name for backend in self.backends]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate backend names: {', '.join(names)}")
+
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "BackendRouter":
+        config = get_config("backends")
+        return cls([Backend(name, **options) for name, options in config.items()])
+
+    def _cost(self, backend: Backend, generator: str, fastest: float) -> typing.Tuple[float, float]:
+        load = (backend.in_flight + 1) / backend.weight
+        return backend.latency.get(generator, fastest) * load, load
+
+    def choose(self, generator: str) -> Backend:
+        candidates = [backend for backend in self.backends if backend.supports(generator)]
+        if not candidates:
+            raise ValueError(f"No backend serves {generator}")
+
+        now = time.monotonic()
+        up = [backend for backend in candidates if backend.down_until <= now]
+        if not up:
+            return min(candidates, key=lambda backend: backend.down_until)
+        free = [backend for backend in up if not backend.max_in_flight or backend.in_flight < backend.max_in_flight]
+
+        known = [backend.latency[generator] for backend in candidates if generator in backend.latency]
+        fastest = min(known, default=0.0)
+        return min(free or up, key=lambda backend: self._cost(backend, generator, fastest))
+
+    @contextlib.contextmanager
+    def request(self, generator: str) -> typing.Iterator[Attempt]:
+        """Reserve a backend for one attempt and learn from how it went.
+
+        Cancellation and interrupts only give the reservation back, they say
+        nothing about the backend.
+        """
+        with self._lock:
+            backend = self.choose(generator)
+            backend.in_flight += 1
+        attempt = Attempt(backend)
+        try:
+            yield attempt
+        except Exception:
+            self._record(backend, generator, None, failed=True)
+            raise
+        except BaseException:
+            self._record(backend, generator, None)
+            raise
+        else:
+            self._record(backend, generator, attempt.latency)
+
+    def _record(self, backend: Backend, generator: str, seconds: typing.Optional[float], failed: bool = False) -> None:
+        with self._lock:
+            backend.in_flight -= 1
+            if failed:
+                backend.failures += 1
+                if backend.failures >= self.MAX_FAILURES and len(self.backends) > 1:
+                    backend.down_until = time.monotonic() + self.COOLDOWN
+                    logger.warning(f"Backend {backend.name} failed {backend.failures} times, pausing it for {self.COOLDOWN:.0f}s")
+                return
+            if seconds is None:
+                return
+            backend.failures = 0
+            previous = backend.latency.get(generator)
+            backend.latency[generator] = seconds if previous is None else previous + self.ALPHA * (seconds - previous)
+
+    def snapshot(self) -> typing.List[typing.Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": backend.name,
+                    "url": backend.url,
+                    "in_flight": backend.in_flight,
+                    "latency": dict(backend.latency),
+                    "down": backend.down_until > now,
+                }
+                for backend in self.backends
+            ]
+
+    def close(self) -> None:
+        for backend in self.backends:
+            backend.close()
+
+
+_router: typing.Optional[BackendRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_backend_router() -> BackendRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = BackendRouter.from_config()
+        return _router
+
+
+def set_backend_router(router: BackendRouter) -> None:
+    global _router
+    with _router_lock:
+        if _router is not None and _router is not router:
+            _router.close()
+        _router = router
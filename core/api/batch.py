@@ -0,0 +1,33 @@
+import typing
+import inspect
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+if typing.TYPE_CHECKING:
+    from core.api.generators import BaseGenerator
+
+
+def variant_seeds(count: int, seed: typing.Optional[int] = None) -> typing.List[typing.Optional[int]]:
+    if count < 1:
+        raise ValueError("Batch count must be at least 1")
+    if seed is None:
+        return [None] * count
+    return list(range(seed, seed + count))
+
+
+def generate_variants(
+    generator: typing.Type["BaseGenerator"],
+    count: int,
+    *,
+    seed: typing.Optional[int] = None,
+    concurrency: typing.Optional[int] = None,
+    **params,
+) -> typing.Iterator[typing.Tuple[str, int]]:
+    if "seed" not in inspect.signature(generator).parameters:
+        raise ValueError(f"{generator.__name__} does not accept a seed")
+
+    jobs = [generator(seed=variant, **params) for variant in variant_seeds(count, seed)]
+
+    with ThreadPoolExecutor(max_workers=concurrency or count) as executor:
+        futures = [executor.submit(job.generate_image) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
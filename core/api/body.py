@@ -0,0 +1,103 @@
+import os
+import json
+import uuid
+import typing
+import hashlib
+import binascii
+from pathlib import Path
+
+
+B64_CHUNK_SIZE = 48 * 1024  # a multiple of 3, so chunks encode without padding
+
+
+class ImageFile:
+    """Input image that stays on disk until its request body is sent.
+
+    Generators accept it wherever they accept a base64 string. The bytes are
+    base64-encoded chunk by chunk while the body is written, so an upload
+    holds one small buffer instead of the whole encoded image.
+    """
+
+    def __init__(self, path: os.PathLike, digest: typing.Optional[str] = None) -> None:
+        self.path = Path(path)
+        self.size = self.path.stat().st_size
+        self._digest = digest
+
+    @property
+    def encoded_size(self) -> int:
+        return (self.size + 2) // 3 * 4
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            sha = hashlib.sha256()
+            with open(self.path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            self._digest = sha.hexdigest()
+        return self._digest
+
+    def iter_base64(self, chunk_size: int = B64_CHUNK_SIZE) -> typing.Iterator[bytes]:
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        with open(self.path, "rb") as file:
+            while True:
+                read = file.readinto(buffer)
+                if not read:
+                    break
+                yield binascii.b2a_base64(view[:read], newline=False)
+
+    def __str__(self) -> str:
+        # Stands in for the image in cache keys and canonical hashes
+        return f"sha256:{self.digest}"
+
+    def __repr__(self) -> str:
+        return f"ImageFile({str(self.path)!r}, {self.size} bytes)"
+
+
+class JsonBody:
+    """JSON request body with ImageFile values streamed as base64.
+
+    The length is known up front so it is sent with a Content-Length, and
+    every iteration starts over, so retries can send the same body again.
+    """
+
+    def __init__(self, payload: typing.Dict) -> None:
+        images: typing.Dict[str, ImageFile] = {}
+
+        def placeholder(value: ImageFile) -> str:
+            marker = f"@image-{uuid.uuid4().hex}@"
+            images[marker] = value
+            return marker
+
+        text = json.dumps({
+            key: placeholder(value) if isinstance(value, ImageFile) else value
+            for key, value in payload.items()
+        })
+
+        self.parts: typing.List[typing.Union[bytes, ImageFile]] = []
+        for marker, image in images.items():
+            head, text = text.split(marker, 1)
+            self.parts += [head.encode(), image]
+        self.parts.append(text.encode())
+
+    def __len__(self) -> int:
+        return sum(part.encoded_size if isinstance(part, ImageFile) else len(part) for part in self.parts)
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        for part in self.parts:
+            if isinstance(part, ImageFile):
+                yield from part.iter_base64()
+            else:
+                yield part
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        for chunk in self:
+            yield chunk
+
+
+def encode_body(payload: typing.Dict) -> typing.Union[bytes, JsonBody]:
+    """Serialize `payload`, streaming it only when it holds an ImageFile"""
+    if any(isinstance(value, ImageFile) for value in payload.values()):
+        return JsonBody(payload)
+    return json.dumps(payload).encode()
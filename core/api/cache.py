@@ -0,0 +1,214 @@
+import os
+import time
+import shutil
+import typing
+import asyncio
+import threading
+import collections
+from pathlib import Path
+from concurrent.futures import Future
+
+from core.logger import logger
+from core.paths import CACHE_DIR
+from core.utils import get_config, canonical_hash
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of seeded generation results.
+
+    Entries are named after a hash of the endpoint and the canonical payload,
+    recency is kept in file mtimes so the LRU order survives restarts.
+    Partial downloads left behind by a crashed run are removed on start once
+    they are older than STALE_PART_SECONDS, younger ones may belong to
+    another running process.
+    """
+
+    MAX_MB = 1024
+    STALE_PART_SECONDS = 3600
+
+    def __init__(
+        self,
+        directory: typing.Optional[os.PathLike] = None,
+        max_mb: typing.Optional[int] = None,
+    ) -> None:
+        self.directory = Path(directory or CACHE_DIR.joinpath("results"))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = (max_mb or self.MAX_MB) * 1024 * 1024
+
+        self._lock = threading.Lock()
+        self._entries: "collections.OrderedDict[str, typing.Tuple[Path, int]]" = collections.OrderedDict()
+        self._size = 0
+        self._inflight: typing.Dict[str, Future] = {}
+        self._async_inflight: typing.Dict[typing.Tuple[int, str], asyncio.Future] = {}
+
+        self._load()
+
+    @classmethod
+    def from_config(cls) -> typing.Optional["ResultCache"]:
+        config = dict(get_config("cache"))
+        if not config.pop("enabled", True):
+            return None
+        return cls(**config)
+
+    @staticmethod
+    def make_key(url: str, payload: typing.Dict) -> str:
+        return canonical_hash({"url": url, "payload": payload})
+
+    def _load(self) -> None:
+        files = []
+        stale = time.time() - self.STALE_PART_SECONDS
+        for filepath in self.directory.iterdir():
+            try:
+                stat = filepath.stat()
+                if filepath.name.startswith("."):
+                    if ".part" in filepath.name and stat.st_mtime < stale:
+                        filepath.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if filepath.is_file():
+                files.append((stat.st_mtime, filepath.stem, filepath, stat.st_size))
+
+        for _, key, filepath, size in sorted(files):
+            self._entries[key] = (filepath, size)
+            self._size += size
+        self._evict()
+
+    def _evict(self, keep: typing.Optional[str] = None) -> None:
+        # `keep` is the entry just stored, its caller is about to read it. An
+        # entry larger than the whole budget stays until the next put.
+        while self._size > self.max_bytes and self._entries:
+            if next(iter(self._entries)) == keep:
+                break
+            key, (filepath, size) = self._entries.popitem(last=False)
+            filepath.unlink(missing_ok=True)
+            self._size -= size
+            logger.debug("Evicted cached result {}", key[:12])
+
+    def get(self, key: str) -> typing.Optional[Path]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            filepath, _ = entry
+            if not filepath.exists():
+                self._entries.pop(key)
+                self._size -= entry[1]
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(filepath)
+        except FileNotFoundError:
+            # Evicted by another thread since the lookup
+            return None
+        return filepath
+
+    def put(self, key: str, partpath: Path) -> Path:
+        filepath = self.directory.joinpath(key + partpath.suffix)
+        os.replace(partpath, filepath)
+        size = filepath.stat().st_size
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (filepath, size)
+            self._size += size
+            self._evict(keep=key)
+        return filepath
+
+    def part_path(self, suffix: str) -> Path:
+        return self.directory.joinpath(f".{os.urandom(8).hex()}.part{suffix}")
+
+    def run(self, key: str, fetch: typing.Callable[[Path], None], suffix: str = "") -> Path:
+        """Return the cached file for `key`, calling `fetch(partpath)` once on a miss.
+
+        Concurrent callers with the same key share a single fetch.
+        """
+        filepath = self.get(key)
+        if filepath is not None:
+            logger.info(f"Cache hit {key[:12]}")
+            return filepath
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        partpath = self.part_path(suffix)
+        try:
+            fetch(partpath)
+            filepath = self.put(key, partpath)
+        except BaseException as e:
+            partpath.unlink(missing_ok=True)
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(filepath)
+            return filepath
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def arun(
+        self,
+        key: str,
+        fetch: typing.Callable[[Path], typing.Awaitable[None]],
+        suffix: str = "",
+    ) -> Path:
+        filepath = self.get(key)
+        if filepath is not None:
+            logger.info(f"Cache hit {key[:12]}")
+            return filepath
+
+        loop = asyncio.get_running_loop()
+        inflight = (id(loop), key)
+        future = self._async_inflight.get(inflight)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self._async_inflight[inflight] = loop.create_future()
+        partpath = self.part_path(suffix)
+        try:
+            await fetch(partpath)
+            filepath = self.put(key, partpath)
+        except BaseException as e:
+            partpath.unlink(missing_ok=True)
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(filepath)
+            return filepath
+        finally:
+            self._async_inflight.pop(inflight, None)
+
+    @staticmethod
+    def copy_to(filepath: Path, destination: Path) -> Path:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(filepath, destination)
+        return destination
+
+
+_cache: typing.Optional[ResultCache] = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> typing.Optional[ResultCache]:
+    global _cache, _cache_loaded
+    with _cache_lock:
+        if not _cache_loaded:
+            _cache = ResultCache.from_config()
+            _cache_loaded = True
+        return _cache
+
+
+def set_cache(cache: typing.Optional[ResultCache]) -> None:
+    global _cache, _cache_loaded
+    with _cache_lock:
+        _cache, _cache_loaded = cache, True
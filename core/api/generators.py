@@ -1,20 +1,44 @@
+import os
+import json
+import time
+import base64
 import typing
+import contextlib
 import requests
+from pathlib import Path
+from concurrent.futures import Future
 
 from core import exceptions
-from core.logger import logger
+from core.logger import logger, redact
 from core.constants import URLs
-from core.utils import get_api_key
-from core.api.key import GetimgReger
+from core.history import HistoryIndex, get_history
+from core.api.transport import Transport, get_transport
+from core.api.backends import BackendRouter, get_backend_router
+from core.api.cache import ResultCache, get_cache
+from core.api.retry import RetryPolicy, RetryState, get_retry_policy
+from core.api.limiter import RateLimiter, get_rate_limiter
+from core.api.models import ModelRegistry, get_model_registry
+from core.api.metrics import Metrics, RequestTimer, current_timer, get_metrics
+from core.api.body import ImageFile, encode_body
+from core.api.stream import CHUNK_SIZE, ImageStreamDecoder, part_path
+from core.api.writer import ImageWriter, get_image_writer
 
 
 class BaseRequest:
+    @property
+    def transport(self) -> Transport:
+        return get_transport()
+
+    @property
+    def cache(self) -> typing.Optional[ResultCache]:
+        return get_cache()
+
+    @property
+    def backends(self) -> BackendRouter:
+        return get_backend_router()
+
     def get_headers(self) -> typing.Dict[str, str]:
-        return {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "authorization": f"Bearer {get_api_key()}"
-        }
+        return self.transport.get_headers()
 
     def get_payload(self) -> typing.Union[typing.Dict[str, str], typing.Dict]:
         payload = {}
@@ -23,13 +47,49 @@ class BaseRequest:
                 payload[key] = value
         return payload
 
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return get_retry_policy()
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return get_rate_limiter()
+
+    @property
+    def history(self) -> typing.Optional[HistoryIndex]:
+        return get_history()
+
+    @property
+    def model_registry(self) -> ModelRegistry:
+        return get_model_registry()
+
+    @property
+    def metrics(self) -> typing.Optional[Metrics]:
+        return get_metrics()
+
+    @property
+    def writer(self) -> ImageWriter:
+        return get_image_writer()
+
     def check_response(self, response: requests.Response) -> typing.Optional[bool]:
-        resp_json = response.json()
+        return self.check_error(response.json())
 
+    def error_json(self, status_code: int, content: bytes) -> typing.Dict:
+        try:
+            resp_json = json.loads(content)
+        except ValueError:
+            resp_json = None
+        if not isinstance(resp_json, dict) or not resp_json.get("error"):
+            resp_json = {"error": {"code": f"http_{status_code}"}}
+        return resp_json
+
+    def check_error(self, resp_json: typing.Dict) -> typing.Optional[bool]:
         if resp_json.get("error"):
             error_code = resp_json["error"]["code"]
             
             if error_code == "quota_exceeded":
+                from core.api.key import GetimgReger
+                
                 GetimgReger().write_api_key()
                 return True
             else:            
@@ -37,23 +97,207 @@ class BaseRequest:
 
 
 class BaseGenerator(BaseRequest):
+    MAX_INPUT_SIZE: typing.Optional[int] = None
+
     def __init__(self) -> None:
         super().__init__()
 
+    def validate(self, payload: typing.Dict) -> None:
+        self.model_registry.validate(generator_name(type(self)), payload)
+
+    def track(self) -> typing.ContextManager[RequestTimer]:
+        metrics = self.metrics
+        if metrics is None:
+            return contextlib.nullcontext(current_timer())
+        return metrics.request(
+            self.rate_limiter.endpoint_name(self.BASE_URL),
+            getattr(self, "model", None),
+            generator_name(type(self)),
+        )
+
     def generate_image(self) -> typing.Tuple[str, int]:
-        payload = self.get_payload()
-        headers = self.get_headers()
+        with self.track() as timer:
+            with timer.phase("payload"):
+                payload = self.get_payload()
+                self.request_format(payload)
+            cache = self.cache
+            
+            if cache is not None and payload.get("seed") is not None:
+                key = cache.make_key(self.BASE_URL, payload)
+                suffix = f".{payload.get('output_format') or 'png'}"
+                cachepath = cache.run(key, lambda partpath: self._download(partpath, payload), suffix)
+                with timer.phase("decode"), open(cachepath, "rb") as file:
+                    imgb64 = base64.b64encode(file.read()).decode()
+                logger.info(f"Seed: {payload['seed']}")
+                return imgb64, payload["seed"]
+            
+            resp_json = self._send(payload, self._read_json)
         
-        logger.debug(f"Payload: {payload}")
+        imgb64, seed = resp_json["image"], resp_json["seed"]
+        logger.info(f"Seed: {seed}")
+        return imgb64, seed
+
+    def _read_json(self, response: requests.Response, state: RetryState) -> typing.Dict:
+        timer = current_timer()
+        content = b"".join(timer.timed("download", response.iter_content(CHUNK_SIZE)))
+        with timer.phase("parse"):
+            return json.loads(content)
+
+    def _send(
+        self,
+        payload: typing.Dict,
+        read_body: typing.Callable[[requests.Response, RetryState], typing.Dict],
+    ) -> typing.Dict:
+        timer = current_timer()
+        with timer.phase("payload"):
+            self.validate(payload)
+            body = encode_body(payload)
+        timer.request_bytes = len(body)
+        policy = self.retry_policy
+        state = policy.start(endpoint=self.rate_limiter.endpoint_name(self.BASE_URL))
         
-        response = requests.post(self.BASE_URL, json=payload, headers=headers)
+        logger.opt(lazy=True).debug("Payload: {}", lambda: redact(payload))
         
-        if self.check_response(response) is True:
-            return self.generate_image()
+        while True:
+            timeout = state.next_attempt()
+            timer.attempts = state.attempt
+            try:
+                with self.backends.request(generator_name(type(self))) as attempt:
+                    backend = attempt.backend
+                    timer.backend = backend.name
+                    url = backend.endpoint(self.BASE_URL)
+                    transport = backend.transport
+                    request_timeout = (
+                        min(transport.connect_timeout, timeout),
+                        min(transport.read_timeout, timeout),
+                    )
+                    with self.rate_limiter.slot(url):
+                        attempt.start()
+                        with transport.post(
+                            url, data=body, headers=transport.get_headers(), stream=True, timeout=request_timeout
+                        ) as response:
+                            attempt.answer()
+                            timer.status = response.status_code
+                            policy.raise_for_status(response.status_code, response.headers.get("retry-after"))
+                            if response.status_code >= 400:
+                                timer.response_bytes += len(response.content)
+                                resp_json = self.error_json(response.status_code, response.content)
+                            else:
+                                resp_json = read_body(response, state)
+                
+                if self.check_error(resp_json) is not True:
+                    return resp_json
+                if not state.can_retry():
+                    raise exceptions.ResponseErrorCode(resp_json["error"]["code"])
+            except Exception as e:
+                delay = state.backoff(e)
+                if delay is None:
+                    raise
+                logger.warning(f"Attempt {state.attempt} failed ({e!r}), retrying in {delay:.1f}s")
+                with timer.phase("backoff"):
+                    time.sleep(delay)
+
+    def _download(self, partpath: Path, payload: typing.Optional[typing.Dict] = None) -> typing.Dict:
+        def read_body(response: requests.Response, state: RetryState) -> typing.Dict:
+            timer = current_timer()
+            with open(partpath, "wb") as file:
+                decoder = ImageStreamDecoder(timer.wrap_file(file))
+                for chunk in timer.timed("download", response.iter_content(CHUNK_SIZE)):
+                    with timer.phase("decode"):
+                        decoder.feed(chunk)
+                    state.check_deadline()
+                with timer.phase("parse"):
+                    return decoder.close()
+        
+        try:
+            return self._send(payload or self.get_payload(), read_body)
+        except BaseException:
+            partpath.unlink(missing_ok=True)
+            raise
+
+    def generate_file(
+        self,
+        directory: os.PathLike,
+        filename: typing.Optional[str] = None,
+    ) -> typing.Tuple[Path, int]:
+        future, seed = self.submit_file(directory, filename)
+        return future.result(), seed
+
+    def submit_file(
+        self,
+        directory: os.PathLike,
+        filename: typing.Optional[str] = None,
+    ) -> typing.Tuple[Future, int]:
+        """Download the image and queue it for the writer, the future resolves to its path"""
+        with self.track() as timer:
+            with timer.phase("payload"):
+                payload = self.get_payload()
+                received = self.request_format(payload)
+            cache = self.cache
+            
+            if cache is not None and payload.get("seed") is not None:
+                key = cache.make_key(self.BASE_URL, payload)
+                cachepath = cache.run(key, lambda partpath: self._download(partpath, payload), f".{received or 'png'}")
+                seed = payload["seed"]
+                with timer.phase("write"):
+                    partpath = cache.copy_to(cachepath, part_path(directory))
+            else:
+                partpath = part_path(directory)
+                seed = self._download(partpath, payload)["seed"]
+            
+            with timer.phase("write"):
+                future = self._save(partpath, filename, payload, seed)
         
-        imgb64, seed, _ = response.json().values()
         logger.info(f"Seed: {seed}")
-        return imgb64, seed
+        return future, seed
+
+    def submit_image(
+        self,
+        imgb64: str,
+        seed: int,
+        directory: os.PathLike,
+        filename: typing.Optional[str] = None,
+    ) -> Future:
+        """Queue an image returned by `generate_image` for the writer, the future resolves to its path"""
+        payload = self.get_payload()
+        self.request_format(payload)
+        partpath = part_path(directory)
+        try:
+            with open(partpath, "wb") as file:
+                file.write(base64.b64decode(imgb64))
+        except BaseException:
+            partpath.unlink(missing_ok=True)
+            raise
+        return self._save(partpath, filename, payload, seed)
+
+    def get_metadata(self, payload: typing.Dict, seed: int) -> typing.Dict:
+        metadata = {key: value for key, value in payload.items() if key != "image"}
+        metadata["generator"] = generator_name(type(self))
+        metadata["seed"] = seed
+        return metadata
+
+    def request_format(self, payload: typing.Dict) -> typing.Optional[str]:
+        """Ask for PNG when the endpoint cannot produce `output_format`, the writer converts it"""
+        name = generator_name(type(self))
+        registry = self.model_registry
+        supported = registry.limits(name, payload.get("model")).output_formats if name in registry.generators else ()
+        received = ImageWriter.request_format(payload.get("output_format"), supported)
+        if received is not None:
+            payload["output_format"] = received
+        return received
+
+    def _save(self, partpath: Path, filename: typing.Optional[str], payload: typing.Dict, seed: int) -> Future:
+        metadata = self.get_metadata(payload, seed)
+        if self.output_format is not None:
+            metadata["output_format"] = self.output_format
+        return self.writer.submit(
+            partpath,
+            metadata,
+            filename=filename,
+            output_format=self.output_format,
+            received_format=payload.get("output_format"),
+            history=self.history,
+        )
 
 
 class TextToImage(BaseGenerator):
@@ -90,11 +334,12 @@ class TextToImage(BaseGenerator):
 
 class ControlNet(BaseGenerator):
     BASE_URL = URLs.CONTROL_NET
+    MAX_INPUT_SIZE = 1024
     
     def __init__(
         self,
         prompt: str,
-        image: str,
+        image: typing.Union[str, ImageFile],
         condition: typing.Optional[str] = "canny-1.1",
         model: typing.Optional[str] = None,
         negative_prompt: typing.Optional[str] = None,
@@ -126,10 +371,11 @@ class ControlNet(BaseGenerator):
 
 class UpScale(BaseGenerator):
     BASE_URL = URLs.UP_SCALE
+    MAX_INPUT_SIZE = 1024
     
     def __init__(
         self,
-        image: str,
+        image: typing.Union[str, ImageFile],
         model: typing.Optional[str] = None,
         scale: typing.Optional[int] = 4,
         output_format: typing.Optional[str] = "png",
@@ -146,10 +392,11 @@ class UpScale(BaseGenerator):
 
 class FaceFix(BaseGenerator):
     BASE_URL = URLs.FACE_FIX
+    MAX_INPUT_SIZE = 2048
     
     def __init__(
         self,
-        image: str,
+        image: typing.Union[str, ImageFile],
         model: typing.Optional[str] = None,
         output_format: typing.Optional[str] = "png",
     ) -> None:
@@ -159,4 +406,26 @@ class FaceFix(BaseGenerator):
         self.image = image
         self.output_format = output_format
         
-        logger.info("[FaceFix] Image processing in progress")
\ No newline at end of file
+        logger.info("[FaceFix] Image processing in progress")
+
+GENERATORS = {
+    "Text to Image": TextToImage,
+    "ControlNet": ControlNet,
+    "UpScale": UpScale,
+    "FaceFix": FaceFix,
+}
+
+
+def generator_name(generator: typing.Type[BaseGenerator]) -> str:
+    for name, cls in GENERATORS.items():
+        if issubclass(generator, cls):
+            return name
+    return generator.__name__
+
+
+def get_generator(generator_type: str) -> typing.Type[BaseGenerator]:
+    key = generator_type.replace(" ", "").lower()
+    for name, generator in GENERATORS.items():
+        if name.replace(" ", "").lower() == key:
+            return generator
+    raise ValueError(f"Unknown generator type: {generator_type}")
@@ -0,0 +1,196 @@
+import os
+import random
+import typing
+import inspect
+import itertools
+import dataclasses
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from core.logger import logger
+from core.contact_sheet import ContactSheet
+from core.api.models import get_model_registry
+from core.api.generators import BaseGenerator, TextToImage, get_generator, generator_name
+
+
+GRID_PARAMS = {
+    "steps": int,
+    "guidance": float,
+    "scheduler": str,
+    "model": str,
+    "seed": int,
+}
+SHEET_NAME = "contact-sheet.png"
+SEED_RANGE = (1, 2**31 - 1)
+
+
+def parse_values(name: str, text: str) -> typing.List[typing.Any]:
+    """Turn `"5, 7.5, 10"` into typed values for the `name` axis"""
+    if name not in GRID_PARAMS:
+        raise ValueError(f"Cannot sweep {name}, choose from {', '.join(GRID_PARAMS)}")
+    cast = GRID_PARAMS[name]
+    values = [value.strip() for value in text.split(",") if value.strip()]
+    try:
+        return [cast(value) for value in values]
+    except ValueError:
+        raise ValueError(f"Invalid {name} values: {text}") from None
+
+
+@dataclasses.dataclass(frozen=True)
+class GridCell:
+    row: int
+    column: int
+    params: typing.Dict[str, typing.Any]
+
+
+@dataclasses.dataclass
+class GridResult:
+    cell: GridCell
+    output: typing.Optional[Path]
+    seed: typing.Optional[int]
+    error: typing.Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ParameterGrid:
+    """Sweeps two or three generation parameters for one prompt.
+
+    The first axis runs across the columns of the contact sheet, the other
+    axes down its rows. Every cell is dispatched at once and placed on the
+    sheet as soon as its result arrives. Unless seed is swept or given, one
+    random seed is picked for all cells so they only differ in the axes.
+    """
+
+    CONCURRENCY = 8
+
+    def __init__(
+        self,
+        axes: typing.Dict[str, typing.Sequence[typing.Any]],
+        generator: typing.Union[str, typing.Type[BaseGenerator]] = TextToImage,
+        **params,
+    ) -> None:
+        self.generator = get_generator(generator) if isinstance(generator, str) else generator
+        self.axes = {name: list(values) for name, values in axes.items()}
+        self.params = {key: value for key, value in params.items() if key not in self.axes}
+        self.validate()
+
+        accepted = inspect.signature(self.generator).parameters
+        if "seed" in accepted and "seed" not in self.axes and self.params.get("seed") is None:
+            self.params["seed"] = random.randint(*SEED_RANGE)
+
+    @property
+    def seed(self) -> typing.Optional[int]:
+        """The seed shared by every cell, None when seed is an axis"""
+        return self.params.get("seed")
+
+    def validate(self) -> None:
+        if not 2 <= len(self.axes) <= 3:
+            raise ValueError("A grid sweeps two or three parameters")
+
+        accepted = inspect.signature(self.generator).parameters
+        registry = get_model_registry()
+        name = generator_name(self.generator)
+        for axis, values in self.axes.items():
+            if axis not in GRID_PARAMS:
+                raise ValueError(f"Cannot sweep {axis}, choose from {', '.join(GRID_PARAMS)}")
+            if axis not in accepted:
+                raise ValueError(f"{self.generator.__name__} does not accept {axis}")
+            if not values:
+                raise ValueError(f"No values for {axis}")
+
+        unknown = []
+        if "scheduler" in self.axes and registry.schedulers:
+            unknown += [value for value in self.axes["scheduler"] if value not in registry.schedulers]
+        if "model" in self.axes and name in registry.generators:
+            unknown += [value for value in self.axes["model"] if value not in registry.models(name)]
+        if unknown:
+            raise ValueError(f"Unknown values: {', '.join(map(str, unknown))}")
+
+    @property
+    def columns(self) -> typing.List[str]:
+        name, values = next(iter(self.axes.items()))
+        return [f"{name} {value}" for value in values]
+
+    @property
+    def rows(self) -> typing.List[str]:
+        names = list(self.axes)[1:]
+        return [
+            ", ".join(f"{name} {value}" for name, value in zip(names, combination))
+            for combination in itertools.product(*(self.axes[name] for name in names))
+        ]
+
+    @property
+    def cells(self) -> typing.List[GridCell]:
+        names = list(self.axes)
+        first, *rest = (self.axes[name] for name in names)
+        cells = []
+        for row, combination in enumerate(itertools.product(*rest)):
+            for column, value in enumerate(first):
+                cells.append(GridCell(row, column, dict(zip(names, (value, *combination)))))
+        return cells
+
+    def contact_sheet(self, tile_size: typing.Optional[int] = None) -> ContactSheet:
+        title = self.params.get("prompt", "")
+        if self.seed is not None:
+            title = f"{title} (seed {self.seed})"
+        return ContactSheet(self.columns, self.rows, title=title, tile_size=tile_size)
+
+    def _generate(self, cell: GridCell, directory: Path) -> typing.Tuple[Future, int]:
+        generator = self.generator(**self.params, **cell.params)
+        filename = f"r{cell.row + 1}-c{cell.column + 1}.{generator.output_format or 'png'}"
+        return generator.submit_file(directory, filename)
+
+    def run(
+        self,
+        directory: os.PathLike,
+        *,
+        concurrency: typing.Optional[int] = None,
+        sheet: typing.Optional[ContactSheet] = None,
+    ) -> typing.Iterator[GridResult]:
+        """Generate every cell, yielding results as they finish.
+
+        Tiles go to `directory`, the contact sheet is saved next to them as
+        SHEET_NAME once the last result is in. A sheet passed by the caller
+        is left open, e.g. to keep showing its canvas.
+        """
+        directory = Path(directory)
+        cells = self.cells
+        owned = sheet is None
+        sheet = sheet or self.contact_sheet()
+
+        try:
+            with ThreadPoolExecutor(concurrency or min(len(cells), self.CONCURRENCY), thread_name_prefix="grid") as executor:
+                # Downloads resolve to the writer's future, which joins the
+                # wait set so the worker moves on while the image is written
+                futures = {executor.submit(self._generate, cell, directory): cell for cell in cells}
+                seeds: typing.Dict[Future, int] = {}
+                pending = set(futures)
+                try:
+                    while pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            cell = futures[future]
+                            try:
+                                if future not in seeds:
+                                    written, seeds[written] = future.result()
+                                    futures[written] = cell
+                                    pending.add(written)
+                                    continue
+                                output = future.result()
+                            except Exception as e:
+                                logger.error(f"Grid cell {cell.params} failed: {e}")
+                                sheet.fail(cell.row, cell.column)
+                                yield GridResult(cell, None, None, e)
+                            else:
+                                sheet.place(cell.row, cell.column, output)
+                                yield GridResult(cell, output, seeds[future])
+                finally:
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+            logger.info(f"Contact sheet: {sheet.save(directory.joinpath(SHEET_NAME))}")
+        finally:
+            if owned:
+                sheet.close()
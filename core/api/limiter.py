@@ -0,0 +1,192 @@
+import time
+import typing
+import asyncio
+import threading
+import contextlib
+import collections
+from urllib.parse import urlparse
+
+from core.logger import logger
+from core.utils import get_config
+from core.api.metrics import current_timer
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out reservations instead of blocking"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds to wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class EndpointLimiter:
+    """Request rate and concurrency ceiling for one endpoint"""
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._active = 0
+        self._async_waiters: typing.Deque[typing.Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = collections.deque()
+
+    def _try_acquire(self) -> bool:
+        if self.concurrency > 0 and self._active >= self.concurrency:
+            return False
+        self._active += 1
+        return True
+
+    def acquire(self) -> None:
+        with current_timer().phase("queue"):
+            with self._cond:
+                while not self._try_acquire():
+                    self._cond.wait()
+            delay = self.bucket.reserve()
+            if delay:
+                logger.debug("Throttling {} for {:.2f}s", self.name, delay)
+                time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        with current_timer().phase("queue"):
+            await self._acquire_async()
+
+    async def _acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    break
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if future.done() and not future.cancelled():
+                        self._wake_async()
+                raise
+        delay = self.bucket.reserve()
+        if delay:
+            logger.debug("Throttling {} for {:.2f}s", self.name, delay)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.release()
+                raise
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+            self._wake_async()
+
+    def _wake_async(self) -> None:
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            if not future.done() and not loop.is_closed():
+                loop.call_soon_threadsafe(self._resolve, future)
+                return
+
+    def _resolve(self, future: asyncio.Future) -> None:
+        if future.done():
+            with self._lock:
+                self._wake_async()
+        else:
+            future.set_result(None)
+
+
+class RateLimiter:
+    """Per-endpoint limiters shared by every generator in the process"""
+
+    RATE = 2.0
+    BURST = 4
+    CONCURRENCY = 8
+
+    def __init__(
+        self,
+        rate: typing.Optional[float] = None,
+        burst: typing.Optional[int] = None,
+        concurrency: typing.Optional[int] = None,
+        endpoints: typing.Optional[typing.Dict[str, typing.Dict]] = None,
+    ) -> None:
+        self.defaults = {
+            "rate": self.RATE if rate is None else rate,
+            "burst": burst or self.BURST,
+            "concurrency": self.CONCURRENCY if concurrency is None else concurrency,
+        }
+        self.endpoints = endpoints or {}
+
+        self._lock = threading.Lock()
+        self._limiters: typing.Dict[str, EndpointLimiter] = {}
+
+    @classmethod
+    def from_config(cls) -> "RateLimiter":
+        return cls(**get_config("limits"))
+
+    @staticmethod
+    def endpoint_name(url: str) -> str:
+        return urlparse(url).path.rstrip("/").rsplit("/", 1)[-1] or url
+
+    def get(self, url: str) -> EndpointLimiter:
+        with self._lock:
+            limiter = self._limiters.get(url)
+            if limiter is None:
+                name = self.endpoint_name(url)
+                options = {**self.defaults, **self.endpoints.get(name, {})}
+                limiter = self._limiters[url] = EndpointLimiter(name, **options)
+            return limiter
+
+    @contextlib.contextmanager
+    def slot(self, url: str) -> typing.Iterator[None]:
+        limiter = self.get(url)
+        limiter.acquire()
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, url: str) -> typing.AsyncIterator[None]:
+        limiter = self.get(url)
+        await limiter.acquire_async()
+        try:
+            yield
+        finally:
+            limiter.release()
+
+
+_limiter: typing.Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter.from_config()
+        return _limiter
+
+
+def set_rate_limiter(limiter: RateLimiter) -> None:
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
@@ -0,0 +1,99 @@
+import os
+import json
+import zlib
+import struct
+import typing
+from pathlib import Path
+
+from core.api.stream import commit_part, part_path
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IEND_CHUNK = struct.pack(">I", 0) + b"IEND" + struct.pack(">I", zlib.crc32(b"IEND"))
+METADATA_KEY = b"parameters"
+SIDECAR_SUFFIX = ".json"
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def embed_metadata(filepath: os.PathLike, metadata: typing.Dict) -> bool:
+    """Append `metadata` to a PNG as an iTXt chunk, in place.
+
+    The chunk goes right before IEND, so only the last 12 bytes of the file
+    are rewritten. Returns False if the file is not a PNG.
+    """
+    text = json.dumps(metadata, ensure_ascii=False, separators=(",", ":"))
+    chunk = _png_chunk(b"iTXt", METADATA_KEY + b"\0\0\0\0\0" + text.encode())
+
+    with open(filepath, "r+b") as file:
+        if file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            return False
+        file.seek(-len(IEND_CHUNK), os.SEEK_END)
+        if file.read(len(IEND_CHUNK)) != IEND_CHUNK:
+            return False
+        file.seek(-len(IEND_CHUNK), os.SEEK_END)
+        file.write(chunk + IEND_CHUNK)
+    return True
+
+
+def sidecar_path(filepath: os.PathLike) -> Path:
+    filepath = Path(filepath)
+    return filepath.with_name(filepath.name + SIDECAR_SUFFIX)
+
+
+def write_sidecar(filepath: os.PathLike, metadata: typing.Dict) -> Path:
+    """Write the JSON sidecar of `filepath` through a part file, so it is never seen half written"""
+    sidecar = sidecar_path(filepath)
+    partpath = part_path(sidecar.parent)
+    try:
+        with open(partpath, "w", encoding="utf-8") as file:
+            json.dump(metadata, file, ensure_ascii=False, indent=2)
+        return commit_part(partpath, sidecar.name)
+    except BaseException:
+        partpath.unlink(missing_ok=True)
+        raise
+
+
+def _read_png_metadata(file: typing.BinaryIO) -> typing.Optional[typing.Dict]:
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"IEND":
+            return None
+        if chunk_type != b"iTXt":
+            file.seek(length + 4, os.SEEK_CUR)
+            continue
+
+        data = file.read(length)
+        file.seek(4, os.SEEK_CUR)
+        keyword, _, rest = data.partition(b"\0")
+        if keyword != METADATA_KEY or len(rest) < 2:
+            continue
+        compressed = rest[0] == 1
+        _, _, rest = rest[2:].partition(b"\0")
+        _, _, text = rest.partition(b"\0")
+        if compressed:
+            text = zlib.decompress(text)
+        return json.loads(text)
+
+
+def read_metadata(filepath: os.PathLike) -> typing.Optional[typing.Dict]:
+    """Return the generation parameters stored in or next to `filepath`"""
+    try:
+        with open(filepath, "rb") as file:
+            if file.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE:
+                metadata = _read_png_metadata(file)
+                if metadata is not None:
+                    return metadata
+    except (OSError, ValueError, zlib.error):
+        return None
+
+    try:
+        with open(sidecar_path(filepath), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
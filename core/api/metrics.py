@@ -0,0 +1,356 @@
+import os
+import json
+import math
+import time
+import atexit
+import bisect
+import typing
+import threading
+import contextlib
+import contextvars
+import collections
+from pathlib import Path
+
+from core.logger import logger
+from core.paths import DATA_DIR
+from core.utils import get_config
+
+
+PHASES = (
+    "payload", "queue", "connect", "upload", "wait", "download",
+    "parse", "decode", "write", "backoff", "preview", "ui", "total",
+)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+_current: "contextvars.ContextVar[typing.Optional[RequestTimer]]" = contextvars.ContextVar("request_timer", default=None)
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> typing.List[typing.Tuple[float, int]]:
+        total, result = 0, []
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class TimedFile:
+    """File proxy that books every write under the "write" phase"""
+
+    def __init__(self, file: typing.BinaryIO, timer: "RequestTimer") -> None:
+        self.file = file
+        self.timer = timer
+
+    def write(self, data: bytes) -> int:
+        with self.timer.phase("write"):
+            return self.file.write(data)
+
+
+class RequestTimer:
+    """Phase timings of one generator call.
+
+    Phases nest: time spent in an inner phase is not counted again in the
+    outer one, so "upload" excludes the "connect" that happens inside it.
+    """
+
+    def __init__(self, endpoint: str, model: typing.Optional[str] = None, generator: typing.Optional[str] = None) -> None:
+        self.endpoint = endpoint
+        self.model = model or ""
+        self.generator = generator
+        self.backend: typing.Optional[str] = None
+        self.phases: typing.Dict[str, float] = collections.defaultdict(float)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.attempts = 0
+        self.status: typing.Optional[int] = None
+        self.error: typing.Optional[str] = None
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._stack: typing.List[float] = []
+
+    @property
+    def outcome(self) -> str:
+        if self.error:
+            return self.error
+        return "ok" if self.attempts else "cached"
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self.phases[name] += elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] += seconds
+        if self._stack:
+            self._stack[-1] += seconds
+
+    def timed(self, name: str, iterable: typing.Iterable[bytes]) -> typing.Iterator[bytes]:
+        """Yield from `iterable`, booking the wait for each item and its size"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            self.response_bytes += len(chunk)
+            yield chunk
+
+    async def atimed(self, name: str, iterable: typing.AsyncIterable[bytes]) -> typing.AsyncIterator[bytes]:
+        iterator = iterable.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - start)
+            self.response_bytes += len(chunk)
+            yield chunk
+
+    def wrap_file(self, file: typing.BinaryIO) -> TimedFile:
+        return TimedFile(file, self)
+
+    def finish(self) -> None:
+        self.phases["total"] = time.perf_counter() - self._start
+
+    def as_dict(self) -> typing.Dict:
+        return {
+            "started": self.started,
+            "endpoint": self.endpoint,
+            "model": self.model,
+            "generator": self.generator,
+            "backend": self.backend,
+            "outcome": self.outcome,
+            "status": self.status,
+            "attempts": self.attempts,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "phases": {name: round(self.phases[name], 6) for name in PHASES if name in self.phases},
+        }
+
+
+def current_timer() -> RequestTimer:
+    """The timer of the running generator call, or a throwaway one"""
+    return _current.get() or RequestTimer("")
+
+
+class Metrics:
+    """Histograms of request phases, with Prometheus and JSON export"""
+
+    EXPORT_INTERVAL = 15.0
+    WINDOW = 60.0
+    KEEP = 500
+
+    def __init__(
+        self,
+        export_path: typing.Optional[os.PathLike] = None,
+        export_interval: typing.Optional[float] = None,
+        window: typing.Optional[float] = None,
+        keep: typing.Optional[int] = None,
+    ) -> None:
+        self.export_path = Path(export_path or DATA_DIR.joinpath("metrics.prom"))
+        self.export_interval = export_interval or self.EXPORT_INTERVAL
+        self.window = window or self.WINDOW
+
+        self._lock = threading.Lock()
+        self._histograms: typing.Dict[typing.Tuple[str, str, str], Histogram] = {}
+        self._requests: typing.Dict[typing.Tuple[str, str, str], int] = collections.Counter()
+        self._bytes: typing.Dict[typing.Tuple[str, str, str], int] = collections.Counter()
+        self._recent: typing.Deque[typing.Dict] = collections.deque(maxlen=keep or self.KEEP)
+        self._in_flight = 0
+        self._exported = time.monotonic()
+        self._dirty = False
+
+    @classmethod
+    def from_config(cls) -> typing.Optional["Metrics"]:
+        config = dict(get_config("metrics"))
+        if not config.pop("enabled", True):
+            return None
+        return cls(**config)
+
+    @contextlib.contextmanager
+    def request(
+        self,
+        endpoint: str,
+        model: typing.Optional[str] = None,
+        generator: typing.Optional[str] = None,
+    ) -> typing.Iterator[RequestTimer]:
+        timer = RequestTimer(endpoint, model, generator)
+        token = _current.set(timer)
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield timer
+        except BaseException as e:
+            timer.error = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            timer.finish()
+            self.record(timer)
+
+    def record(self, timer: RequestTimer) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            for name, seconds in timer.phases.items():
+                self._observe(timer.endpoint, timer.model, name, seconds)
+            self._requests[timer.endpoint, timer.model, timer.outcome] += 1
+            self._bytes[timer.endpoint, timer.model, "request"] += timer.request_bytes
+            self._bytes[timer.endpoint, timer.model, "response"] += timer.response_bytes
+            self._recent.append(timer.as_dict())
+            self._dirty = True
+        self._maybe_export()
+
+    def observe(self, phase: str, seconds: float, endpoint: str = "", model: typing.Optional[str] = None) -> None:
+        with self._lock:
+            self._observe(endpoint, model or "", phase, seconds)
+            self._dirty = True
+
+    def _observe(self, endpoint: str, model: str, phase: str, seconds: float) -> None:
+        key = (endpoint, model, phase)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def snapshot(self) -> typing.Dict:
+        """Live figures over the last `window` seconds"""
+        since = time.time() - self.window
+        with self._lock:
+            recent = [record for record in self._recent if record["started"] + record["phases"]["total"] >= since]
+            in_flight = self._in_flight
+
+        latencies = sorted(record["phases"]["total"] for record in recent if record["outcome"] == "ok")
+        quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+        return {
+            "in_flight": in_flight,
+            "requests": len(recent),
+            "errors": sum(record["outcome"] not in {"ok", "cached"} for record in recent),
+            "per_minute": len(recent) * 60.0 / self.window,
+            "p50": quantile(0.5),
+            "p95": quantile(0.95),
+            "bytes_per_second": sum(record["response_bytes"] for record in recent) / self.window,
+        }
+
+    def to_json(self) -> typing.Dict:
+        with self._lock:
+            return {
+                "generated": time.time(),
+                "buckets": [str(bound) for bound in BUCKETS],
+                "histograms": [
+                    {
+                        "endpoint": endpoint, "model": model, "phase": phase,
+                        "count": histogram.count, "sum": histogram.sum, "counts": list(histogram.counts),
+                    }
+                    for (endpoint, model, phase), histogram in sorted(self._histograms.items())
+                ],
+                "requests": [
+                    {"endpoint": endpoint, "model": model, "outcome": outcome, "count": count}
+                    for (endpoint, model, outcome), count in sorted(self._requests.items())
+                ],
+                "bytes": [
+                    {"endpoint": endpoint, "model": model, "direction": direction, "total": total}
+                    for (endpoint, model, direction), total in sorted(self._bytes.items())
+                ],
+                "recent": list(self._recent),
+            }
+
+    def to_prometheus(self) -> str:
+        def labels(**values: str) -> str:
+            escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return ",".join(f'{key}="{escape(value)}"' for key, value in values.items())
+
+        lines = [
+            "# HELP image_generator_phase_seconds Time spent in each phase of a generator call.",
+            "# TYPE image_generator_phase_seconds histogram",
+        ]
+        with self._lock:
+            for (endpoint, model, phase), histogram in sorted(self._histograms.items()):
+                base = labels(endpoint=endpoint, model=model, phase=phase)
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    lines.append(f'image_generator_phase_seconds_bucket{{{base},le="{le}"}} {count}')
+                lines.append(f"image_generator_phase_seconds_sum{{{base}}} {histogram.sum}")
+                lines.append(f"image_generator_phase_seconds_count{{{base}}} {histogram.count}")
+
+            lines.append("# HELP image_generator_requests_total Generator calls by outcome.")
+            lines.append("# TYPE image_generator_requests_total counter")
+            for (endpoint, model, outcome), count in sorted(self._requests.items()):
+                lines.append(f"image_generator_requests_total{{{labels(endpoint=endpoint, model=model, outcome=outcome)}}} {count}")
+
+            lines.append("# HELP image_generator_bytes_total Request and response body bytes.")
+            lines.append("# TYPE image_generator_bytes_total counter")
+            for (endpoint, model, direction), total in sorted(self._bytes.items()):
+                lines.append(f"image_generator_bytes_total{{{labels(endpoint=endpoint, model=model, direction=direction)}}} {total}")
+
+            lines.append("# HELP image_generator_in_flight Generator calls in progress.")
+            lines.append("# TYPE image_generator_in_flight gauge")
+            lines.append(f"image_generator_in_flight {self._in_flight}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: typing.Optional[os.PathLike] = None) -> Path:
+        """Write all metrics to `path`, as JSON if it ends in .json, else Prometheus text"""
+        path = Path(path or self.export_path)
+        text = json.dumps(self.to_json()) if path.suffix == ".json" else self.to_prometheus()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temppath = path.with_name(f".{path.name}.tmp")
+        with open(temppath, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temppath, path)
+        return path
+
+    def _maybe_export(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty or (not force and now - self._exported < self.export_interval):
+                return
+            self._exported, self._dirty = now, False
+        try:
+            self.export()
+        except OSError as e:
+            logger.warning(f"Could not export metrics: {e}")
+
+    def flush(self) -> None:
+        self._maybe_export(force=True)
+
+
+_metrics: typing.Optional[Metrics] = None
+_metrics_loaded = False
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> typing.Optional[Metrics]:
+    global _metrics, _metrics_loaded
+    with _metrics_lock:
+        if not _metrics_loaded:
+            _metrics = Metrics.from_config()
+            _metrics_loaded = True
+            if _metrics is not None:
+                atexit.register(_metrics.flush)
+        return _metrics
+
+
+def set_metrics(metrics: typing.Optional[Metrics]) -> None:
+    global _metrics, _metrics_loaded
+    with _metrics_lock:
+        _metrics, _metrics_loaded = metrics, True
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import typing
+import threading
+import dataclasses
+from pathlib import Path
+
+from core import exceptions
+from core.logger import logger
+from core.paths import CACHE_DIR
+from core.utils import get_config, get_models
+
+
+@dataclasses.dataclass(frozen=True)
+class ModelLimits:
+    min_size: typing.Optional[int] = None
+    max_size: typing.Optional[int] = None
+    size_step: typing.Optional[int] = None
+    min_steps: typing.Optional[int] = None
+    max_steps: typing.Optional[int] = None
+    min_guidance: typing.Optional[float] = None
+    max_guidance: typing.Optional[float] = None
+    output_formats: typing.Tuple[str, ...] = ()
+
+    def merge(self, overrides: typing.Dict) -> "ModelLimits":
+        if "output_formats" in overrides:
+            overrides = {**overrides, "output_formats": tuple(overrides["output_formats"])}
+        return dataclasses.replace(self, **overrides)
+
+
+@dataclasses.dataclass(frozen=True)
+class GeneratorInfo:
+    name: str
+    pipeline: str
+    models: typing.Tuple[str, ...]
+    image: bool
+    condition: bool
+    limits: ModelLimits
+
+
+@dataclasses.dataclass(frozen=True)
+class ModelInfo:
+    id: str
+    name: str
+    generators: typing.Tuple[str, ...]
+    pipelines: typing.Tuple[str, ...]
+    base_resolution: typing.Optional[typing.Tuple[int, int]] = None
+
+
+class ModelRegistry:
+    """Indexed model catalog: local models.toml, optionally refreshed from the API.
+
+    The remote list only decides which models each generator offers, limits
+    always come from models.toml. The last remote answer is cached on disk
+    with its ETag, so refreshes are conditional and startup stays offline.
+    """
+
+    URL = "https://api.getimg.ai/v1/models"
+    MAX_AGE_HOURS = 24.0
+
+    CONDITION = "Condition"
+    SCHEDULER = "Scheduler"
+    MODEL_LIMITS = "Model Limits"
+
+    def __init__(
+        self,
+        catalog: typing.Optional[typing.Dict] = None,
+        *,
+        url: typing.Optional[str] = None,
+        max_age_hours: typing.Optional[float] = None,
+        cache_path: typing.Optional[os.PathLike] = None,
+    ) -> None:
+        self.catalog = catalog if catalog is not None else get_models()
+        self.url = self.URL if url is None else url
+        self.max_age = (max_age_hours or self.MAX_AGE_HOURS) * 3600
+        self.cache_path = Path(cache_path or CACHE_DIR.joinpath("models.json"))
+
+        self._lock = threading.Lock()
+        self._remote = self._load_remote()
+        self._index()
+
+    @classmethod
+    def from_config(cls) -> "ModelRegistry":
+        return cls(**get_config("models"))
+
+    @property
+    def generators(self) -> typing.List[str]:
+        return list(self._generators)
+
+    @property
+    def conditions(self) -> typing.List[str]:
+        return list(self.catalog.get(self.CONDITION, {}).get("models", []))
+
+    @property
+    def schedulers(self) -> typing.List[str]:
+        return list(self.catalog.get(self.SCHEDULER, {}).get("models", []))
+
+    def generator(self, name: str) -> GeneratorInfo:
+        return self._generators[name]
+
+    def models(self, generator: str) -> typing.List[str]:
+        return list(self._generators[generator].models)
+
+    def get(self, model: str) -> typing.Optional[ModelInfo]:
+        return self._models.get(model)
+
+    def limits(self, generator: str, model: typing.Optional[str] = None) -> ModelLimits:
+        limits = self._generators[generator].limits
+        overrides = self.catalog.get(self.MODEL_LIMITS, {}).get(model) if model else None
+        return limits.merge(overrides) if overrides else limits
+
+    def _index(self) -> None:
+        remote: typing.Dict[str, typing.List[typing.Dict]] = {}
+        for entry in self._remote.get("models") or []:
+            if not isinstance(entry, dict) or "id" not in entry:
+                continue
+            for pipeline in entry.get("pipelines") or []:
+                remote.setdefault(pipeline, []).append(entry)
+
+        generators: typing.Dict[str, GeneratorInfo] = {}
+        models: typing.Dict[str, ModelInfo] = {}
+        for name, section in self.catalog.items():
+            if not isinstance(section, dict) or "pipeline" not in section:
+                continue
+            pipeline = section["pipeline"]
+            entries = remote.get(pipeline) or [{"id": model} for model in section.get("models", [])]
+            generators[name] = GeneratorInfo(
+                name=name,
+                pipeline=pipeline,
+                models=tuple(entry["id"] for entry in entries),
+                image=section.get("image", False),
+                condition=section.get("condition", False),
+                limits=ModelLimits().merge(section.get("limits", {})),
+            )
+
+            for entry in entries:
+                known = models.get(entry["id"])
+                pipelines = entry.get("pipelines") or ((known.pipelines if known else ()) + (pipeline,))
+                resolution = entry.get("base_resolution") or {}
+                models[entry["id"]] = ModelInfo(
+                    id=entry["id"],
+                    name=entry.get("name") or entry["id"],
+                    generators=(known.generators if known else ()) + (name,),
+                    pipelines=tuple(pipelines),
+                    base_resolution=(resolution["width"], resolution["height"]) if "width" in resolution else None,
+                )
+
+        with self._lock:
+            self._generators, self._models = generators, models
+
+    def validate(self, generator: str, payload: typing.Dict) -> None:
+        """Raise InvalidRequest if `payload` breaks the catalog limits"""
+        if generator not in self._generators:
+            return
+
+        problems = []
+        model = payload.get("model")
+        if model is not None and model not in self._generators[generator].models:
+            problems.append(f"model '{model}' is not available for {generator}")
+
+        limits = self.limits(generator, model)
+        for key in ("width", "height"):
+            value = payload.get(key)
+            if value is None:
+                continue
+            if limits.min_size is not None and value < limits.min_size:
+                problems.append(f"{key} {value} is below {limits.min_size}")
+            if limits.max_size is not None and value > limits.max_size:
+                problems.append(f"{key} {value} is above {limits.max_size}")
+            if limits.size_step and value % limits.size_step:
+                problems.append(f"{key} {value} is not a multiple of {limits.size_step}")
+
+        for key, low, high in (
+            ("steps", limits.min_steps, limits.max_steps),
+            ("guidance", limits.min_guidance, limits.max_guidance),
+        ):
+            value = payload.get(key)
+            if value is None:
+                continue
+            if (low is not None and value < low) or (high is not None and value > high):
+                problems.append(f"{key} {value} is outside {low} - {high}")
+
+        if payload.get("controlnet") is not None and self.conditions and payload["controlnet"] not in self.conditions:
+            problems.append(f"unknown condition '{payload['controlnet']}'")
+        if payload.get("scheduler") is not None and self.schedulers and payload["scheduler"] not in self.schedulers:
+            problems.append(f"unknown scheduler '{payload['scheduler']}'")
+        if payload.get("output_format") is not None and limits.output_formats:
+            if payload["output_format"] not in limits.output_formats:
+                problems.append(f"output format '{payload['output_format']}' is not supported")
+
+        if problems:
+            raise exceptions.InvalidRequest(problems)
+
+    def _load_remote(self) -> typing.Dict:
+        try:
+            with open(self.cache_path, encoding="utf-8") as file:
+                remote = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(remote, dict) or remote.get("url") != self.url:
+            return {}
+        return remote
+
+    def _save_remote(self, remote: typing.Dict) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temppath = self.cache_path.with_name(f".{self.cache_path.name}.tmp")
+        with open(temppath, "w", encoding="utf-8") as file:
+            json.dump(remote, file)
+        os.replace(temppath, self.cache_path)
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self._remote.get("fetched", 0) > self.max_age
+
+    def refresh(self, force: bool = False) -> bool:
+        """Fetch the remote model list if the cached copy is stale.
+
+        Returns True when the catalog changed. Network errors are logged and
+        leave the current catalog in place.
+        """
+        if not self.url or not (force or self.stale):
+            return False
+
+        from core.api.transport import get_transport
+
+        transport = get_transport()
+        try:
+            headers = transport.get_headers()
+            if self._remote.get("etag"):
+                headers["if-none-match"] = self._remote["etag"]
+            if self._remote.get("last_modified"):
+                headers["if-modified-since"] = self._remote["last_modified"]
+
+            response = transport.get(self.url, headers=headers)
+            if response.status_code == 304:
+                logger.debug("Model catalog is up to date")
+                self._remote = {**self._remote, "fetched": time.time()}
+                self._save_remote(self._remote)
+                return False
+            response.raise_for_status()
+            body = response.json()
+        except Exception as e:
+            logger.warning(f"Could not refresh the model catalog: {e!r}")
+            return False
+
+        remote = {
+            "url": self.url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched": time.time(),
+            "models": body.get("models", body.get("data")) if isinstance(body, dict) else body,
+        }
+        changed = remote["models"] != self._remote.get("models")
+        self._remote = remote
+        self._save_remote(remote)
+        if changed:
+            logger.info(f"Model catalog refreshed ({len(remote['models'] or [])} models)")
+            self._index()
+        return changed
+
+
+_registry: typing.Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry.from_config()
+        return _registry
+
+
+def set_model_registry(registry: ModelRegistry) -> None:
+    global _registry
+    with _registry_lock:
+        _registry = registry
@@ -0,0 +1,155 @@
+import os
+import queue
+import typing
+import functools
+import dataclasses
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from core.logger import logger
+from core.api.preprocess import image_file
+from core.api.generators import BaseGenerator, get_generator
+
+
+class Stage:
+    """One step of a pipeline, e.g. `Stage("UpScale", model="real-esrgan-4x")`"""
+
+    CONCURRENCY = 4
+
+    def __init__(
+        self,
+        generator: typing.Union[str, typing.Type[BaseGenerator]],
+        *,
+        concurrency: typing.Optional[int] = None,
+        save: bool = False,
+        **params,
+    ) -> None:
+        self.generator = get_generator(generator) if isinstance(generator, str) else generator
+        self.concurrency = concurrency or self.CONCURRENCY
+        self.save = save
+        self.params = params
+
+    @property
+    def name(self) -> str:
+        return self.generator.__name__
+
+    def create(self, image: typing.Optional[str], item: typing.Optional[typing.Dict] = None) -> BaseGenerator:
+        params = dict(self.params)
+        if item is not None:
+            params.update(item)
+        if image is not None:
+            params["image"] = image
+
+        image_path = params.pop("image_path", None)
+        if image_path is not None:
+            params["image"] = image_file(image_path, self.generator.MAX_INPUT_SIZE)
+
+        return self.generator(**params)
+
+
+@dataclasses.dataclass
+class PipelineResult:
+    index: int
+    output: typing.Optional[Path]
+    seeds: typing.List[int]
+    error: typing.Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Pipeline:
+    """Chains generators so each stage's image feeds the next one.
+
+    Intermediate results stay base64 and are passed to the next stage as-is,
+    only the last stage is decoded to disk. Every stage has its own worker
+    pool, so item 2 can be generating while item 1 is being upscaled.
+    """
+
+    def __init__(self, *stages: Stage) -> None:
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+
+    def run(
+        self,
+        items: typing.Iterable[typing.Dict],
+        directory: os.PathLike,
+    ) -> typing.Iterator[PipelineResult]:
+        """Run every item through all stages, yielding results as they finish.
+
+        Items are the first stage's parameters. An optional `output` key sets
+        the final file name, relative to `directory`.
+        """
+        directory = Path(directory)
+        results: "queue.Queue[PipelineResult]" = queue.Queue()
+        executors = [
+            ThreadPoolExecutor(stage.concurrency, thread_name_prefix=f"pipeline-{stage.name}")
+            for stage in self.stages
+        ]
+
+        def submit(index: int, stage_no: int, value: typing.Any, item: typing.Dict, seeds: typing.List[int]) -> None:
+            try:
+                future = executors[stage_no].submit(self._run_stage, index, stage_no, value, item, directory)
+            except RuntimeError as e:
+                # The caller stopped iterating and the pools are shut down
+                results.put(PipelineResult(index, None, seeds, e))
+                return
+            future.add_done_callback(functools.partial(done, index, stage_no, item, seeds))
+
+        def done(index: int, stage_no: int, item: typing.Dict, seeds: typing.List[int], future: Future) -> None:
+            if future.cancelled():
+                return
+            try:
+                value, seed = future.result()
+            except Exception as e:
+                logger.error(f"Pipeline item {index} failed at {self.stages[stage_no].name}: {e}")
+                results.put(PipelineResult(index, None, seeds, e))
+                return
+
+            seeds = seeds + [seed]
+            if stage_no + 1 < len(self.stages):
+                submit(index, stage_no + 1, value, item, seeds)
+            else:
+                results.put(PipelineResult(index, value, seeds))
+
+        count = 0
+        try:
+            for index, item in enumerate(items):
+                submit(index, 0, None, item, [])
+                count += 1
+            for _ in range(count):
+                yield results.get()
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_stage(
+        self,
+        index: int,
+        stage_no: int,
+        image: typing.Optional[str],
+        item: typing.Dict,
+        directory: Path,
+    ) -> typing.Tuple[typing.Any, int]:
+        stage = self.stages[stage_no]
+        params = {key: value for key, value in item.items() if key != "output"} if stage_no == 0 else None
+        generator = stage.create(image, params)
+
+        if stage_no == len(self.stages) - 1:
+            return generator.generate_file(directory, item.get("output"))
+
+        imgb64, seed = generator.generate_image()
+        if stage.save:
+            filename = f"{index}-{stage.name}-{seed}.{generator.output_format or 'png'}"
+            generator.submit_image(imgb64, seed, directory, filename).add_done_callback(
+                functools.partial(self._saved, index, stage.name)
+            )
+        return imgb64, seed
+
+    @staticmethod
+    def _saved(index: int, name: str, future: Future) -> None:
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Pipeline item {index} could not save its {name} image: {error}")
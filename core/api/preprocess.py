@@ -0,0 +1,113 @@
+import os
+import typing
+import hashlib
+import threading
+from pathlib import Path
+
+from PyQt5 import QtCore, QtGui
+
+from core.logger import logger
+from core.paths import CACHE_DIR
+from core.utils import get_config
+from core.api.cache import ResultCache
+from core.api.body import ImageFile
+
+
+class ImagePreprocessor:
+    """Downscales and re-encodes input images once per file version.
+
+    Results are kept on disk keyed by path, mtime and size and streamed from
+    there when a request is sent, so the same input is not re-read or
+    re-encoded. PNG and JPEG inputs that already fit are sent as they are
+    unless they are larger than `reencode_kb`.
+    """
+
+    DISK_MB = 512
+    JPEG_QUALITY = 95
+    REENCODE_KB = 1024
+
+    def __init__(
+        self,
+        disk_mb: typing.Optional[int] = None,
+        jpeg_quality: typing.Optional[int] = None,
+        reencode_kb: typing.Optional[int] = None,
+    ) -> None:
+        self.jpeg_quality = jpeg_quality or self.JPEG_QUALITY
+        self.reencode_bytes = (reencode_kb or self.REENCODE_KB) * 1024
+        self.store = ResultCache(CACHE_DIR.joinpath("inputs"), max_mb=disk_mb or self.DISK_MB)
+
+    @classmethod
+    def from_config(cls) -> "ImagePreprocessor":
+        return cls(**get_config("preprocess"))
+
+    def source(self, filepath: os.PathLike, max_size: typing.Optional[int] = None) -> ImageFile:
+        """Preprocessed copy of `filepath` on disk, streamed when the request is sent"""
+        filepath = Path(filepath).resolve()
+        stat = filepath.stat()
+        version = hashlib.sha256(f"{filepath}\0{stat.st_mtime_ns}\0{stat.st_size}".encode()).hexdigest()
+        key = f"{version}-{max_size or 0}"
+
+        cachepath = self.store.get(key)
+        if cachepath is None:
+            cachepath = self.store.run(key, lambda partpath: self._preprocess(filepath, partpath, max_size), ".img")
+        return ImageFile(cachepath)
+
+    def _preprocess(self, filepath: Path, partpath: Path, max_size: typing.Optional[int]) -> None:
+        with open(filepath, "rb") as file:
+            data = file.read()
+
+        buffer = QtCore.QBuffer()
+        buffer.setData(data)
+        buffer.open(QtCore.QIODevice.ReadOnly)
+
+        reader = QtGui.QImageReader(buffer)
+        reader.setAutoTransform(True)
+        fmt = bytes(reader.format()).decode().lower()
+        size = reader.size()
+
+        scale = 1.0
+        if max_size and size.isValid():
+            scale = min(1.0, max_size / max(size.width(), size.height()))
+
+        keep = scale == 1.0 and fmt in {"png", "jpeg", "jpg"}
+        if keep and len(data) <= self.reencode_bytes:
+            with open(partpath, "wb") as file:
+                file.write(data)
+            return
+
+        if scale < 1.0:
+            reader.setScaledSize(QtCore.QSize(round(size.width() * scale), round(size.height() * scale)))
+
+        image = reader.read()
+        if image.isNull():
+            raise ValueError(f"Unable to decode image: {reader.errorString()}")
+
+        if fmt in {"jpeg", "jpg"}:
+            saved = image.save(str(partpath), "JPEG", self.jpeg_quality)
+        else:
+            saved = image.save(str(partpath), "PNG")
+        if not saved:
+            raise ValueError(f"Unable to encode image to {partpath}")
+
+        if keep and partpath.stat().st_size >= len(data):
+            with open(partpath, "wb") as file:
+                file.write(data)
+            logger.debug("Re-encoding did not shrink input of {} bytes, sending it as is", len(data))
+            return
+        logger.debug("Preprocessed input {}x{} -> {}x{}", size.width(), size.height(), image.width(), image.height())
+
+
+_preprocessor: typing.Optional[ImagePreprocessor] = None
+_preprocessor_lock = threading.Lock()
+
+
+def get_preprocessor() -> ImagePreprocessor:
+    global _preprocessor
+    with _preprocessor_lock:
+        if _preprocessor is None:
+            _preprocessor = ImagePreprocessor.from_config()
+        return _preprocessor
+
+
+def image_file(filepath: os.PathLike, max_size: typing.Optional[int] = None) -> ImageFile:
+    return get_preprocessor().source(filepath, max_size)
@@ -0,0 +1,175 @@
+import time
+import random
+import typing
+import threading
+import email.utils
+
+import requests
+import urllib3
+
+from core import exceptions
+from core.utils import get_config
+
+
+class RetryPolicy:
+    """Jittered exponential backoff with per-attempt and overall deadlines.
+
+    Generation requests are POSTs that are billed and not idempotent, so by
+    default only failures before the server got the request are retried,
+    plus statuses that ask for it. Read timeouts and broken bodies are
+    retried only for endpoints listed in `retry_reads`.
+    """
+
+    ATTEMPTS = 5
+    BACKOFF = 0.5
+    MAX_BACKOFF = 30.0
+    ATTEMPT_TIMEOUT = 180.0
+    DEADLINE = 600.0
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    RETRY_EXCEPTIONS = (
+        requests.ConnectionError,
+        ConnectionError,
+        exceptions.RetryableResponse,
+    )
+    READ_EXCEPTIONS = (
+        requests.ReadTimeout,
+        requests.exceptions.ChunkedEncodingError,
+        TimeoutError,
+        exceptions.DeadlineExceeded,
+    )
+
+    def __init__(
+        self,
+        attempts: typing.Optional[int] = None,
+        backoff: typing.Optional[float] = None,
+        max_backoff: typing.Optional[float] = None,
+        attempt_timeout: typing.Optional[float] = None,
+        deadline: typing.Optional[float] = None,
+        retry_reads: typing.Optional[typing.Sequence[str]] = None,
+    ) -> None:
+        self.attempts = attempts or self.ATTEMPTS
+        self.backoff = backoff if backoff is not None else self.BACKOFF
+        self.max_backoff = max_backoff or self.MAX_BACKOFF
+        self.attempt_timeout = attempt_timeout or self.ATTEMPT_TIMEOUT
+        self.deadline = deadline or self.DEADLINE
+        self.retry_reads = frozenset(retry_reads or ())
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        return cls(**get_config("retry"))
+
+    def start(
+        self,
+        retryable: typing.Tuple[typing.Type[BaseException], ...] = (),
+        read_retryable: typing.Tuple[typing.Type[BaseException], ...] = (),
+        endpoint: typing.Optional[str] = None,
+    ) -> "RetryState":
+        """Begin retrying a request to `endpoint`.
+
+        `retryable` and `read_retryable` add transport specific errors to
+        RETRY_EXCEPTIONS and READ_EXCEPTIONS.
+        """
+        retryable = self.RETRY_EXCEPTIONS + retryable
+        reads = endpoint in self.retry_reads
+        if reads:
+            retryable += self.READ_EXCEPTIONS + read_retryable
+        return RetryState(self, retryable, reads)
+
+    def raise_for_status(self, status_code: int, retry_after: typing.Optional[str] = None) -> None:
+        if status_code in self.RETRY_STATUSES:
+            raise exceptions.RetryableResponse(status_code, parse_retry_after(retry_after))
+
+
+class RetryState:
+    def __init__(
+        self,
+        policy: RetryPolicy,
+        retryable: typing.Tuple[typing.Type[BaseException], ...],
+        reads: bool = False,
+    ) -> None:
+        self.policy = policy
+        self.retryable = retryable
+        self.reads = reads
+        self.attempt = 0
+        self.deadline = time.monotonic() + policy.deadline
+        self.attempt_deadline = self.deadline
+
+    @property
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def next_attempt(self) -> float:
+        """Start an attempt and return its timeout in seconds"""
+        if self.remaining <= 0:
+            raise exceptions.DeadlineExceeded("Overall request deadline exceeded")
+        self.attempt += 1
+        timeout = min(self.policy.attempt_timeout, self.remaining)
+        self.attempt_deadline = time.monotonic() + timeout
+        return timeout
+
+    def check_deadline(self) -> None:
+        if time.monotonic() > self.attempt_deadline:
+            raise exceptions.DeadlineExceeded(f"Attempt {self.attempt} deadline exceeded")
+
+    def can_retry(self) -> bool:
+        return self.attempt < self.policy.attempts and self.remaining > 0
+
+    def backoff(self, error: BaseException) -> typing.Optional[float]:
+        """Return the delay before the next attempt, or None if `error` is final"""
+        if not isinstance(error, self.retryable) or not self.can_retry():
+            return None
+        if not self.reads and read_timeout(error):
+            return None
+
+        ceiling = min(self.policy.max_backoff, self.policy.backoff * 2 ** (self.attempt - 1))
+        delay = random.uniform(0, ceiling)
+
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        if delay >= self.remaining:
+            return None
+        return delay
+
+
+def read_timeout(error: BaseException) -> bool:
+    """requests reports a body that stalls mid-stream as a ConnectionError"""
+    return (
+        isinstance(error, requests.ConnectionError)
+        and bool(error.args)
+        and isinstance(error.args[0], urllib3.exceptions.ReadTimeoutError)
+    )
+
+
+def parse_retry_after(value: typing.Optional[str]) -> typing.Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+_policy: typing.Optional[RetryPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_retry_policy() -> RetryPolicy:
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = RetryPolicy.from_config()
+        return _policy
+
+
+def set_retry_policy(policy: RetryPolicy) -> None:
+    global _policy
+    with _policy_lock:
+        _policy = policy
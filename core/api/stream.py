@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import uuid
+import itertools
+import typing
+import binascii
+from pathlib import Path
+
+
+CHUNK_SIZE = 64 * 1024
+
+IMAGE_KEY = re.compile(rb'"image"\s*:\s*"')
+
+
+class ImageStreamDecoder:
+    """Incremental parser for `{"image": "<base64>", ...}` response bodies.
+
+    The base64 image field is decoded straight into `file` while the body is
+    read, everything else is kept and parsed once when the stream is closed.
+    """
+
+    HEAD, IMAGE, TAIL = range(3)
+
+    def __init__(self, file: typing.BinaryIO) -> None:
+        self.file = file
+        self.state = self.HEAD
+        self.size = 0
+
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._carry = b""
+
+    def feed(self, chunk: bytes) -> None:
+        if self.state == self.HEAD:
+            self._head += chunk
+            match = IMAGE_KEY.search(self._head)
+            if match is None:
+                return
+            chunk = bytes(self._head[match.end():])
+            del self._head[match.end() - 1:]
+            self._head += b"null"
+            self.state = self.IMAGE
+
+        if self.state == self.IMAGE:
+            end = chunk.find(b'"')
+            if end == -1:
+                self._decode(chunk)
+                return
+            self._decode(chunk[:end])
+            chunk = chunk[end + 1:]
+            self.state = self.TAIL
+
+        self._tail += chunk
+
+    def _decode(self, data: bytes) -> None:
+        data = self._carry + data
+        if data.endswith(b"\\"):
+            data, self._carry = data[:-1], b"\\"
+        else:
+            self._carry = b""
+        data = data.replace(b"\\/", b"/")
+
+        usable = len(data) - len(data) % 4
+        self._carry = data[usable:] + self._carry
+        if usable:
+            decoded = binascii.a2b_base64(data[:usable])
+            self.file.write(decoded)
+            self.size += len(decoded)
+
+    def close(self) -> typing.Dict:
+        if self.state == self.IMAGE or self._carry:
+            raise ValueError("Response body ended inside the image field")
+        return json.loads(bytes(self._head + self._tail))
+
+    @property
+    def has_image(self) -> bool:
+        return self.state == self.TAIL
+
+
+def part_path(directory: os.PathLike) -> Path:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory.joinpath(f".{uuid.uuid4().hex}.part")
+
+
+def commit_part(partpath: Path, filename: str) -> Path:
+    filepath = partpath.with_name(filename)
+    os.replace(partpath, filepath)
+    return filepath
+
+
+def commit_unique(partpath: Path, name: str, suffix: str) -> Path:
+    """Move `partpath` to `name` + `suffix`, numbering the name instead of replacing a file"""
+    for index in itertools.count():
+        filepath = partpath.with_name(f"{name}-{index}{suffix}" if index else f"{name}{suffix}")
+        try:
+            os.link(partpath, filepath)
+        except FileExistsError:
+            continue
+        except OSError:
+            try:
+                os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                continue
+            try:
+                os.replace(partpath, filepath)
+            except BaseException:
+                filepath.unlink(missing_ok=True)
+                raise
+        else:
+            partpath.unlink()
+        return filepath
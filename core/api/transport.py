@@ -0,0 +1,162 @@
+import os
+import typing
+import threading
+
+import urllib3
+import requests
+from urllib3 import connection, connectionpool
+from requests.adapters import HTTPAdapter
+
+from core import exceptions
+from core.logger import logger
+from core.paths import SETTINGS_DIR
+from core.utils import get_config
+from core.api.metrics import current_timer
+
+
+class TimedConnectionMixin:
+    """Books connect, upload and server wait on the current request timer"""
+
+    def connect(self) -> None:
+        with current_timer().phase("connect"):
+            super().connect()
+
+    def request(self, *args, **kwargs) -> None:
+        with current_timer().phase("upload"):
+            super().request(*args, **kwargs)
+
+    def getresponse(self) -> "urllib3.HTTPResponse":
+        with current_timer().phase("wait"):
+            return super().getresponse()
+
+
+class TimedHTTPConnection(TimedConnectionMixin, connection.HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, connection.HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(connectionpool.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(connectionpool.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class Transport:
+    """Pooled keep-alive HTTP session shared by all generators"""
+
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 16
+    CONNECT_TIMEOUT = 10.0
+    READ_TIMEOUT = 120.0
+
+    def __init__(
+        self,
+        *,
+        pool_connections: typing.Optional[int] = None,
+        pool_maxsize: typing.Optional[int] = None,
+        connect_timeout: typing.Optional[float] = None,
+        read_timeout: typing.Optional[float] = None,
+        key_path: typing.Optional[os.PathLike] = None,
+    ) -> None:
+        self.pool_connections = pool_connections or self.POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or self.POOL_MAXSIZE
+        self.connect_timeout = connect_timeout or self.CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or self.READ_TIMEOUT
+        self.key_path = key_path or SETTINGS_DIR.joinpath("api.key")
+
+        self.session = self.create_session()
+
+        self._lock = threading.Lock()
+        self._key_mtime = None
+        self._headers = None
+
+    @classmethod
+    def from_config(cls) -> "Transport":
+        return cls(**get_config("transport"))
+
+    @property
+    def timeout(self) -> typing.Tuple[float, float]:
+        return self.connect_timeout, self.read_timeout
+
+    def create_session(self) -> requests.Session:
+        adapter = TimedHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=True,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["connection"] = "keep-alive"
+        return session
+
+    def _read_api_key(self) -> str:
+        with open(self.key_path) as file:
+            api_key = file.read().strip()
+        if not api_key:
+            raise exceptions.NoApiKey
+        return api_key
+
+    def get_headers(self) -> typing.Dict[str, str]:
+        try:
+            mtime = os.stat(self.key_path).st_mtime_ns
+        except (FileExistsError, FileNotFoundError):
+            raise exceptions.NoFileWithApiKey
+
+        with self._lock:
+            if mtime != self._key_mtime:
+                logger.debug("Reloading API key")
+                self._headers = {
+                    "accept": "application/json",
+                    "content-type": "application/json",
+                    "authorization": f"Bearer {self._read_api_key()}"
+                }
+                self._key_mtime = mtime
+            return dict(self._headers)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("headers", self.get_headers())
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("headers", self.get_headers())
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_transport: typing.Optional[Transport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport.from_config()
+        return _transport
+
+
+def set_transport(transport: Transport) -> None:
+    global _transport
+    with _transport_lock:
+        if _transport is not None and _transport is not transport:
+            _transport.close()
+        _transport = transport
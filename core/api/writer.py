@@ -0,0 +1,189 @@
+import os
+import re
+import time
+import string
+import typing
+import threading
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from core.logger import logger
+from core.utils import get_config
+from core.history import HistoryIndex
+from core.api.stream import commit_unique
+from core.api.metadata import embed_metadata, write_sidecar
+
+
+PIL_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+TEMPLATE_FIELDS = frozenset({"seed", "generator", "model", "prompt", "date", "time"})
+
+
+def slugify(text: str, length: int = 40) -> str:
+    return re.sub(r"[^\w-]+", "-", text.lower()).strip("-")[:length].rstrip("-")
+
+
+class ImageWriter:
+    """Finishes downloaded images on a small pool of writer threads.
+
+    Each image arrives as a `.part` file next to its destination. A writer
+    converts it if the API could not deliver the requested format, embeds
+    or side-cars the metadata, renames it into place and indexes it. At most
+    `queue_size` images are queued or being written, `submit` blocks beyond
+    that so downloads slow down when the disk falls behind.
+
+    Names come from `template` unless given explicitly and never replace
+    an existing file, a `-1`, `-2`, ... suffix is added instead.
+    """
+
+    TEMPLATE = "{seed}"
+    WORKERS = 2
+    QUEUE_SIZE = 8
+    QUALITY = 90
+
+    def __init__(
+        self,
+        template: typing.Optional[str] = None,
+        output_format: str = "png",
+        quality: typing.Optional[int] = None,
+        workers: typing.Optional[int] = None,
+        queue_size: typing.Optional[int] = None,
+    ) -> None:
+        if output_format not in PIL_FORMATS:
+            raise ValueError(f"Unknown image format {output_format}, choose from {', '.join(PIL_FORMATS)}")
+        self.template = template or self.TEMPLATE
+        fields = {name for _, name, _, _ in string.Formatter().parse(self.template) if name}
+        if fields - TEMPLATE_FIELDS:
+            raise ValueError(
+                f"Unknown name template fields {', '.join(sorted(fields - TEMPLATE_FIELDS))}, "
+                f"choose from {', '.join(sorted(TEMPLATE_FIELDS))}"
+            )
+        self.output_format = output_format
+        self.quality = quality or self.QUALITY
+
+        self._slots = threading.BoundedSemaphore(queue_size or self.QUEUE_SIZE)
+        self._executor = ThreadPoolExecutor(workers or self.WORKERS, thread_name_prefix="writer")
+
+    @classmethod
+    def from_config(cls) -> "ImageWriter":
+        return cls(**get_config("writer"))
+
+    @staticmethod
+    def request_format(output_format: typing.Optional[str], supported: typing.Sequence[str]) -> typing.Optional[str]:
+        """Format to ask the API for, PNG when it cannot deliver `output_format` itself"""
+        if output_format is None or not supported or output_format in supported:
+            return output_format
+        return "png"
+
+    def filename(self, metadata: typing.Dict) -> str:
+        now = time.localtime()
+        name = self.template.format(
+            seed=metadata.get("seed"),
+            generator=slugify(metadata.get("generator") or ""),
+            model=metadata.get("model") or "default",
+            prompt=slugify(metadata.get("prompt") or ""),
+            date=time.strftime("%Y%m%d", now),
+            time=time.strftime("%H%M%S", now),
+        )
+        return name.replace(os.sep, "-").strip(". ") or str(metadata.get("seed"))
+
+    def submit(
+        self,
+        partpath: Path,
+        metadata: typing.Dict,
+        *,
+        filename: typing.Optional[str] = None,
+        output_format: typing.Optional[str] = None,
+        received_format: typing.Optional[str] = None,
+        history: typing.Optional[HistoryIndex] = None,
+    ) -> Future:
+        """Queue `partpath` for writing, blocking while the queue is full.
+
+        `received_format` is what the API sent, the file is converted to
+        `output_format` first if they differ.
+        """
+        if not self._slots.acquire(blocking=False):
+            logger.debug("Image writer queue is full, waiting for the disk")
+            self._slots.acquire()
+        try:
+            future = self._executor.submit(
+                self._write, partpath, metadata, filename, output_format, received_format, history
+            )
+        except BaseException:
+            self._slots.release()
+            partpath.unlink(missing_ok=True)
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def write(self, partpath: Path, metadata: typing.Dict, **options: typing.Any) -> Path:
+        return self.submit(partpath, metadata, **options).result()
+
+    def _write(
+        self,
+        partpath: Path,
+        metadata: typing.Dict,
+        filename: typing.Optional[str],
+        output_format: typing.Optional[str],
+        received_format: typing.Optional[str],
+        history: typing.Optional[HistoryIndex],
+    ) -> Path:
+        try:
+            if output_format is not None and output_format != (received_format or "png"):
+                partpath = self._convert(partpath, output_format)
+            embedded = embed_metadata(partpath, metadata)
+        except BaseException:
+            partpath.unlink(missing_ok=True)
+            raise
+
+        try:
+            if filename is not None:
+                filepath = commit_unique(partpath, *os.path.splitext(filename))
+            else:
+                filepath = commit_unique(partpath, self.filename(metadata), f".{output_format or 'png'}")
+        except BaseException:
+            partpath.unlink(missing_ok=True)
+            raise
+        if not embedded:
+            write_sidecar(filepath, metadata)
+
+        if history is not None:
+            history.add(filepath, metadata)
+        return filepath
+
+    def _convert(self, partpath: Path, output_format: str) -> Path:
+        from PIL import Image
+
+        converted = partpath.with_name(f"{partpath.stem}-{output_format}.part")
+        try:
+            with Image.open(partpath) as image:
+                if output_format == "jpeg" and image.mode not in {"RGB", "L"}:
+                    image = image.convert("RGB")
+                image.save(converted, format=PIL_FORMATS[output_format], quality=self.quality)
+        except BaseException:
+            converted.unlink(missing_ok=True)
+            raise
+        partpath.unlink()
+        return converted
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_writer: typing.Optional[ImageWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_image_writer() -> ImageWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ImageWriter.from_config()
+        return _writer
+
+
+def set_image_writer(writer: ImageWriter) -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer is not writer:
+            _writer.close()
+        _writer = writer
@@ -0,0 +1,219 @@
+import sys
+import json
+import time
+import typing
+import argparse
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from core.logger import logger, setup_logger
+from core.utils import canonical_hash, get_config
+from core.journal import JobJournal
+from core.api.generators import BaseGenerator, get_generator
+from core.api.preprocess import image_file
+from core.api.metrics import get_metrics
+
+
+def parse_args(argv: typing.Optional[typing.List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.cli",
+        description="Run generation jobs from a JSONL file without the GUI",
+    )
+    parser.add_argument("jobs", type=Path, help="JSONL file with one job spec per line")
+    parser.add_argument("-p", "--parallel", type=int, default=4, help="number of jobs in flight")
+    parser.add_argument("-o", "--output-dir", type=Path, default=Path("images"), help="directory for jobs without an output path")
+    parser.add_argument("-m", "--manifest", type=Path, help="results manifest (default: <jobs>.results.jsonl)")
+    parser.add_argument("-j", "--journal", type=Path, help="job journal database (default: shared journal)")
+    parser.add_argument("--metrics", type=Path, help="write request metrics here when done (.json or Prometheus text)")
+    parser.add_argument("--no-resume", action="store_true", help="run every job even if the journal marks it done")
+    parser.add_argument("--debug", action="store_true", help="enable debug logging")
+    return parser.parse_args(argv)
+
+
+def read_jobs(filepath: Path) -> typing.Iterator[typing.Tuple[int, typing.Dict]]:
+    with open(filepath, encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line_no, json.loads(line)
+
+
+def create_generator(spec: typing.Dict) -> BaseGenerator:
+    spec = dict(spec)
+    spec.pop("output", None)
+
+    generator = get_generator(spec.pop("type", "Text to Image"))
+
+    image_path = spec.pop("image_path", None)
+    if image_path is not None:
+        spec["image"] = image_file(image_path, generator.MAX_INPUT_SIZE)
+
+    return generator(**spec)
+
+
+def run_job(
+    line_no: int,
+    spec: typing.Dict,
+    output_dir: Path,
+    journal: typing.Optional[JobJournal],
+    job_id: typing.Optional[int],
+) -> Future:
+    """Download one job and queue its image, the future resolves to its manifest entry once written"""
+    output = spec.get("output")
+    result = {"line": line_no, "type": spec.get("type", "Text to Image"), "output": output}
+    entry: Future = Future()
+
+    if journal is not None:
+        journal.start(job_id)
+    start = time.perf_counter()
+    try:
+        generator = create_generator(spec)
+        if output:
+            directory, filename = Path(output).parent, Path(output).name
+        else:
+            directory, filename = output_dir, None
+        written, seed = generator.submit_file(directory, filename)
+    except Exception as e:
+        written, seed = Future(), None
+        written.set_exception(e)
+
+    def resolve(written: Future) -> None:
+        # Exceptions raised in a done callback are only logged, so the entry
+        # has to be completed here or main would wait for it forever
+        try:
+            entry.set_result(finish_job(result, journal, job_id, start, written, seed))
+        except Exception as e:
+            result.update(status="failed", error=f"{type(e).__name__}: {e}", elapsed=round(time.perf_counter() - start, 3))
+            entry.set_result(result)
+        except BaseException as e:
+            entry.set_exception(e)
+
+    written.add_done_callback(resolve)
+    return entry
+
+
+def finish_job(
+    result: typing.Dict,
+    journal: typing.Optional[JobJournal],
+    job_id: typing.Optional[int],
+    start: float,
+    written: Future,
+    seed: typing.Optional[int],
+) -> typing.Dict:
+    try:
+        filepath = written.result()
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+        if journal is not None:
+            journal.fail(job_id, result["error"], time.perf_counter() - start)
+    else:
+        result.update(status="done", seed=seed, output=str(filepath))
+        if journal is not None:
+            journal.finish(job_id, seed, filepath, time.perf_counter() - start)
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def open_journal(filepath: typing.Optional[Path]) -> typing.Optional[JobJournal]:
+    """The journal at `filepath` or the shared one, None when the journal is disabled in config.toml"""
+    if not get_config("journal").get("enabled", True):
+        logger.info("Job journal is disabled, finished jobs will not be skipped on the next run")
+        return None
+    return JobJournal(filepath) if filepath is not None else JobJournal.from_config()
+
+
+def plan_job(
+    journal: JobJournal,
+    jobs_path: Path,
+    line_no: int,
+    spec: typing.Dict,
+    resume: bool,
+) -> typing.Tuple[typing.Optional[int], typing.Optional[typing.Dict]]:
+    job_key = canonical_hash({"jobs": str(jobs_path.resolve()), "line": line_no, "spec": spec})
+    row = journal.latest(job_key)
+
+    if resume and row is not None:
+        if row["status"] == JobJournal.DONE and row["output"] and Path(row["output"]).exists():
+            return None, {
+                "line": line_no,
+                "type": spec.get("type", "Text to Image"),
+                "output": row["output"],
+                "status": "skipped",
+                "seed": row["seed"],
+                "elapsed": 0.0,
+            }
+        if row["status"] != JobJournal.DONE:
+            journal.reset(row["id"])
+            return row["id"], None
+
+    job_id = journal.record(spec, source="cli", generator=spec.get("type"), job_key=job_key)
+    return job_id, None
+
+
+def run(args: argparse.Namespace) -> int:
+    manifest_path = args.manifest or args.jobs.with_suffix(".results.jsonl")
+    journal = open_journal(args.journal)
+    jobs = list(read_jobs(args.jobs))
+    total = len(jobs)
+    failed = 0
+
+    logger.info(f"Running {total} jobs from {args.jobs} with {args.parallel} in flight")
+    start = time.perf_counter()
+
+    with open(manifest_path, "w", encoding="utf-8") as manifest, \
+            ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        futures = []
+        for line_no, spec in jobs:
+            job_id, skipped = None, None
+            if journal is not None:
+                job_id, skipped = plan_job(journal, args.jobs, line_no, spec, not args.no_resume)
+            if skipped is not None:
+                manifest.write(json.dumps(skipped) + "\n")
+                continue
+            futures.append(executor.submit(run_job, line_no, spec, args.output_dir, journal, job_id))
+
+        skipped = total - len(futures)
+        if skipped:
+            logger.info(f"Skipping {skipped} jobs already done in the journal")
+
+        # Each job resolves to a second future for its manifest entry, which
+        # joins the wait set so the worker moves on while the image is written
+        done = skipped
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                if isinstance(result, Future):
+                    pending.add(result)
+                    continue
+
+                done += 1
+                manifest.write(json.dumps(result) + "\n")
+                manifest.flush()
+
+                if result["status"] == "done":
+                    logger.info(f"[{done}/{total}] line {result['line']} seed={result['seed']} {result['elapsed']}s -> {result['output']}")
+                else:
+                    failed += 1
+                    logger.error(f"[{done}/{total}] line {result['line']} {result['error']}")
+
+    if journal is not None:
+        journal.close()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Finished {total - failed}/{total} jobs in {elapsed:.1f}s, manifest: {manifest_path}")
+
+    metrics = get_metrics()
+    if args.metrics and metrics is not None:
+        logger.info(f"Metrics: {metrics.export(args.metrics)}")
+    return 1 if failed else 0
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    args = parse_args(argv)
+    setup_logger(args.debug)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
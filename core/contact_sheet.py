@@ -0,0 +1,189 @@
+import os
+import typing
+import threading
+import multiprocessing
+from pathlib import Path
+from multiprocessing import shared_memory
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+
+import numpy as np
+
+
+Box = typing.Tuple[int, int, int, int]
+
+BACKGROUND = (39, 40, 41)
+FOREGROUND = (255, 246, 224)
+FAILED = (90, 34, 34)
+
+_attached: typing.Dict[str, typing.Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+
+def _canvas(name: str, shape: typing.Tuple[int, int, int]) -> np.ndarray:
+    """Worker side view of the shared canvas, attached once per process"""
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    return _attached[name][1]
+
+
+def _label(text: str, width: int, height: int, font_size: int) -> np.ndarray:
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(font_size)
+    except TypeError:
+        font = ImageFont.load_default()
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    if draw.textlength(text, font=font) > width - 8:
+        while len(text) > 1 and draw.textlength(text + "...", font=font) > width - 8:
+            text = text[:-1]
+        text += "..."
+    draw.text((width // 2, height // 2), text, fill=FOREGROUND, font=font, anchor="mm")
+    return np.asarray(image)
+
+
+def _draw_labels(name: str, shape: typing.Tuple[int, int, int], labels: typing.List[typing.Tuple[str, Box, int]]) -> None:
+    canvas = _canvas(name, shape)
+    for text, (x, y, width, height), font_size in labels:
+        canvas[y:y + height, x:x + width] = _label(text, width, height, font_size)
+
+
+def _place_tile(name: str, shape: typing.Tuple[int, int, int], path: str, box: Box) -> None:
+    from PIL import Image, ImageOps
+
+    x, y, width, height = box
+    with Image.open(path) as image:
+        image.draft("RGB", (width, height))
+        tile = np.asarray(ImageOps.contain(image.convert("RGB"), (width, height), Image.Resampling.BILINEAR))
+
+    top, left = (height - tile.shape[0]) // 2, (width - tile.shape[1]) // 2
+    canvas = _canvas(name, shape)
+    canvas[y:y + height, x:x + width] = BACKGROUND
+    canvas[y + top:y + top + tile.shape[0], x + left:x + left + tile.shape[1]] = tile
+
+
+def _fill(name: str, shape: typing.Tuple[int, int, int], box: Box, color: typing.Tuple[int, int, int]) -> None:
+    x, y, width, height = box
+    _canvas(name, shape)[y:y + height, x:x + width] = color
+
+
+def _save(name: str, shape: typing.Tuple[int, int, int], path: str) -> str:
+    from PIL import Image
+
+    partpath = f"{path}.part"
+    Image.fromarray(_canvas(name, shape)).save(partpath, format="PNG")
+    os.replace(partpath, path)
+    return path
+
+
+class ContactSheet:
+    """Labeled grid of result tiles, composed in a worker process.
+
+    The canvas is an RGB array in shared memory: worker processes decode,
+    scale and copy each tile into it with array slicing, while `canvas` here
+    shows the sheet as it fills in without any copying.
+    """
+
+    TILE_SIZE = 256
+    PADDING = 8
+    TITLE_HEIGHT = 36
+    HEADER_HEIGHT = 28
+    LABEL_WIDTH = 200
+    WORKERS = 2
+
+    def __init__(
+        self,
+        columns: typing.Sequence[str],
+        rows: typing.Sequence[str],
+        *,
+        title: str = "",
+        tile_size: typing.Optional[int] = None,
+        workers: typing.Optional[int] = None,
+    ) -> None:
+        self.columns = list(columns)
+        self.rows = list(rows)
+        self.title = title
+        self.tile_size = tile_size or self.TILE_SIZE
+
+        self.left = self.LABEL_WIDTH if any(self.rows) else self.PADDING
+        self.top = (self.TITLE_HEIGHT if title else 0) + self.HEADER_HEIGHT
+        step = self.tile_size + self.PADDING
+        self.shape = (self.top + len(self.rows) * step, self.left + len(self.columns) * step, 3)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)))
+        self.canvas = np.ndarray(self.shape, dtype=np.uint8, buffer=self._shm.buf)
+        self.canvas[:] = BACKGROUND
+
+        self._lock = threading.Lock()
+        self._pending: typing.Set[Future] = set()
+        self._executor = ProcessPoolExecutor(
+            workers or self.WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._submit(_draw_labels, self._labels())
+
+    @property
+    def width(self) -> int:
+        return self.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.shape[0]
+
+    def box(self, row: int, column: int) -> Box:
+        step = self.tile_size + self.PADDING
+        return self.left + column * step, self.top + row * step, self.tile_size, self.tile_size
+
+    def _labels(self) -> typing.List[typing.Tuple[str, Box, int]]:
+        labels = []
+        if self.title:
+            labels.append((self.title, (0, 0, self.width, self.TITLE_HEIGHT), 16))
+        header_y = self.top - self.HEADER_HEIGHT
+        for column, text in enumerate(self.columns):
+            x, _, width, _ = self.box(0, column)
+            labels.append((text, (x, header_y, width, self.HEADER_HEIGHT), 13))
+        if self.left == self.LABEL_WIDTH:
+            for row, text in enumerate(self.rows):
+                _, y, _, height = self.box(row, 0)
+                labels.append((text, (0, y, self.LABEL_WIDTH - self.PADDING, height), 13))
+        return labels
+
+    def _submit(self, func: typing.Callable, *args: typing.Any) -> Future:
+        future = self._executor.submit(func, self._shm.name, self.shape, *args)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def place(self, row: int, column: int, path: os.PathLike) -> Future:
+        """Decode `path` into its cell, the future resolves once it is on the canvas"""
+        return self._submit(_place_tile, str(path), self.box(row, column))
+
+    def fail(self, row: int, column: int) -> Future:
+        return self._submit(_fill, self.box(row, column), FAILED)
+
+    def wait(self) -> None:
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def save(self, path: os.PathLike) -> Path:
+        """Write the sheet as PNG once every queued tile is placed"""
+        self.wait()
+        return Path(self._executor.submit(_save, self._shm.name, self.shape, str(path)).result())
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        del self.canvas
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "ContactSheet":
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
@@ -1,3 +1,6 @@
+import typing
+
+
 class NoApiKey(Exception):
     "Raised when the API key is missing in the file"
     pass
@@ -24,3 +27,25 @@ class ResponseErrorCode(Exception):
     def __init__(self, error_code: str) -> None:
         self.error_code = "Error code: %s" % error_code
         super().__init__(self.error_code)
+
+
+class RetryableResponse(Exception):
+    "Raised when the server answers with a transient error status"
+
+    def __init__(self, status_code: int, retry_after: typing.Optional[float] = None) -> None:
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__("HTTP status: %s" % status_code)
+
+
+class DeadlineExceeded(Exception):
+    "Raised when a request runs past its attempt or overall deadline"
+    pass
+
+
+class InvalidRequest(Exception):
+    "Raised when a payload breaks the limits of the model catalog"
+
+    def __init__(self, problems: typing.List[str]) -> None:
+        self.problems = problems
+        super().__init__("; ".join(problems))
@@ -0,0 +1,131 @@
+import os
+import typing
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+from PyQt5 import QtCore, QtGui
+
+from core.paths import CACHE_DIR
+
+
+IMAGE_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".webp"})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    thumb INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir, mtime_ns DESC);
+"""
+
+
+class ThumbnailIndex:
+    """SQLite index of image folders plus pre-scaled thumbnails on disk.
+
+    A folder is only rescanned when its own mtime changes, so reopening a
+    large folder costs one stat and one indexed query. The rescan drops the
+    thumbnails of files that were removed or changed. Files that cannot be
+    decoded are marked FAILED and not tried again until their mtime changes.
+    """
+
+    THUMB_SIZE = 160
+
+    MISSING = 0
+    READY = 1
+    FAILED = -1
+
+    def __init__(self, directory: typing.Optional[os.PathLike] = None) -> None:
+        self.directory = Path(directory or CACHE_DIR.joinpath("thumbnails"))
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.directory.joinpath("index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def refresh(self, folder: os.PathLike) -> typing.List[typing.Tuple[str, int, int]]:
+        """Return (path, mtime_ns, thumbnail state) for every image in `folder`, newest first"""
+        folder = str(Path(folder).resolve())
+        try:
+            mtime_ns = os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (folder,)).fetchone()
+            if row is None or row[0] != mtime_ns:
+                self._rescan(folder, mtime_ns)
+            rows = self._conn.execute(
+                "SELECT path, mtime_ns, thumb FROM files WHERE dir = ? ORDER BY mtime_ns DESC", (folder,)
+            ).fetchall()
+        return rows
+
+    def _rescan(self, folder: str, mtime_ns: int) -> None:
+        known = {
+            path: (mtime, size, thumb)
+            for path, mtime, size, thumb in self._conn.execute(
+                "SELECT path, mtime_ns, size, thumb FROM files WHERE dir = ?", (folder,)
+            )
+        }
+        seen = set()
+        changed = []
+
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_SUFFIXES:
+                    continue
+                stat = entry.stat()
+                seen.add(entry.path)
+                if known.get(entry.path, ())[:2] != (stat.st_mtime_ns, stat.st_size):
+                    changed.append((entry.path, folder, stat.st_mtime_ns, stat.st_size))
+
+        removed = [(path,) for path in known.keys() - seen]
+        for path in [path for path, in removed] + [path for path, *_ in changed]:
+            mtime, _, thumb = known.get(path, (0, 0, self.MISSING))
+            if thumb == self.READY:
+                self.thumbnail_path(path, mtime).unlink(missing_ok=True)
+        with self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", removed)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, dir, mtime_ns, size, thumb) VALUES (?, ?, ?, ?, 0)", changed
+            )
+            self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (folder, mtime_ns))
+
+    def thumbnail_path(self, path: str, mtime_ns: int) -> Path:
+        name = hashlib.sha1(f"{path}\0{mtime_ns}".encode()).hexdigest()
+        return self.directory.joinpath(name[:2], name + ".jpg")
+
+    def create_thumbnail(self, path: str, mtime_ns: int) -> QtGui.QImage:
+        """Decode `path` at thumbnail size and store it; safe to call from worker threads"""
+        reader = QtGui.QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(self.THUMB_SIZE, self.THUMB_SIZE, QtCore.Qt.KeepAspectRatio))
+
+        image = reader.read()
+        if image.isNull():
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE files SET thumb = ? WHERE path = ? AND mtime_ns = ?", (self.FAILED, path, mtime_ns)
+                )
+            return image
+
+        thumbpath = self.thumbnail_path(path, mtime_ns)
+        thumbpath.parent.mkdir(exist_ok=True)
+        if image.save(str(thumbpath), "JPEG", 85):
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE files SET thumb = ? WHERE path = ? AND mtime_ns = ?", (self.READY, path, mtime_ns)
+                )
+        return image
@@ -0,0 +1,171 @@
+import os
+import typing
+import sqlite3
+
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+from core.logger import logger
+from core.gallery import ThumbnailIndex
+from core.paths import GUI_CSS
+
+
+class ThumbnailSignals(QtCore.QObject):
+    ready = QtCore.pyqtSignal(str, QtGui.QImage)
+    loaded = QtCore.pyqtSignal(str, list)
+
+
+class RefreshJob(QtCore.QRunnable):
+    def __init__(self, index: ThumbnailIndex, folder: str, signals: ThumbnailSignals) -> None:
+        super().__init__()
+
+        self.index = index
+        self.folder = folder
+        self.signals = signals
+
+    def run(self) -> None:
+        try:
+            rows = self.index.refresh(self.folder)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Cannot scan {self.folder}: {e}")
+            rows = []
+        self.signals.loaded.emit(self.folder, rows)
+
+
+class ThumbnailJob(QtCore.QRunnable):
+    def __init__(self, index: ThumbnailIndex, path: str, mtime_ns: int, signals: ThumbnailSignals) -> None:
+        super().__init__()
+
+        self.index = index
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.signals = signals
+
+    def run(self) -> None:
+        self.signals.ready.emit(self.path, self.index.create_thumbnail(self.path, self.mtime_ns))
+
+
+class GalleryModel(QtCore.QAbstractListModel):
+    PIXMAP_CACHE_KB = 64 * 1024
+
+    def __init__(self, thumbnails: ThumbnailIndex, parent: typing.Optional[QtCore.QObject] = None) -> None:
+        super().__init__(parent)
+
+        self.thumbnails = thumbnails
+        self.folder: typing.Optional[str] = None
+        self.rows: typing.List[typing.Tuple[str, int, int]] = []
+        self.positions: typing.Dict[str, int] = {}
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QtCore.QThread.idealThreadCount() - 1))
+        self.signals = ThumbnailSignals()
+        self.signals.ready.connect(self._on_thumbnail)
+        self.signals.loaded.connect(self._on_loaded)
+        self._pending: typing.Set[str] = set()
+
+        QtGui.QPixmapCache.setCacheLimit(self.PIXMAP_CACHE_KB)
+        self.placeholder = QtGui.QPixmap(ThumbnailIndex.THUMB_SIZE, ThumbnailIndex.THUMB_SIZE)
+        self.placeholder.fill(QtGui.QColor("#111111"))
+
+    def load(self, folder: str) -> None:
+        """Scan `folder` on the thumbnail pool, the model resets when it is done"""
+        self.pool.clear()
+        self._pending.clear()
+        self.folder = folder
+        self.pool.start(RefreshJob(self.thumbnails, folder, self.signals), priority=1)
+
+    def _on_loaded(self, folder: str, rows: typing.List[typing.Tuple[str, int, int]]) -> None:
+        if folder != self.folder:
+            return
+        self.beginResetModel()
+        self.rows = rows
+        self.positions = {path: row for row, (path, _, _) in enumerate(self.rows)}
+        self.endResetModel()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> typing.Any:
+        if not index.isValid():
+            return None
+
+        path, mtime_ns, thumb = self.rows[index.row()]
+        if role == QtCore.Qt.DecorationRole:
+            return self._pixmap(path, mtime_ns, thumb)
+        if role == QtCore.Qt.ToolTipRole:
+            return os.path.basename(path)
+        if role == QtCore.Qt.UserRole:
+            return path
+        return None
+
+    def _pixmap(self, path: str, mtime_ns: int, thumb: int) -> QtGui.QPixmap:
+        key = f"{path}:{mtime_ns}"
+        pixmap = QtGui.QPixmapCache.find(key)
+        if pixmap is not None and not pixmap.isNull():
+            return pixmap
+
+        if thumb == ThumbnailIndex.FAILED:
+            return self.placeholder
+        if thumb == ThumbnailIndex.READY:
+            pixmap = QtGui.QPixmap(str(self.thumbnails.thumbnail_path(path, mtime_ns)))
+            if not pixmap.isNull():
+                QtGui.QPixmapCache.insert(key, pixmap)
+                return pixmap
+
+        if path not in self._pending:
+            self._pending.add(path)
+            self.pool.start(ThumbnailJob(self.thumbnails, path, mtime_ns, self.signals))
+        return self.placeholder
+
+    def _on_thumbnail(self, path: str, image: QtGui.QImage) -> None:
+        self._pending.discard(path)
+        row = self.positions.get(path)
+        if row is None:
+            return
+
+        _, mtime_ns, _ = self.rows[row]
+        if image.isNull():
+            self.rows[row] = (path, mtime_ns, ThumbnailIndex.FAILED)
+            return
+        self.rows[row] = (path, mtime_ns, ThumbnailIndex.READY)
+        QtGui.QPixmapCache.insert(f"{path}:{mtime_ns}", QtGui.QPixmap.fromImage(image))
+
+        modelIndex = self.index(row)
+        self.dataChanged.emit(modelIndex, modelIndex, [QtCore.Qt.DecorationRole])
+
+
+class GalleryWindow(QtWidgets.QWidget):
+    imageSelected = QtCore.pyqtSignal(str)
+
+    def __init__(self, parent: typing.Optional[QtWidgets.QWidget] = None) -> None:
+        super().__init__(parent, QtCore.Qt.Window)
+
+        self.setWindowTitle("Gallery")
+        self.resize(900, 700)
+
+        self.model = GalleryModel(ThumbnailIndex(), self)
+
+        size = ThumbnailIndex.THUMB_SIZE
+        self.view = QtWidgets.QListView(self)
+        self.view.setViewMode(QtWidgets.QListView.IconMode)
+        self.view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.view.setMovement(QtWidgets.QListView.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QtWidgets.QListView.Batched)
+        self.view.setBatchSize(200)
+        self.view.setIconSize(QtCore.QSize(size, size))
+        self.view.setGridSize(QtCore.QSize(size + 10, size + 10))
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(self._on_double_click)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+        layout.addWidget(self.view)
+
+        with open(GUI_CSS.joinpath("ui.css")) as f: self.setStyleSheet(f.read())
+
+    def open_folder(self, folder: str) -> None:
+        self.setWindowTitle(f"Gallery - {folder}")
+        self.model.load(folder)
+
+    def _on_double_click(self, index: QtCore.QModelIndex) -> None:
+        self.imageSelected.emit(index.data(QtCore.Qt.UserRole))
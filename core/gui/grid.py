@@ -0,0 +1,188 @@
+import os
+import time
+import typing
+
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+from core.gui.jobs import GridJob
+from core.paths import GUI_CSS
+
+if typing.TYPE_CHECKING:
+    from core.contact_sheet import ContactSheet
+
+
+class GridWindow(QtWidgets.QWidget):
+    """Sweeps two or three parameters of the current settings into a contact sheet"""
+
+    REFRESH_MS = 250
+    NO_AXIS = "-"
+    DEFAULT_VALUES = {
+        "steps": "20, 30, 40",
+        "guidance": "5, 7.5, 10",
+        "seed": "1, 2, 3",
+    }
+
+    def __init__(self, parent: typing.Optional[QtWidgets.QWidget] = None) -> None:
+        super().__init__(parent, QtCore.Qt.Window)
+
+        self.setWindowTitle("Parameter Grid")
+        self.resize(1000, 800)
+
+        self.options: typing.Dict = {}
+        self.directory = ""
+        self.sheet: typing.Optional["ContactSheet"] = None
+        self.job: typing.Optional[GridJob] = None
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+        self.axisInputs: typing.List[typing.Tuple[QtWidgets.QComboBox, QtWidgets.QLineEdit]] = []
+        axesLayout = QtWidgets.QGridLayout()
+        for row, default in enumerate(("guidance", "steps", self.NO_AXIS)):
+            axis = QtWidgets.QComboBox(self)
+            axis.addItems([self.NO_AXIS, "steps", "guidance", "scheduler", "model", "seed"])
+            values = QtWidgets.QLineEdit(self)
+            values.setPlaceholderText("Comma separated values")
+            axis.currentTextChanged.connect(lambda name, values=values: values.setText(self.default_values(name)))
+            axis.setCurrentText(default)
+            axesLayout.addWidget(axis, row, 0)
+            axesLayout.addWidget(values, row, 1)
+            self.axisInputs.append((axis, values))
+        axesLayout.setColumnStretch(1, 1)
+
+        self.buttonRun = QtWidgets.QPushButton("Run Grid", self)
+        self.buttonRun.pressed.connect(self.run)
+        self.status = QtWidgets.QLabel(self)
+        self.sheetLabel = QtWidgets.QLabel(self)
+        self.sheetLabel.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        self.scroll = QtWidgets.QScrollArea(self)
+        self.scroll.setWidget(self.sheetLabel)
+        self.scroll.setWidgetResizable(True)
+
+        self.refreshTimer = QtCore.QTimer(self)
+        self.refreshTimer.setInterval(self.REFRESH_MS)
+        self.refreshTimer.timeout.connect(self.refresh_sheet)
+
+        controls = QtWidgets.QHBoxLayout()
+        controls.addWidget(self.buttonRun)
+        controls.addWidget(self.status, 1)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+        layout.addLayout(axesLayout)
+        layout.addLayout(controls)
+        layout.addWidget(self.scroll, 1)
+
+        with open(GUI_CSS.joinpath("ui.css")) as f: self.setStyleSheet(f.read())
+
+    def default_values(self, name: str) -> str:
+        if name in self.DEFAULT_VALUES:
+            return self.DEFAULT_VALUES[name]
+        if name in {"scheduler", "model"}:
+            from core.api.models import get_model_registry
+
+            registry = get_model_registry()
+            if name == "scheduler":
+                return ", ".join(registry.schedulers[:3])
+            generator = self.options.get("currentGeneratorType")
+            if generator in registry.generators:
+                return ", ".join(registry.models(generator)[:3])
+        return ""
+
+    def open_options(self, options: typing.Dict, directory: str) -> None:
+        """Take the main window settings that stay fixed across the grid"""
+        self.options = options
+        self.directory = directory
+        for axis, values in self.axisInputs:
+            if axis.currentText() == "model" and not values.text():
+                values.setText(self.default_values("model"))
+
+    def run(self) -> None:
+        from core.api.grid import ParameterGrid, parse_values
+
+        if self.job is not None:
+            return
+        options = self.options
+        if not options.get("prompt"):
+            self.status.setText("Enter a prompt in the main window first")
+            return
+
+        try:
+            axes = {}
+            for axis, values in self.axisInputs:
+                name = axis.currentText()
+                if name == self.NO_AXIS:
+                    continue
+                if name in axes:
+                    raise ValueError(f"{name} is used twice")
+                axes[name] = parse_values(name, values.text())
+
+            params = {
+                "prompt": options["prompt"],
+                "negative_prompt": options.get("negativePrompt") or None,
+                "model": options.get("model") or None,
+                "width": options.get("width"),
+                "height": options.get("height"),
+                "steps": options.get("steps"),
+                "guidance": options.get("guidance"),
+                "scheduler": options.get("scheduler") or None,
+                "seed": options.get("seed"),
+            }
+            if options["currentGeneratorType"] == "ControlNet":
+                if not options.get("imagePath"):
+                    raise ValueError("ControlNet needs an input image")
+                params["condition"] = options.get("condition") or None
+            grid = ParameterGrid(axes, options["currentGeneratorType"], **params)
+        except ValueError as e:
+            self.status.setText(str(e))
+            return
+
+        self.close_sheet()
+        self.sheet = grid.contact_sheet()
+        directory = os.path.join(self.directory, time.strftime("grid-%Y%m%d-%H%M%S"))
+
+        self.job = GridJob(grid, directory, self.sheet, options.get("imagePath"))
+        self.job.signals.progress.connect(self.on_progress)
+        self.job.signals.finished.connect(self.on_finished)
+        self.job.signals.failed.connect(self.on_failed)
+        self.pool.start(self.job)
+
+        self.buttonRun.setEnabled(False)
+        seed = f" with seed {grid.seed}" if grid.seed is not None else ""
+        self.status.setText(f"Generating {len(grid.cells)} images{seed}")
+        self.refreshTimer.start()
+        self.refresh_sheet()
+
+    def refresh_sheet(self) -> None:
+        if self.sheet is None:
+            return
+        height, width, _ = self.sheet.shape
+        image = QtGui.QImage(self.sheet.canvas.data, width, height, width * 3, QtGui.QImage.Format_RGB888)
+        self.sheetLabel.setPixmap(QtGui.QPixmap.fromImage(image))
+
+    def on_progress(self, done: int, failed: int, total: int) -> None:
+        self.status.setText(f"{done}/{total} done" + (f", {failed} failed" if failed else ""))
+
+    def on_finished(self, path: str) -> None:
+        self.finish_job()
+        self.status.setText(f"{self.status.text()} - saved {path}")
+
+    def on_failed(self, error: str) -> None:
+        self.finish_job()
+        self.status.setText(error)
+
+    def finish_job(self) -> None:
+        self.refreshTimer.stop()
+        self.refresh_sheet()
+        self.close_sheet()
+        self.job = None
+        self.buttonRun.setEnabled(True)
+
+    def close_sheet(self) -> None:
+        if self.sheet is not None:
+            self.sheet.close()
+            self.sheet = None
+
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        if self.job is None:
+            self.close_sheet()
+        super().closeEvent(event)
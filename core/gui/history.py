@@ -0,0 +1,123 @@
+import os
+import typing
+import sqlite3
+
+from PyQt5 import QtWidgets, QtCore
+
+from core.logger import logger
+from core.history import HistoryEntry, HistoryIndex, get_history
+from core.paths import GUI_CSS
+
+
+class ImportSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(str, int)
+
+
+class ImportJob(QtCore.QRunnable):
+    def __init__(self, history: HistoryIndex, folder: str, signals: ImportSignals) -> None:
+        super().__init__()
+
+        self.history = history
+        self.folder = folder
+        self.signals = signals
+
+    def run(self) -> None:
+        try:
+            count = self.history.import_folder(self.folder)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Cannot import {self.folder} into the history: {e}")
+            count = 0
+        self.signals.finished.emit(self.folder, count)
+
+
+class HistoryWindow(QtWidgets.QWidget):
+    paramsSelected = QtCore.pyqtSignal(dict, str)
+
+    SEARCH_DELAY_MS = 250
+    LIMIT = 500
+
+    def __init__(self, parent: typing.Optional[QtWidgets.QWidget] = None) -> None:
+        super().__init__(parent, QtCore.Qt.Window)
+
+        self.setWindowTitle("History")
+        self.resize(900, 600)
+
+        self.history = get_history()
+        self.entries: typing.List[HistoryEntry] = []
+        self.folder: typing.Optional[str] = None
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = ImportSignals()
+        self.signals.finished.connect(self._on_imported)
+
+        self.searchInput = QtWidgets.QLineEdit(self)
+        self.searchInput.setPlaceholderText("castle model:dream-shaper-v8 guidance>7")
+        self.status = QtWidgets.QLabel(self)
+        self.results = QtWidgets.QListWidget(self)
+        self.results.setUniformItemSizes(True)
+
+        self.searchTimer = QtCore.QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(self.SEARCH_DELAY_MS)
+        self.searchTimer.timeout.connect(self.search)
+
+        self.searchInput.textChanged.connect(self.searchTimer.start)
+        self.searchInput.returnPressed.connect(self.search)
+        self.results.itemActivated.connect(self._on_activated)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+        layout.addWidget(self.searchInput)
+        layout.addWidget(self.status)
+        layout.addWidget(self.results)
+
+        with open(GUI_CSS.joinpath("ui.css")) as f: self.setStyleSheet(f.read())
+
+    def open_folder(self, folder: str) -> None:
+        if self.history is None:
+            self.status.setText("History is disabled in config.toml")
+            return
+        self.folder = folder
+        self.pool.start(ImportJob(self.history, folder, self.signals))
+        self.search()
+        self.searchInput.setFocus()
+
+    def _on_imported(self, folder: str, count: int) -> None:
+        if folder == self.folder and count:
+            self.search()
+
+    def search(self) -> None:
+        self.searchTimer.stop()
+        if self.history is None:
+            return
+        try:
+            self.entries = self.history.search(self.searchInput.text(), limit=self.LIMIT)
+        except (ValueError, sqlite3.Error) as e:
+            self.status.setText(str(e))
+            return
+
+        self.results.clear()
+        for entry in self.entries:
+            item = QtWidgets.QListWidgetItem(self._describe(entry))
+            item.setToolTip(entry.path)
+            if not entry.exists:
+                item.setForeground(QtCore.Qt.gray)
+            self.results.addItem(item)
+        self.status.setText(f"{len(self.entries)} result(s)")
+
+    def _describe(self, entry: HistoryEntry) -> str:
+        params = entry.params
+        text = params.get("prompt") or os.path.basename(entry.path)
+        if len(text) > 80:
+            text = text[:77] + "..."
+        details = [
+            f"{key} {params[key]}"
+            for key in ("model", "guidance", "steps", "seed")
+            if params.get(key) is not None
+        ]
+        return f"[{params.get('generator', '?')}] {text} - {', '.join(details)}"
+
+    def _on_activated(self, item: QtWidgets.QListWidgetItem) -> None:
+        entry = self.entries[self.results.row(item)]
+        self.paramsSelected.emit(entry.params, entry.path)
@@ -0,0 +1,377 @@
+import os
+import time
+import typing
+import itertools
+
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+from core.logger import logger
+from core.journal import get_journal
+
+if typing.TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from core.api.generators import BaseGenerator
+    from core.api.models import ModelRegistry
+    from core.api.body import ImageFile
+    from core.api.grid import ParameterGrid
+    from core.contact_sheet import ContactSheet
+
+
+PREVIEW_SIZE = QtCore.QSize(512, 512)
+
+
+def load_preview(filename: str, size: QtCore.QSize = PREVIEW_SIZE) -> QtGui.QImage:
+    """Decode `filename` straight to preview size, ready for QPixmap.fromImage"""
+    reader = QtGui.QImageReader(filename)
+    reader.setAutoTransform(True)
+    imageSize = reader.size()
+    if imageSize.isValid() and (imageSize.width() > size.width() or imageSize.height() > size.height()):
+        reader.setScaledSize(imageSize.scaled(size, QtCore.Qt.KeepAspectRatio))
+
+    image = reader.read()
+    if image.isNull():
+        return image
+    if image.hasAlphaChannel():
+        return image.convertToFormat(QtGui.QImage.Format_ARGB32_Premultiplied)
+    return image.convertToFormat(QtGui.QImage.Format_RGB32)
+
+
+class PreviewSignals(QtCore.QObject):
+    ready = QtCore.pyqtSignal(str, QtGui.QImage)
+
+
+class PreviewJob(QtCore.QRunnable):
+    def __init__(self, filename: str, signals: PreviewSignals) -> None:
+        super().__init__()
+
+        self.filename = filename
+        self.signals = signals
+
+    def run(self) -> None:
+        self.signals.ready.emit(self.filename, load_preview(self.filename))
+
+
+class ModelRefreshSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(bool)
+
+
+class ModelRefreshJob(QtCore.QRunnable):
+    def __init__(self, registry: "ModelRegistry") -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.registry = registry
+        self.signals = ModelRefreshSignals()
+
+    def run(self) -> None:
+        try:
+            changed = self.registry.refresh()
+        except Exception as e:
+            logger.exception(e)
+            changed = False
+        self.signals.finished.emit(changed)
+
+
+class GridSignals(QtCore.QObject):
+    progress = QtCore.pyqtSignal(int, int, int)
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str)
+
+
+class GridJob(QtCore.QRunnable):
+    def __init__(
+        self,
+        grid: "ParameterGrid",
+        directory: str,
+        sheet: "ContactSheet",
+        imagePath: typing.Optional[str] = None,
+    ) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.grid = grid
+        self.directory = directory
+        self.sheet = sheet
+        self.imagePath = imagePath
+        self.signals = GridSignals()
+
+    def run(self) -> None:
+        from core.api.grid import SHEET_NAME
+        from core.api.preprocess import image_file
+
+        total, done, failed = len(self.grid.cells), 0, 0
+        try:
+            if self.imagePath is not None:
+                self.grid.params["image"] = image_file(self.imagePath, self.grid.generator.MAX_INPUT_SIZE)
+            for result in self.grid.run(self.directory, sheet=self.sheet):
+                done += 1
+                failed += not result.ok
+                self.signals.progress.emit(done, failed, total)
+        except Exception as e:
+            logger.exception(e)
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(os.path.join(self.directory, SHEET_NAME))
+
+
+class JobSignals(QtCore.QObject):
+    started = QtCore.pyqtSignal(int)
+    file_ready = QtCore.pyqtSignal(str, int, QtGui.QImage)
+    failed = QtCore.pyqtSignal(int, str)
+    finish = QtCore.pyqtSignal(int)
+
+
+class GeneratorJob(QtCore.QRunnable):
+    def __init__(
+        self,
+        model: str,
+        directory: str,
+        prompt: typing.Optional[str] = None,
+        negativePrompt: typing.Optional[str] = None,
+        currentGeneratorType: str = "Text to Image",
+        imagePath: typing.Optional[str] = None,
+        condition: typing.Optional[str] = None,
+        height: typing.Optional[int] = None,
+        width: typing.Optional[int] = None,
+        steps: typing.Optional[int] = None,
+        guidance: typing.Optional[int] = None,
+        scheduler: typing.Optional[str] = None,
+        seed: typing.Optional[int] = None,
+    ):
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.jobId = None
+        self.journalId = None
+        self.signals = JobSignals()
+
+        self.prompt = prompt
+        self.negativePrompt = negativePrompt
+        self.model = model
+        self.directory = directory
+        self.imagePath = imagePath
+        self.condition = condition
+        self.generatorType = currentGeneratorType
+        self.height = height
+        self.width = width
+        self.steps = steps
+        self.guidance = guidance
+        self.scheduler = scheduler
+        self.seed = seed
+
+    @property
+    def spec(self) -> typing.Dict:
+        return {
+            "model": self.model,
+            "directory": self.directory,
+            "prompt": self.prompt,
+            "negativePrompt": self.negativePrompt,
+            "currentGeneratorType": self.generatorType,
+            "imagePath": self.imagePath,
+            "condition": self.condition,
+            "height": self.height,
+            "width": self.width,
+            "steps": self.steps,
+            "guidance": self.guidance,
+            "scheduler": self.scheduler,
+            "seed": self.seed,
+        }
+
+    @property
+    def description(self) -> str:
+        text = (self.prompt if self.generatorType in {"Text to Image", "ControlNet"} else self.model) or ""
+        if len(text) > 60:
+            text = text[:57] + "..."
+        if self.seed is not None:
+            return f"{self.generatorType} (seed {self.seed}): {text}"
+        return f"{self.generatorType}: {text}"
+
+    @property
+    def image(self) -> typing.Optional["ImageFile"]:
+        if self.imagePath is None:
+            return None
+        from core.api.generators import GENERATORS
+        from core.api.preprocess import image_file
+        
+        return image_file(self.imagePath, GENERATORS[self.generatorType].MAX_INPUT_SIZE)
+
+    def create_generator(self) -> "BaseGenerator":
+        from core.api.generators import TextToImage, ControlNet, UpScale, FaceFix
+        from core.api.writer import get_image_writer
+        
+        outputFormat = get_image_writer().output_format
+        if self.generatorType == "Text to Image":
+            return TextToImage(
+                prompt=self.prompt,
+                negative_prompt=self.negativePrompt,
+                model=self.model,
+                height=self.height,
+                width=self.width,
+                steps=self.steps,
+                guidance=self.guidance,
+                seed=self.seed,
+                scheduler=self.scheduler,
+                output_format=outputFormat
+            )
+
+        elif self.generatorType == "ControlNet":
+            return ControlNet(
+                prompt=self.prompt,
+                negative_prompt=self.negativePrompt,
+                model=self.model,
+                image=self.image,
+                condition=self.condition,
+                height=self.height,
+                width=self.width,
+                steps=self.steps,
+                guidance=self.guidance,
+                seed=self.seed,
+                scheduler=self.scheduler,
+                output_format=outputFormat
+            )
+
+        elif self.generatorType == "UpScale":
+            return UpScale(model=self.model, image=self.image, output_format=outputFormat)
+
+        elif self.generatorType == "FaceFix":
+            return FaceFix(model=self.model, image=self.image, output_format=outputFormat)
+
+        raise ValueError(f"Unknown generator type: {self.generatorType}")
+
+    def run(self) -> None:
+        journal = get_journal()
+        if journal is not None and self.journalId is not None:
+            journal.start(self.journalId)
+        
+        self.signals.started.emit(self.jobId)
+        start = time.perf_counter()
+        try:
+            generator = self.create_generator()
+            written, seed = generator.submit_file(self.directory)
+        except Exception as e:
+            self.fail(e, start)
+            self.signals.finish.emit(self.jobId)
+            return
+        # The pool slot is free for the next download while the writer finishes this one
+        written.add_done_callback(lambda written: self.on_written(written, generator, seed, start))
+
+    def on_written(self, written: "Future", generator: "BaseGenerator", seed: int, start: float) -> None:
+        """Runs on the writer thread once the image is on disk"""
+        try:
+            filepath = written.result()
+            previewStart = time.perf_counter()
+            preview = load_preview(str(filepath))
+            metrics = generator.metrics
+            if metrics is not None:
+                endpoint = generator.rate_limiter.endpoint_name(generator.BASE_URL)
+                metrics.observe("preview", time.perf_counter() - previewStart, endpoint, self.model)
+        except Exception as e:
+            self.fail(e, start)
+        else:
+            journal = get_journal()
+            if journal is not None and self.journalId is not None:
+                journal.finish(self.journalId, seed, filepath, time.perf_counter() - start)
+            self.signals.file_ready.emit(str(filepath), seed, preview)
+        finally:
+            self.signals.finish.emit(self.jobId)
+
+    def fail(self, error: Exception, start: float) -> None:
+        logger.exception(error)
+        journal = get_journal()
+        if journal is not None and self.journalId is not None:
+            journal.fail(self.journalId, f"{type(error).__name__}: {error}", time.perf_counter() - start)
+        self.signals.failed.emit(self.jobId, str(error))
+
+
+class JobQueue(QtCore.QObject):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    MAX_FINISHED = 100
+
+    activeChanged = QtCore.pyqtSignal(int)
+
+    def __init__(
+        self,
+        listWidget: QtWidgets.QListWidget,
+        slots: int = 4,
+        parent: typing.Optional[QtCore.QObject] = None,
+    ) -> None:
+        super().__init__(parent)
+
+        self.listWidget = listWidget
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(slots)
+
+        self._ids = itertools.count(1)
+        self._jobs: typing.Dict[int, GeneratorJob] = {}
+        self._items: typing.Dict[int, QtWidgets.QListWidgetItem] = {}
+        self._finished: typing.List[int] = []
+        self._failed: typing.Set[int] = set()
+
+    @property
+    def slots(self) -> int:
+        return self.pool.maxThreadCount()
+
+    def set_slots(self, slots: int) -> None:
+        self.pool.setMaxThreadCount(max(1, slots))
+
+    def active_count(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, job: GeneratorJob) -> int:
+        job.jobId = next(self._ids)
+        
+        journal = get_journal()
+        if journal is not None and job.journalId is None:
+            spec = job.spec
+            job.journalId = journal.record(spec, source="gui", generator=job.generatorType)
+        job.signals.started.connect(self._on_started)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.finish.connect(self._on_finish)
+
+        item = QtWidgets.QListWidgetItem()
+        self.listWidget.addItem(item)
+        self.listWidget.scrollToItem(item)
+
+        self._jobs[job.jobId] = job
+        self._items[job.jobId] = item
+        self._set_status(job.jobId, self.PENDING)
+
+        self.pool.start(job)
+        self.activeChanged.emit(self.active_count())
+        return job.jobId
+
+    def _set_status(self, jobId: int, status: str, message: typing.Optional[str] = None) -> None:
+        item = self._items.get(jobId)
+        if item is None:
+            return
+        text = f"#{jobId} [{status}] {self._jobs[jobId].description}"
+        if message:
+            text = f"{text} - {message}"
+        item.setText(text)
+
+    def _on_started(self, jobId: int) -> None:
+        self._set_status(jobId, self.RUNNING)
+
+    def _on_failed(self, jobId: int, message: str) -> None:
+        self._set_status(jobId, self.FAILED, message)
+        self._failed.add(jobId)
+
+    def _on_finish(self, jobId: int) -> None:
+        if jobId not in self._failed:
+            self._set_status(jobId, self.DONE)
+        self._failed.discard(jobId)
+
+        del self._jobs[jobId]
+        self._finished.append(jobId)
+        self._trim_finished()
+        self.activeChanged.emit(self.active_count())
+
+    def _trim_finished(self) -> None:
+        while len(self._finished) > self.MAX_FINISHED:
+            item = self._items.pop(self._finished.pop(0))
+            self.listWidget.takeItem(self.listWidget.row(item))
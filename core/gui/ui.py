@@ -1,6 +1,8 @@
 import typing
 from PyQt5 import QtWidgets, QtCore, QtGui
 from core.paths import GUI_CSS, GUI_IMAGES
+from core.profiler import startup
+from core.gui.viewer import ImageViewer
 
 SizePolicy = QtWidgets.QSizePolicy.Policy
 
@@ -126,12 +128,14 @@ class UI(QtWidgets.QWidget):
     def __init__(self, parent: typing.Optional[QtWidgets.QWidget] = None) -> None:
         super().__init__(parent)
         
-        self.setFixedSize(1050, 750)
+        self.setFixedSize(1050, 870)
         self.setWindowTitle("Image Generator")
         
-        self.__initui__()
+        with startup.measure("UI.__initui__"):
+            self.__initui__()
         
-        with open(GUI_CSS.joinpath("ui.css")) as f: self.setStyleSheet(f.read())
+        with startup.measure("UI stylesheet"):
+            with open(GUI_CSS.joinpath("ui.css")) as f: self.setStyleSheet(f.read())
     
     def __initui__(self) -> None:
         self.create_containers()
@@ -146,18 +150,23 @@ class UI(QtWidgets.QWidget):
         self.containerImgDirectory = QtWidgets.QWidget()
         self.containerResultImgs = QtWidgets.QWidget()
         self.containerResultButtons = QtWidgets.QWidget()
+        self.containerJobs = QtWidgets.QWidget()
+        self.containerJobControls = QtWidgets.QWidget()
     
     def create_layouts(self) -> None:
         self.layoutMain = VLayout(self, rows=5)
         self.layoutMain.setObjectName("main_layout")
         
         self.layoutPrompt = HLayout(self.containerPrompt, columns=2)
-        self.layoutGenButtons = HLayout(self.containerGenButtons, columns=2)
+        self.layoutGenButtons = HLayout(self.containerGenButtons, columns=4)
         self.layoutGenOptions = HLayout(self.containerGenOptions, columns=3)
         self.layoutGenOptionals = HLayout(self.containerGenOptionals, columns=6)
         self.layoutImgDirectory = HLayout(self.containerImgDirectory, columns=2)
         self.layoutResultImgs = HLayout(self.containerResultImgs, columns=2)
-        self.layoutResultButtons = HLayout(self.containerResultButtons, columns=2)
+        self.layoutResultButtons = HLayout(self.containerResultButtons, columns=5)
+        self.layoutJobs = HLayout(self.containerJobs, columns=1)
+        self.layoutJobControls = VLayout(self.containerJobControls, rows=2)
+        self.layoutJobControls.setContentsMargins(0, 0, 0, 0)
         
         self.layoutMain.addWidgets(
             self.containerPrompt, 
@@ -166,7 +175,8 @@ class UI(QtWidgets.QWidget):
             self.containerGenOptionals,
             self.containerImgDirectory, 
             self.containerResultImgs, 
-            self.containerResultButtons
+            self.containerResultButtons,
+            self.containerJobs
         )
     
     def create_widgets(self) -> None:
@@ -180,7 +190,11 @@ class UI(QtWidgets.QWidget):
         # Generate buttons
         self.buttonGenerate = Button(text="Generate")
         self.buttonGenerateType = ComboBox()
-        self.layoutGenButtons.addWidgets(self.buttonGenerate, self.buttonGenerateType)
+        self.inputBatch = LineEdit(text="Batch (1 - 16)")
+        self.inputSeed = LineEdit(text="Seed")
+        self.inputBatch.setValidator(QtGui.QIntValidator(1, 16, self))
+        self.inputSeed.setValidator(QtGui.QIntValidator(0, 2147483647, self))
+        self.layoutGenButtons.addWidgets(self.buttonGenerate, self.buttonGenerateType, self.inputBatch, self.inputSeed)
         
         # Generation options buttons
         self.buttonModel = ComboBox()
@@ -218,9 +232,9 @@ class UI(QtWidgets.QWidget):
         self.layoutImgDirectory.setStretch(1, 5)
         
         # Generated image labels
-        self.leftImgB64, self.rightImgB64 = None, None
-        self.leftImg = Label(height=512, width=512)
-        self.rightImg = Label(height=512, width=512)
+        self.leftImgPath, self.rightImgPath = None, None
+        self.leftImg = ImageViewer(height=512, width=512)
+        self.rightImg = ImageViewer(height=512, width=512)
         self.leftImg.setSizePolicy(SizePolicy.Minimum, SizePolicy.Maximum)
         self.rightImg.setSizePolicy(SizePolicy.Minimum, SizePolicy.Maximum)
         self.layoutResultImgs.addWidgets(self.leftImg, self.rightImg)
@@ -228,7 +242,22 @@ class UI(QtWidgets.QWidget):
         # Generated image management buttons
         self.buttonClearImgs = Button(text="Clear")
         self.buttonSwapImgs = Button(text="Swap Images")
-        self.layoutResultButtons.addWidgets(self.buttonClearImgs, self.buttonSwapImgs)
+        self.buttonGallery = Button(text="Gallery")
+        self.buttonHistory = Button(text="History")
+        self.buttonGrid = Button(text="Grid")
+        self.layoutResultButtons.addWidgets(
+            self.buttonClearImgs, self.buttonSwapImgs, self.buttonGallery, self.buttonHistory, self.buttonGrid
+        )
+        
+        # Job queue
+        self.jobList = QtWidgets.QListWidget()
+        self.jobList.setFixedHeight(100)
+        self.buttonSlots = ComboBox()
+        self.metricsLabel = Label(text="metrics_label")
+        self.metricsLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignTop)
+        self.containerJobControls.setFixedWidth(170)
+        self.layoutJobControls.addWidgets(self.buttonSlots, self.metricsLabel)
+        self.layoutJobs.addWidgets(self.jobList, self.containerJobControls)
         
         # Generate animation
         self.loadingMovie = QtGui.QMovie(str(GUI_IMAGES.joinpath("loading.gif")))
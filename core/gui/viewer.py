@@ -0,0 +1,504 @@
+import os
+import math
+import uuid
+import typing
+import itertools
+import threading
+import collections
+
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+from core.paths import CACHE_DIR
+from core.utils import get_config
+
+
+TileKey = typing.Tuple[int, int, int, int]
+
+BYTES_PER_PIXEL = 4
+
+
+class TileCache:
+    """LRU of decoded viewer tiles, bounded by their size in bytes"""
+
+    CACHE_MB = 96
+
+    def __init__(self, cache_mb: typing.Optional[int] = None) -> None:
+        self.max_bytes = (cache_mb or self.CACHE_MB) * 1024 * 1024
+        self.size = 0
+
+        self._lock = threading.Lock()
+        self._tiles: "collections.OrderedDict[TileKey, QtGui.QImage]" = collections.OrderedDict()
+
+    def get(self, key: TileKey) -> typing.Optional[QtGui.QImage]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key: TileKey, tile: QtGui.QImage) -> None:
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self.size -= previous.sizeInBytes()
+            self._tiles[key] = tile
+            self.size += tile.sizeInBytes()
+            while self.size > self.max_bytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self.size -= evicted.sizeInBytes()
+
+    def discard(self, owner: int) -> None:
+        """Drop every tile of the pyramid `owner`"""
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] == owner]:
+                self.size -= self._tiles.pop(key).sizeInBytes()
+
+
+_cache: typing.Optional[TileCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tile_cache() -> TileCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TileCache(get_config("viewer").get("cache_mb"))
+        return _cache
+
+
+class RasterPyramid:
+    """Pixels of one image and its halvings, in a raw file.
+
+    Formats whose reader decodes regions itself (JPEG) never hold the full
+    image: it is written in bands of BAND_BYTES and the first halving is
+    decoded at its size straight from the file. Others (PNG) are decoded
+    once, at full resolution when that fits in DECODE_BYTES and otherwise
+    at the first halving that does; the skipped levels are counted in
+    `reduced` and zooming further only magnifies the largest level. Each
+    further level is scaled from the one before and written out. Only the
+    tiles that are on screen stay in memory afterwards, read back row by
+    row straight into their QImage.
+
+    Files left over by a previous run are removed when the first pyramid of
+    this one is built.
+    """
+
+    DIRECTORY = CACHE_DIR.joinpath("viewer")
+    BAND_BYTES = 32 * 1024 * 1024
+    DECODE_BYTES = 128 * 1024 * 1024
+
+    _ids = itertools.count(1)
+    _swept = False
+    _sweep_lock = threading.Lock()
+
+    def __init__(self, filename: str, min_size: int) -> None:
+        self.filename = filename
+        self.key = next(self._ids)
+        self.levels: typing.List[typing.Tuple[int, int, int]] = []
+        self.size = QtCore.QSize()
+        self.reduced = 0
+        self.path = self.DIRECTORY.joinpath(f"{uuid.uuid4().hex}.raw")
+        self.format = QtGui.QImage.Format_RGB32
+
+        self._lock = threading.Lock()
+        self._file: typing.Optional[typing.BinaryIO] = None
+        self._offset = 0
+        self._build(min_size)
+
+    @classmethod
+    def sweep(cls) -> None:
+        """Create the pyramid directory, emptied of files from earlier runs"""
+        with cls._sweep_lock:
+            cls.DIRECTORY.mkdir(parents=True, exist_ok=True)
+            if cls._swept:
+                return
+            cls._swept = True
+            for path in cls.DIRECTORY.glob("*.raw"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _reader(self, size: typing.Optional[QtCore.QSize] = None, clip: typing.Optional[QtCore.QRect] = None) -> QtGui.QImageReader:
+        reader = QtGui.QImageReader(self.filename)
+        reader.setAutoTransform(True)
+        if size is not None:
+            reader.setScaledSize(size)
+        if clip is not None:
+            reader.setClipRect(clip)
+        return reader
+
+    def _read(self, reader: QtGui.QImageReader) -> QtGui.QImage:
+        image = reader.read()
+        if image.isNull():
+            raise ValueError(f"Cannot decode {self.filename}: {reader.errorString()}")
+        if not self._offset and image.hasAlphaChannel():
+            self.format = QtGui.QImage.Format_ARGB32_Premultiplied
+        return image.convertToFormat(self.format)
+
+    def _append(self, image: QtGui.QImage) -> None:
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        self._file.write(memoryview(bits))
+        self._offset += image.sizeInBytes()
+
+    def _build(self, min_size: int) -> None:
+        reader = self._reader()
+        size = reader.size()
+        transformed = reader.transformation() != QtGui.QImageIOHandler.TransformationNone
+        bands = size.isValid() and not transformed and reader.supportsOption(QtGui.QImageIOHandler.ClipRect)
+
+        self.sweep()
+        self._file = open(self.path, "w+b")
+        try:
+            image: typing.Optional[QtGui.QImage] = None
+            if bands:
+                width, height = size.width(), size.height()
+                rows = max(1, self.BAND_BYTES // (width * BYTES_PER_PIXEL))
+                for top in range(0, height, rows):
+                    self._append(self._read(self._reader(clip=QtCore.QRect(0, top, width, min(rows, height - top)))))
+                self.levels.append((0, width, height))
+                self.size = size
+            else:
+                scaled = size
+                while scaled.isValid() and scaled.width() * scaled.height() * BYTES_PER_PIXEL > self.DECODE_BYTES:
+                    scaled = QtCore.QSize(max(1, scaled.width() // 2), max(1, scaled.height() // 2))
+                    self.reduced += 1
+                if self.reduced:
+                    reader.setScaledSize(scaled)
+                image = self._read(reader)
+                if self.reduced:
+                    self.size = size.transposed() if reader.transformation() & QtGui.QImageIOHandler.TransformationRotate90 else size
+                else:
+                    self.size = image.size()
+                size = image.size()
+                self.levels.append((0, image.width(), image.height()))
+                self._append(image)
+
+            while max(size.width(), size.height()) > min_size:
+                size = QtCore.QSize(max(1, size.width() // 2), max(1, size.height() // 2))
+                offset = self._offset
+                if image is None:
+                    image = self._read(self._reader(size))
+                else:
+                    image = image.scaled(
+                        max(1, image.width() // 2), max(1, image.height() // 2),
+                        QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation,
+                    )
+                self._append(image)
+                self.levels.append((offset, image.width(), image.height()))
+            self._file.flush()
+        except BaseException:
+            self.close()
+            raise
+
+    def level_size(self, level: int) -> QtCore.QSize:
+        _, width, height = self.levels[level]
+        return QtCore.QSize(width, height)
+
+    def read_tile(self, level: int, rect: QtCore.QRect) -> QtGui.QImage:
+        offset, width, _ = self.levels[level]
+        tile = QtGui.QImage(rect.width(), rect.height(), self.format)
+        bits = tile.bits()
+        bits.setsize(tile.sizeInBytes())
+        view = memoryview(bits)
+        rowBytes = rect.width() * BYTES_PER_PIXEL
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Pyramid is closed")
+            for row in range(rect.height()):
+                self._file.seek(offset + ((rect.y() + row) * width + rect.x()) * BYTES_PER_PIXEL)
+                start = row * tile.bytesPerLine()
+                self._file.readinto(view[start:start + rowBytes])
+        return tile
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class ViewerSignals(QtCore.QObject):
+    pyramid = QtCore.pyqtSignal(str, object)
+    tile = QtCore.pyqtSignal(tuple)
+
+
+class PyramidJob(QtCore.QRunnable):
+    def __init__(self, filename: str, minSize: int, signals: ViewerSignals) -> None:
+        super().__init__()
+
+        self.filename = filename
+        self.minSize = minSize
+        self.signals = signals
+
+    def run(self) -> None:
+        from core.logger import logger
+
+        try:
+            pyramid = RasterPyramid(self.filename, self.minSize)
+        except Exception as e:
+            logger.error(f"Cannot open {self.filename} for zooming: {e}")
+            pyramid = None
+        self.signals.pyramid.emit(self.filename, pyramid)
+
+
+class TileJob(QtCore.QRunnable):
+    def __init__(
+        self,
+        pyramid: RasterPyramid,
+        key: TileKey,
+        rect: QtCore.QRect,
+        cache: TileCache,
+        signals: ViewerSignals,
+    ) -> None:
+        super().__init__()
+
+        self.pyramid = pyramid
+        self.key = key
+        self.rect = rect
+        self.cache = cache
+        self.signals = signals
+
+    def run(self) -> None:
+        try:
+            self.cache.put(self.key, self.pyramid.read_tile(self.key[1], self.rect))
+        except ValueError:
+            pass
+        self.signals.tile.emit(self.key)
+
+
+class ImageViewer(QtWidgets.QLabel):
+    """Result pane that shows a preview and zooms into the full image.
+
+    At fit size it is a plain label holding the display sized preview.
+    Scrolling zooms around the cursor and dragging pans, the visible part
+    is then painted from tiles of a RasterPyramid level that matches the
+    zoom, decoded in the background and kept in the shared TileCache.
+    Double click goes back to fit.
+    """
+
+    TILE_SIZE = 256
+    MAX_ZOOM = 8.0
+    ZOOM_STEP = 1.25
+
+    def __init__(
+        self,
+        parent: typing.Optional[QtWidgets.QWidget] = None,
+        width: typing.Optional[int] = None,
+        height: typing.Optional[int] = None,
+    ) -> None:
+        super().__init__(parent=parent)
+
+        self.setContentsMargins(0, 0, 0, 0)
+        if width: self.setFixedWidth(width)
+        if height: self.setFixedHeight(height)
+
+        config = get_config("viewer")
+        self.tileSize = config.get("tile_size", self.TILE_SIZE)
+        self.maxZoom = config.get("max_zoom", self.MAX_ZOOM)
+
+        self.filename: typing.Optional[str] = None
+        self.preview: typing.Optional[QtGui.QImage] = None
+        self.sourceSize = QtCore.QSize()
+        self.pyramid: typing.Optional[RasterPyramid] = None
+        self.scale: typing.Optional[float] = None
+        self.center = QtCore.QPointF()
+
+        self._dragStart: typing.Optional[QtCore.QPoint] = None
+        self._building: typing.Optional[str] = None
+        self._requested: typing.Set[TileKey] = set()
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = ViewerSignals()
+        self.signals.pyramid.connect(self.on_pyramid)
+        self.signals.tile.connect(self.on_tile)
+
+        self.destroyed.connect(lambda: self.release())
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.release)
+
+    @property
+    def cache(self) -> TileCache:
+        return get_tile_cache()
+
+    def set_image(self, filename: str, preview: QtGui.QImage) -> None:
+        self.release()
+        self.filename = filename
+        self.sourceSize = QtGui.QImageReader(filename).size()
+        self.preview = preview
+        self.setPixmap(QtGui.QPixmap.fromImage(preview))
+        self.reset_zoom()
+
+    def clear(self) -> None:
+        self.release()
+        self.filename, self.preview, self.sourceSize = None, None, QtCore.QSize()
+        self.reset_zoom()
+        super().clear()
+
+    def swap(self, other: "ImageViewer") -> None:
+        for name in ("filename", "preview", "sourceSize", "pyramid", "_building"):
+            value = getattr(self, name)
+            setattr(self, name, getattr(other, name))
+            setattr(other, name, value)
+        for viewer in (self, other):
+            viewer._requested.clear()
+            viewer.reset_zoom()
+            if viewer.preview is None:
+                QtWidgets.QLabel.clear(viewer)
+            else:
+                viewer.setPixmap(QtGui.QPixmap.fromImage(viewer.preview))
+
+    def release(self) -> None:
+        if self.pyramid is not None:
+            self.cache.discard(self.pyramid.key)
+            self.pyramid.close()
+            self.pyramid = None
+        self._building = None
+        self._requested.clear()
+
+    def reset_zoom(self) -> None:
+        self.scale = None
+        self.center = QtCore.QPointF(self.sourceSize.width() / 2, self.sourceSize.height() / 2)
+        self.update()
+
+    def fit_scale(self) -> float:
+        if self.sourceSize.isEmpty():
+            return 1.0
+        return min(self.width() / self.sourceSize.width(), self.height() / self.sourceSize.height())
+
+    def to_source(self, point: QtCore.QPointF) -> QtCore.QPointF:
+        viewCenter = QtCore.QPointF(self.width() / 2, self.height() / 2)
+        return self.center + (point - viewCenter) / self.scale
+
+    def clamp_center(self) -> None:
+        self.center = QtCore.QPointF(
+            min(max(self.center.x(), 0.0), float(self.sourceSize.width())),
+            min(max(self.center.y(), 0.0), float(self.sourceSize.height())),
+        )
+
+    def wheelEvent(self, event: QtGui.QWheelEvent) -> None:
+        if self.preview is None or self.sourceSize.isEmpty():
+            return
+        fit = self.fit_scale()
+        scale = self.scale or fit
+        steps = event.angleDelta().y() / 120
+        newScale = min(self.maxZoom, scale * self.ZOOM_STEP ** steps)
+        if newScale <= fit:
+            self.reset_zoom()
+            return
+
+        if self.scale is None:
+            self.scale = fit
+        anchor = self.to_source(QtCore.QPointF(event.pos()))
+        self.scale = newScale
+        self.center = anchor - (anchor - self.center) * (scale / newScale)
+        self.clamp_center()
+        self.ensure_pyramid()
+        self.update()
+
+    def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
+        if event.button() == QtCore.Qt.LeftButton and self.scale is not None:
+            self._dragStart = event.pos()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event: QtGui.QMouseEvent) -> None:
+        if self._dragStart is not None and self.scale is not None:
+            delta = event.pos() - self._dragStart
+            self._dragStart = event.pos()
+            self.center -= QtCore.QPointF(delta) / self.scale
+            self.clamp_center()
+            self.update()
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event: QtGui.QMouseEvent) -> None:
+        self._dragStart = None
+        super().mouseReleaseEvent(event)
+
+    def mouseDoubleClickEvent(self, event: QtGui.QMouseEvent) -> None:
+        self.reset_zoom()
+        super().mouseDoubleClickEvent(event)
+
+    def ensure_pyramid(self) -> None:
+        if self.pyramid is not None or self._building == self.filename or self.filename is None:
+            return
+        if self.preview.width() >= self.sourceSize.width() and self.preview.height() >= self.sourceSize.height():
+            return
+        self._building = self.filename
+        self.pool.start(PyramidJob(self.filename, max(self.preview.width(), self.preview.height()), self.signals))
+
+    def on_pyramid(self, filename: str, pyramid: typing.Optional[RasterPyramid]) -> None:
+        if pyramid is None:
+            return
+        if filename != self._building or self.pyramid is not None:
+            pyramid.close()
+            return
+        self._building = None
+        self.pyramid = pyramid
+        self.sourceSize = pyramid.size
+        self.update()
+
+    def on_tile(self, key: TileKey) -> None:
+        self._requested.discard(key)
+        if self.pyramid is not None and key[0] == self.pyramid.key:
+            self.update()
+
+    def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+        if self.scale is None or self.preview is None:
+            super().paintEvent(event)
+            return
+
+        painter = QtGui.QPainter(self)
+        option = QtWidgets.QStyleOption()
+        option.initFrom(self)
+        self.style().drawPrimitive(QtWidgets.QStyle.PE_Widget, option, painter, self)
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, self.scale < 1)
+
+        topLeft = self.to_source(QtCore.QPointF(0, 0))
+        toView = lambda x, y: QtCore.QPointF((x - topLeft.x()) * self.scale, (y - topLeft.y()) * self.scale)
+        imageRect = QtCore.QRectF(toView(0, 0), toView(self.sourceSize.width(), self.sourceSize.height()))
+        painter.drawImage(imageRect, self.preview)
+
+        if self.pyramid is not None:
+            self.paint_tiles(painter, topLeft, toView)
+        painter.end()
+
+    def paint_tiles(
+        self,
+        painter: QtGui.QPainter,
+        topLeft: QtCore.QPointF,
+        toView: typing.Callable[[float, float], QtCore.QPointF],
+    ) -> None:
+        pyramid = self.pyramid
+        level = min(len(pyramid.levels) - 1, max(0, int(math.floor(math.log2(1 / self.scale))) - pyramid.reduced))
+        levelSize = pyramid.level_size(level)
+        factorX = self.sourceSize.width() / levelSize.width()
+        factorY = self.sourceSize.height() / levelSize.height()
+
+        visible = QtCore.QRectF(topLeft, QtCore.QSizeF(self.width() / self.scale, self.height() / self.scale))
+        tile = self.tileSize
+        firstColumn = max(0, int(visible.left() / factorX) // tile)
+        lastColumn = min((levelSize.width() - 1) // tile, int(visible.right() / factorX) // tile)
+        firstRow = max(0, int(visible.top() / factorY) // tile)
+        lastRow = min((levelSize.height() - 1) // tile, int(visible.bottom() / factorY) // tile)
+
+        cache = self.cache
+        for row in range(firstRow, lastRow + 1):
+            for column in range(firstColumn, lastColumn + 1):
+                key = (pyramid.key, level, column, row)
+                rect = QtCore.QRect(column * tile, row * tile, tile, tile).intersected(QtCore.QRect(QtCore.QPoint(0, 0), levelSize))
+                image = cache.get(key)
+                if image is None:
+                    if key not in self._requested:
+                        self._requested.add(key)
+                        self.pool.start(TileJob(pyramid, key, rect, cache, self.signals))
+                    continue
+                target = QtCore.QRectF(
+                    toView(rect.x() * factorX, rect.y() * factorY),
+                    toView((rect.right() + 1) * factorX, (rect.bottom() + 1) * factorY),
+                )
+                painter.drawImage(target, image)
@@ -1,111 +1,97 @@
 import os
 import sys
-import base64
+import time
 import typing
 
 from PyQt5 import QtWidgets, QtGui, QtCore
 
 from core.gui.ui import UI
-from core.utils import get_models
-from core.api.generators import TextToImage, ControlNet, UpScale, FaceFix
-
-
-class ImageGeneratorThread(QtCore.QThread):
-    b64_ready = QtCore.pyqtSignal(str)
-    seed_ready = QtCore.pyqtSignal(str, int)
-    finish = QtCore.pyqtSignal()
-    
-    def __init__(
-        self, 
-        model: str,
-        prompt: typing.Optional[str] = None,
-        negativePrompt: typing.Optional[str] = None,
-        currentGeneratorType: str = "Text to Image",
-        image: typing.Optional[str] = None,
-        condition: typing.Optional[str] = None,
-        height: typing.Optional[int] = None,
-        width: typing.Optional[int] = None,
-        steps: typing.Optional[int] = None,
-        guidance: typing.Optional[int] = None,
-        scheduler: typing.Optional[str] = None,
-    ):
-        super().__init__()
-        
-        self.prompt = prompt
-        self.negativePrompt = negativePrompt
-        self.model = model
-        self.image = image
-        self.condition = condition
-        self.generatorType = currentGeneratorType
-        self.height = height
-        self.width = width
-        self.steps = steps
-        self.guidance = guidance
-        self.scheduler = scheduler
-        
-    def run(self) -> None:
-        if self.generatorType == "Text to Image":
-            b64, seed = TextToImage(
-                prompt=self.prompt,
-                negative_prompt=self.negativePrompt,
-                model=self.model,
-                height=self.height,
-                width=self.width,
-                steps=self.steps,
-                guidance=self.guidance,
-                scheduler=self.scheduler
-            ).generate_image()
-        
-        elif self.generatorType == "ControlNet":
-            b64, seed = ControlNet(
-                prompt=self.prompt,
-                negative_prompt=self.negativePrompt,
-                model=self.model,
-                image=self.image,
-                condition=self.condition,
-                height=self.height,
-                width=self.width,
-                steps=self.steps,
-                guidance=self.guidance,
-                scheduler=self.scheduler
-            ).generate_image()
-        
-        elif self.generatorType == "UpScale":
-            b64, seed = UpScale(model=self.model, image=self.image).generate_image()
-            
-        elif self.generatorType == "FaceFix":
-            b64, seed = FaceFix(model=self.model, image=self.image).generate_image()
-        
-        self.b64_ready.emit(b64)
-        self.seed_ready.emit(b64, seed)
-        self.finish.emit()
+from core.gui.jobs import GeneratorJob, JobQueue, PreviewJob, PreviewSignals, ModelRefreshJob
+from core.gui.gallery import GalleryWindow
+from core.gui.history import HistoryWindow
+from core.gui.grid import GridWindow
+from core.logger import logger
+from core.profiler import startup
+from core.journal import get_journal
+from core.utils import get_config
+from core.api.models import get_model_registry
+from core.api.metrics import get_metrics
+from core.api.batch import variant_seeds
 
 
 class MainWindow(UI):
     IMG_FOLDER = os.path.join(os.path.expanduser("~"), "Pictures")
+    MODEL_REFRESH_DELAY_MS = 1000
+    METRICS_INTERVAL_MS = 1000
     
     def __init__(self) -> None:
-        super().__init__()
+        with startup.measure("UI"):
+            super().__init__()
         
-        self.models = get_models()
+        with startup.measure("model registry"):
+            self.registry = get_model_registry()
+        self.gallery = None
+        self.history = None
+        self.grid = None
         self.imgDirectory.setText(self.IMG_FOLDER)
         
-        self.init_logic()
-        self.init_hotkey()
-        self.setup_models()
+        with startup.measure("init_queue"):
+            self.init_queue()
+        with startup.measure("init_preview"):
+            self.init_preview()
+        with startup.measure("init_metrics"):
+            self.init_metrics()
+        with startup.measure("init_logic"):
+            self.init_logic()
+        with startup.measure("init_hotkey"):
+            self.init_hotkey()
+        with startup.measure("setup_models"):
+            self.setup_models()
+        with startup.measure("resume_jobs"):
+            self.resume_jobs()
+        QtCore.QTimer.singleShot(self.MODEL_REFRESH_DELAY_MS, self.refresh_models)
     
     def _format_text(self, text: str) -> str:
         text = text.strip()
         text = " ".join(word for word in text.split())
         return text
     
-    def _save_image(self, b64: str, seed: str) -> None:
-        if not os.path.exists(self.IMG_FOLDER):
-            os.makedirs(self.IMG_FOLDER)
+    def init_queue(self) -> None:
+        config = get_config("queue")
+        slots = config.get("slots", 4)
+        
+        self.jobQueue = JobQueue(self.jobList, slots=slots, parent=self)
+        self.jobQueue.activeChanged.connect(self.update_worker_status)
+        
+        self.buttonSlots.addItems([f"Slots: {n}" for n in range(1, config.get("max_slots", 8) + 1)])
+        self.buttonSlots.setCurrentIndex(slots - 1)
+        self.buttonSlots.currentIndexChanged.connect(lambda idx: self.jobQueue.set_slots(idx + 1))
+    
+    def init_preview(self) -> None:
+        self.previewPool = QtCore.QThreadPool(self)
+        self.previewPool.setMaxThreadCount(2)
+        self.previewSignals = PreviewSignals()
+        self.previewSignals.ready.connect(self.show_preview)
+    
+    def init_metrics(self) -> None:
+        self.metrics = get_metrics()
+        if self.metrics is None:
+            self.metricsLabel.hide()
+            return
         
-        filepath = (f"{self.IMG_FOLDER}\\{seed}.png")
-        with open(filepath, "wb") as file:
-            file.write(base64.b64decode(b64.encode()))
+        self.metricsTimer = QtCore.QTimer(self)
+        self.metricsTimer.timeout.connect(self.update_metrics_readout)
+        self.metricsTimer.start(self.METRICS_INTERVAL_MS)
+        self.update_metrics_readout()
+    
+    def update_metrics_readout(self) -> None:
+        snapshot = self.metrics.snapshot()
+        formatSeconds = lambda x: "-" if x is None else f"{x:.1f}s"
+        self.metricsLabel.setText(
+            f"{snapshot['per_minute']:.1f} req/min, {snapshot['in_flight']} active\n"
+            f"p50 {formatSeconds(snapshot['p50'])}  p95 {formatSeconds(snapshot['p95'])}\n"
+            f"{snapshot['bytes_per_second'] / 1024:.1f} KB/s, {snapshot['errors']} errors"
+        )
     
     def init_logic(self) -> None:
         self.buttonGenerate.pressed.connect(self.generate_image)
@@ -114,6 +100,9 @@ class MainWindow(UI):
         self.buttonClearImgs.pressed.connect(self.clear_imgs)
         self.buttonSwapImgs.pressed.connect(self.swap_imgs)
         self.buttonImgDirectory.pressed.connect(self.set_image_dict)
+        self.buttonGallery.pressed.connect(self.show_gallery)
+        self.buttonHistory.pressed.connect(self.show_history)
+        self.buttonGrid.pressed.connect(self.show_grid)
     
     def init_hotkey(self) -> None:
         self.key_esc = QtWidgets.QShortcut(QtGui.QKeySequence("Esc"), self)
@@ -122,6 +111,9 @@ class MainWindow(UI):
         self.key_swap = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+S"), self)
         self.key_prompt = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+1"), self)
         self.key_nprompt = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+2"), self)
+        self.key_gallery = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+G"), self)
+        self.key_history = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+H"), self)
+        self.key_grid = QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+R"), self)
         
         self.key_esc.activated.connect(QtWidgets.qApp.quit)
         self.key_gen.activated.connect(self.generate_image)
@@ -129,85 +121,109 @@ class MainWindow(UI):
         self.key_swap.activated.connect(self.swap_imgs)
         self.key_prompt.activated.connect(self.prompt.setFocus)
         self.key_nprompt.activated.connect(self.negativePrompt.setFocus)
+        self.key_gallery.activated.connect(self.show_gallery)
+        self.key_history.activated.connect(self.show_history)
+        self.key_grid.activated.connect(self.show_grid)
         
     def setup_models(self) -> None:
-        self.buttonGenerateType.addItems(list(self.models.keys())[:-2])
-        self.buttonGenerateType.setCurrentText(list(self.models.keys())[0])
+        self.buttonScheduler.addItems(self.registry.schedulers)
+        self.buttonCondition.addItems(self.registry.conditions)
+        self.buttonGenerateType.addItems(self.registry.generators)
+        self.buttonGenerateType.setCurrentText(self.registry.generators[0])
     
-    def start_worker(self) -> None:
-        self.buttonGenerate.setEnabled(False)
-        self.buttonGenerate.hide()
-        self.loadingAnim.show()
-        self.loadingMovie.start()
-        
-    def stop_worker(self) -> None:
-        self.worker.quit()
-        self.worker.wait()
-        
-        self.loadingMovie.stop()
-        self.loadingAnim.hide()
-        self.buttonGenerate.show()
-        self.buttonGenerate.setEnabled(True)
+    def refresh_models(self) -> None:
+        job = ModelRefreshJob(self.registry)
+        job.signals.finished.connect(self.on_models_refreshed)
+        self.modelRefreshJob = job
+        QtCore.QThreadPool.globalInstance().start(job)
     
-    def generate_image(self) -> None:
+    def on_models_refreshed(self, changed: bool) -> None:
+        self.modelRefreshJob = None
+        if changed:
+            self.update_opts_buttons()
+    
+    def update_worker_status(self, active: int) -> None:
+        if active:
+            self.loadingAnim.show()
+            self.loadingMovie.start()
+        else:
+            self.loadingMovie.stop()
+            self.loadingAnim.hide()
+    
+    def read_options(self) -> typing.Dict:
         convertToFloat = lambda x: float(x.text()) if x.text() else None
         validateSize = lambda x: int(x) if x is not None and 256 <= x <= 1024  else None
         validateSteps = lambda x: int(x) if x is not None and 1 <= x <= 100 else None
         validateGuidance = lambda x: float(x) if x is not None and 0.0 <= x <= 20.0 else None
+        validateBatch = lambda x: int(x) if x is not None and 1 <= x <= 16 else 1
+        validateSeed = lambda x: int(x) if x is not None and x >= 0 else None
         
         currentGeneratorType = self.buttonGenerateType.currentText()
-        prompt = self._format_text(self.prompt.toPlainText())
-        negativePrompt = self._format_text(self.negativePrompt.toPlainText())
-        model = self.buttonModel.currentText()
-        image = self.leftImgB64
-        condition = self.buttonCondition.currentText()
-        height = validateSize(convertToFloat(self.inputHeight))
-        width = validateSize(convertToFloat(self.inputWidth))
-        steps = validateSteps(convertToFloat(self.inputSteps))
-        guidance = validateGuidance(convertToFloat(self.inputGuidance))
-        scheduler = self.buttonScheduler.currentText()
-                
-        if not prompt and currentGeneratorType not in {"UpScale", "FaceFix"}:
+        options = {
+            "currentGeneratorType": currentGeneratorType,
+            "prompt": self._format_text(self.prompt.toPlainText()),
+            "negativePrompt": self._format_text(self.negativePrompt.toPlainText()),
+            "model": self.buttonModel.currentText(),
+            "imagePath": self.leftImgPath if self.registry.generator(currentGeneratorType).image else None,
+            "condition": self.buttonCondition.currentText(),
+            "height": validateSize(convertToFloat(self.inputHeight)),
+            "width": validateSize(convertToFloat(self.inputWidth)),
+            "steps": validateSteps(convertToFloat(self.inputSteps)),
+            "guidance": validateGuidance(convertToFloat(self.inputGuidance)),
+            "scheduler": self.buttonScheduler.currentText(),
+            "batch": 1,
+            "seed": None,
+        }
+        
+        if currentGeneratorType in {"Text to Image", "ControlNet"}:
+            options["batch"] = validateBatch(convertToFloat(self.inputBatch))
+            options["seed"] = validateSeed(convertToFloat(self.inputSeed))
+        return options
+    
+    def generate_image(self) -> None:
+        options = self.read_options()
+        batch, seed = options.pop("batch"), options.pop("seed")
+        
+        if not options["prompt"] and options["currentGeneratorType"] not in {"UpScale", "FaceFix"}:
             return
         
-        self.start_worker()
-        self.worker = ImageGeneratorThread(
-            model=model, 
-            prompt=prompt, 
-            negativePrompt=negativePrompt, 
-            image=image,
-            condition=condition,
-            currentGeneratorType=currentGeneratorType,
-            height=height,
-            width=width,
-            steps=steps,
-            guidance=guidance,
-            scheduler=scheduler,
-        )
-        if currentGeneratorType == "Text to Image":
-            self.worker.b64_ready.connect(self.update_left_img)
+        for variantSeed in variant_seeds(batch, seed):
+            job = GeneratorJob(directory=self.IMG_FOLDER, seed=variantSeed, **options)
+            self.submit_job(job)
+                
+    
+    def submit_job(self, job: GeneratorJob) -> None:
+        if job.generatorType == "Text to Image":
+            job.signals.file_ready.connect(self.update_left_img)
         else:
-            self.worker.b64_ready.connect(self.update_right_img)
+            job.signals.file_ready.connect(self.update_right_img)
         
-        self.worker.seed_ready.connect(self._save_image)
-        self.worker.finish.connect(self.stop_worker)
-        self.worker.start()
-                
+        self.jobQueue.submit(job)
+    
+    def resume_jobs(self) -> None:
+        journal = get_journal()
+        if journal is None:
+            return
+        
+        for journalId, spec in journal.unfinished("gui"):
+            logger.info(f"Resuming job {journalId}")
+            job = GeneratorJob(**spec)
+            job.journalId = journalId
+            self.submit_job(job)
     
     def update_opts_buttons(self) -> None:
         currentModel = self.buttonModel.currentText()
         currentGenerateType = self.buttonGenerateType.currentText()
         
-        self.buttonScheduler.addItems(self.models["Scheduler"]["models"])
+        generator = self.registry.generator(currentGenerateType)
+        
         self.buttonModel.clear()
-        self.buttonModel.addItems(self.models[currentGenerateType]["models"])
-        self.buttonCondition.clear()
-        self.buttonCondition.addItems(self.models["Condition"]["models"])
+        self.buttonModel.addItems(generator.models)
         
         self.buttonModel.setCurrentText(currentModel)
         
-        self.buttonOpenImg.setEnabled(self.models[currentGenerateType]["image"])
-        self.buttonCondition.setEnabled(self.models[currentGenerateType]["condition"])
+        self.buttonOpenImg.setEnabled(generator.image)
+        self.buttonCondition.setEnabled(generator.condition)
         
         if currentGenerateType in {"Text to Image", "ControlNet"}:
             self.inputWidth.setEnabled(True)
@@ -215,6 +231,8 @@ class MainWindow(UI):
             self.inputSteps.setEnabled(True)
             self.inputGuidance.setEnabled(True)
             self.inputStrength.setEnabled(True)
+            self.inputBatch.setEnabled(True)
+            self.inputSeed.setEnabled(True)
             self.buttonScheduler.setEnabled(True)
         else:
             self.inputWidth.setEnabled(False)
@@ -222,6 +240,8 @@ class MainWindow(UI):
             self.inputSteps.setEnabled(False)
             self.inputGuidance.setEnabled(False)
             self.inputStrength.setEnabled(False)
+            self.inputBatch.setEnabled(False)
+            self.inputSeed.setEnabled(False)
             self.buttonScheduler.setEnabled(False)
 
     def open_image(self) -> None:
@@ -229,44 +249,101 @@ class MainWindow(UI):
             self, "Open", self.IMG_FOLDER, "Image File (*.png; *.jpeg; *.jpg)"
         )
         if filename:
-            self.update_left_img(filename=filename)
+            self.update_left_img(filename)
 
-    def convert_to_pixmap(self, b64: str) -> QtGui.QPixmap:
-        pixmap = QtGui.QPixmap()
-        pixmap.loadFromData(QtCore.QByteArray.fromBase64(b64.encode()))
-        return pixmap
+    def load_preview(self, filename: str) -> None:
+        self.previewPool.start(PreviewJob(filename, self.previewSignals))
 
-    def update_left_img(self, b64: str = None, filename: str = None) -> None:
-        if filename:
-            with open(filename, "rb") as f:
-                self.leftImgB64 = base64.b64encode(f.read()).decode()
-            pixmap = QtGui.QPixmap(filename)
-        elif b64:
-            self.leftImgB64 = b64
-            pixmap = self.convert_to_pixmap(b64)
-        if pixmap.width() < pixmap.height():
-            pixmap = pixmap.scaledToHeight(pixmap.width())
+    def show_preview(self, filename: str, image: QtGui.QImage) -> None:
+        if image.isNull():
+            return
+        start = time.perf_counter()
+        if filename == self.leftImgPath:
+            self.leftImg.set_image(filename, image)
+        if filename == self.rightImgPath:
+            self.rightImg.set_image(filename, image)
+        if self.metrics is not None:
+            self.metrics.observe("ui", time.perf_counter() - start, "gui")
+
+    def update_left_img(
+        self,
+        filename: str,
+        seed: typing.Optional[int] = None,
+        image: typing.Optional[QtGui.QImage] = None,
+    ) -> None:
+        self.leftImgPath = filename
+        if image is None:
+            self.load_preview(filename)
         else:
-            pixmap = pixmap.scaledToWidth(pixmap.height())
-        self.leftImg.setPixmap(pixmap)
+            self.show_preview(filename, image)
 
-    def update_right_img(self, b64: str) -> None:
-        self.rightImgB64 = b64
-        pixmap = self.convert_to_pixmap(b64)
-        self.rightImg.setPixmap(pixmap)
+    def update_right_img(
+        self,
+        filename: str,
+        seed: typing.Optional[int] = None,
+        image: typing.Optional[QtGui.QImage] = None,
+    ) -> None:
+        self.rightImgPath = filename
+        if image is None:
+            self.load_preview(filename)
+        else:
+            self.show_preview(filename, image)
 
     def clear_imgs(self) -> None:
         self.leftImg.clear()
         self.rightImg.clear()
+        self.leftImgPath, self.rightImgPath = None, None
         
     def swap_imgs(self) -> None:
-        try:
-            left_img = self.leftImg.pixmap().copy()
-            right_img = self.rightImg.pixmap().copy()
-        except AttributeError:
-            return
-        self.leftImg.setPixmap(right_img)
-        self.rightImg.setPixmap(left_img)
+        self.leftImg.swap(self.rightImg)
+        self.leftImgPath, self.rightImgPath = self.rightImgPath, self.leftImgPath
+    
+    def show_gallery(self) -> None:
+        if self.gallery is None:
+            self.gallery = GalleryWindow(self)
+            self.gallery.imageSelected.connect(self.update_left_img)
+        self.gallery.open_folder(self.IMG_FOLDER)
+        self.gallery.show()
+        self.gallery.raise_()
+    
+    def show_history(self) -> None:
+        if self.history is None:
+            self.history = HistoryWindow(self)
+            self.history.paramsSelected.connect(self.load_params)
+        self.history.open_folder(self.IMG_FOLDER)
+        self.history.show()
+        self.history.raise_()
+    
+    def show_grid(self) -> None:
+        if self.grid is None:
+            self.grid = GridWindow(self)
+        self.grid.open_options(self.read_options(), self.IMG_FOLDER)
+        self.grid.show()
+        self.grid.raise_()
+    
+    def load_params(self, params: typing.Dict, filename: typing.Optional[str] = None) -> None:
+        setNumber = lambda widget, key: widget.setText("" if params.get(key) is None else str(params[key]))
+        
+        generatorType = params.get("generator")
+        if generatorType in self.registry.generators:
+            self.buttonGenerateType.setCurrentText(generatorType)
+        if params.get("model"):
+            self.buttonModel.setCurrentText(params["model"])
+        if params.get("controlnet"):
+            self.buttonCondition.setCurrentText(params["controlnet"])
+        if params.get("scheduler"):
+            self.buttonScheduler.setCurrentText(params["scheduler"])
+        
+        self.prompt.setPlainText(params.get("prompt") or "")
+        self.negativePrompt.setPlainText(params.get("negative_prompt") or "")
+        setNumber(self.inputWidth, "width")
+        setNumber(self.inputHeight, "height")
+        setNumber(self.inputSteps, "steps")
+        setNumber(self.inputGuidance, "guidance")
+        setNumber(self.inputSeed, "seed")
+        
+        if filename and os.path.exists(filename):
+            self.update_right_img(filename)
         
     def set_image_dict(self) -> None:
         folder_name = QtWidgets.QFileDialog.getExistingDirectory(
@@ -281,7 +358,17 @@ class MainWindow(UI):
 
         
 def start_app() -> None:
-    app = QtWidgets.QApplication(sys.argv)
-    window = MainWindow()
-    window.show()
+    with startup.measure("QApplication"):
+        app = QtWidgets.QApplication(sys.argv)
+    with startup.measure("MainWindow"):
+        window = MainWindow()
+    with startup.measure("show"):
+        window.show()
+    
+    if startup.enabled:
+        with startup.measure("first paint"):
+            app.processEvents()
+        print(startup.report())
+        sys.exit(0)
+    
     sys.exit(app.exec_())
@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import time
+import shlex
+import typing
+import sqlite3
+import threading
+import dataclasses
+from pathlib import Path
+
+from core.paths import DATA_DIR
+from core.utils import get_config
+from core.api.metadata import read_metadata
+
+
+IMAGE_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".webp"})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    generator TEXT,
+    model TEXT,
+    prompt TEXT,
+    negative_prompt TEXT,
+    controlnet TEXT,
+    scheduler TEXT,
+    width INTEGER,
+    height INTEGER,
+    steps INTEGER,
+    guidance REAL,
+    scale INTEGER,
+    seed INTEGER,
+    params TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_model ON images (model COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS images_created ON images (created);
+CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5 (
+    prompt, negative_prompt, content='images', content_rowid='id'
+);
+CREATE TABLE IF NOT EXISTS scanned (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scanned_dir ON scanned (dir);
+CREATE TRIGGER IF NOT EXISTS images_ai AFTER INSERT ON images BEGIN
+    INSERT INTO images_fts (rowid, prompt, negative_prompt) VALUES (new.id, new.prompt, new.negative_prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS images_ad AFTER DELETE ON images BEGIN
+    INSERT INTO images_fts (images_fts, rowid, prompt, negative_prompt)
+    VALUES ('delete', old.id, old.prompt, old.negative_prompt);
+END;
+"""
+
+TEXT_FIELDS = {
+    "generator": "generator",
+    "model": "model",
+    "scheduler": "scheduler",
+    "condition": "controlnet",
+    "controlnet": "controlnet",
+}
+NUMBER_FIELDS = {
+    "width": "width",
+    "height": "height",
+    "steps": "steps",
+    "guidance": "guidance",
+    "scale": "scale",
+    "seed": "seed",
+}
+FTS_FIELDS = {
+    "prompt": "prompt",
+    "negative": "negative_prompt",
+    "negative_prompt": "negative_prompt",
+}
+FILTER = re.compile(r"^(\w+)(>=|<=|!=|:|=|>|<)(.*)$", re.S)
+
+
+@dataclasses.dataclass
+class HistoryEntry:
+    path: str
+    params: typing.Dict
+    created: float
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+
+def _fts_term(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"*'
+
+
+def parse_query(query: str) -> typing.Tuple[typing.List[str], typing.List[typing.Any]]:
+    """Turn a query like `castle model:dream-shaper-v8 guidance>7` into SQL.
+
+    Bare words and quoted phrases are prefix-matched against the prompt,
+    `negative:` searches the negative prompt and `field<op>value` filters
+    on a parameter. Returns WHERE clauses and their parameters.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        tokens = query.split()
+
+    fts: typing.Dict[str, typing.List[str]] = {}
+    clauses: typing.List[str] = []
+    params: typing.List[typing.Any] = []
+
+    for token in tokens:
+        match = FILTER.match(token)
+        field, op, value = match.groups() if match else (None, None, token)
+        field = field.lower() if field else None
+
+        if field in FTS_FIELDS and op == ":":
+            column = FTS_FIELDS[field]
+        elif field in TEXT_FIELDS and op in {":", "=", "!="}:
+            negate = "NOT " if op == "!=" else ""
+            clauses.append(f"{negate}{TEXT_FIELDS[field]} = ? COLLATE NOCASE")
+            params.append(value)
+            continue
+        elif field in NUMBER_FIELDS:
+            try:
+                number = float(value)
+            except ValueError:
+                raise ValueError(f"'{field}' needs a number, got '{value}'")
+            clauses.append(f"{NUMBER_FIELDS[field]} {'=' if op == ':' else op} ?")
+            params.append(number)
+            continue
+        else:
+            column, value = "prompt", token
+
+        if value.strip():
+            fts.setdefault(column, []).append(_fts_term(value))
+
+    if fts:
+        match_query = " AND ".join(f"{column} : ({' '.join(terms)})" for column, terms in fts.items())
+        clauses.insert(0, "id IN (SELECT rowid FROM images_fts WHERE images_fts MATCH ?)")
+        params.insert(0, match_query)
+    return clauses, params
+
+
+class HistoryIndex:
+    """Full-text searchable index of every generated image and its parameters"""
+
+    def __init__(self, filepath: typing.Optional[os.PathLike] = None) -> None:
+        self.filepath = Path(filepath or DATA_DIR.joinpath("history.sqlite3"))
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.filepath, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls) -> typing.Optional["HistoryIndex"]:
+        config = dict(get_config("history"))
+        if not config.pop("enabled", True):
+            return None
+        return cls(**config)
+
+    def add(self, filepath: os.PathLike, metadata: typing.Dict, created: typing.Optional[float] = None) -> None:
+        path = str(Path(filepath).resolve())
+        row = (
+            path,
+            metadata.get("generator"),
+            metadata.get("model"),
+            metadata.get("prompt"),
+            metadata.get("negative_prompt"),
+            metadata.get("controlnet"),
+            metadata.get("scheduler"),
+            metadata.get("width"),
+            metadata.get("height"),
+            metadata.get("steps"),
+            metadata.get("guidance"),
+            metadata.get("scale"),
+            metadata.get("seed"),
+            json.dumps(metadata),
+            created or time.time(),
+        )
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM images WHERE path = ?", (path,))
+                self._conn.execute(
+                    "INSERT INTO images (path, generator, model, prompt, negative_prompt, controlnet, scheduler, "
+                    "width, height, steps, guidance, scale, seed, params, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def remove(self, filepath: os.PathLike) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM images WHERE path = ?", (str(Path(filepath).resolve()),))
+
+    def import_folder(self, folder: os.PathLike) -> int:
+        """Index images in `folder` that carry metadata but are not indexed yet.
+
+        Every file looked at is remembered with its mtime, including files
+        without metadata, so the next import only reads new or changed files.
+        """
+        folder = str(Path(folder).resolve())
+        with self._lock:
+            scanned = dict(self._conn.execute("SELECT path, mtime_ns FROM scanned WHERE dir = ?", (folder,)))
+            indexed = {path for path, in self._conn.execute("SELECT path FROM images")}
+
+        try:
+            entries = list(os.scandir(folder))
+        except FileNotFoundError:
+            return 0
+
+        count = 0
+        seen = []
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_SUFFIXES or not entry.is_file():
+                continue
+            stat = entry.stat()
+            seen.append((entry.path, folder, stat.st_mtime_ns))
+            if scanned.get(entry.path) == stat.st_mtime_ns:
+                continue
+            if entry.path not in scanned and entry.path in indexed:
+                # Added when it was generated, the metadata is already indexed
+                continue
+            metadata = read_metadata(entry.path)
+            if metadata is not None:
+                self.add(entry.path, metadata, stat.st_mtime)
+                count += 1
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM scanned WHERE dir = ?", (folder,))
+                self._conn.executemany("INSERT INTO scanned (path, dir, mtime_ns) VALUES (?, ?, ?)", seen)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return count
+
+    def search(self, query: str = "", limit: int = 200) -> typing.List[HistoryEntry]:
+        """Return entries matching `query` (see `parse_query`), newest first"""
+        clauses, params = parse_query(query)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path, params, created FROM images {where} ORDER BY created DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [HistoryEntry(path, json.loads(params), created) for path, params, created in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_history: typing.Optional[HistoryIndex] = None
+_history_loaded = False
+_history_lock = threading.Lock()
+
+
+def get_history() -> typing.Optional[HistoryIndex]:
+    global _history, _history_loaded
+    with _history_lock:
+        if not _history_loaded:
+            _history = HistoryIndex.from_config()
+            _history_loaded = True
+        return _history
+
+
+def set_history(history: typing.Optional[HistoryIndex]) -> None:
+    global _history, _history_loaded
+    with _history_lock:
+        _history, _history_loaded = history, True
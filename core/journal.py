@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import typing
+import sqlite3
+import threading
+from pathlib import Path
+
+from core.paths import DATA_DIR
+from core.utils import canonical_hash, get_config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_key TEXT,
+    source TEXT NOT NULL,
+    generator TEXT,
+    spec_hash TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    seed INTEGER,
+    output TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    elapsed REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (job_key);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (source, status);
+"""
+
+
+class JobJournal:
+    """SQLite record of every generation job, written before it is sent"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    UNFINISHED = (PENDING, RUNNING)
+
+    def __init__(self, filepath: typing.Optional[os.PathLike] = None) -> None:
+        self.filepath = Path(filepath or DATA_DIR.joinpath("journal.sqlite3"))
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.filepath, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "payload_hash" in columns:
+            # The column always held the hash of the job spec, not of the request payload
+            self._conn.execute("ALTER TABLE jobs RENAME COLUMN payload_hash TO spec_hash")
+
+    @classmethod
+    def from_config(cls) -> typing.Optional["JobJournal"]:
+        config = dict(get_config("journal"))
+        if not config.pop("enabled", True):
+            return None
+        return cls(**config)
+
+    def _execute(self, sql: str, params: typing.Sequence = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def record(
+        self,
+        spec: typing.Dict,
+        *,
+        source: str,
+        generator: typing.Optional[str] = None,
+        job_key: typing.Optional[str] = None,
+    ) -> int:
+        """Store `spec` as pending, with a hash of it to spot identical jobs"""
+        cursor = self._execute(
+            "INSERT INTO jobs (job_key, source, generator, spec_hash, spec, status, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_key, source, generator, canonical_hash(spec), json.dumps(spec), self.PENDING, time.time()),
+        )
+        return cursor.lastrowid
+
+    def start(self, job_id: int) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1, error = NULL WHERE id = ?",
+            (self.RUNNING, time.time(), job_id),
+        )
+
+    def finish(self, job_id: int, seed: int, output: os.PathLike, elapsed: float) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, seed = ?, output = ?, finished = ?, elapsed = ? WHERE id = ?",
+            (self.DONE, seed, str(output), time.time(), elapsed, job_id),
+        )
+
+    def fail(self, job_id: int, error: str, elapsed: float) -> None:
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished = ?, elapsed = ? WHERE id = ?",
+            (self.FAILED, error, time.time(), elapsed, job_id),
+        )
+
+    def latest(self, job_key: str) -> typing.Optional[sqlite3.Row]:
+        return self._execute(
+            "SELECT * FROM jobs WHERE job_key = ? ORDER BY id DESC LIMIT 1", (job_key,)
+        ).fetchone()
+
+    def reset(self, job_id: int) -> None:
+        self._execute("UPDATE jobs SET status = ? WHERE id = ?", (self.PENDING, job_id))
+
+    def unfinished(self, source: str) -> typing.List[typing.Tuple[int, typing.Dict]]:
+        rows = self._execute(
+            "SELECT id, spec FROM jobs WHERE source = ? AND status IN (?, ?) ORDER BY id",
+            (source, *self.UNFINISHED),
+        ).fetchall()
+        return [(row["id"], json.loads(row["spec"])) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_journal: typing.Optional[JobJournal] = None
+_journal_loaded = False
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> typing.Optional[JobJournal]:
+    global _journal, _journal_loaded
+    with _journal_lock:
+        if not _journal_loaded:
+            _journal = JobJournal.from_config()
+            _journal_loaded = True
+        return _journal
+
+
+def set_journal(journal: typing.Optional[JobJournal]) -> None:
+    global _journal, _journal_loaded
+    with _journal_lock:
+        _journal, _journal_loaded = journal, True
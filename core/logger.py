@@ -1,13 +1,92 @@
 import sys
-from loguru import logger
+import typing
+import hashlib
+import threading
+
+from core.paths import DATA_DIR
+from core.utils import get_config
+
+if typing.TYPE_CHECKING:
+    import loguru
 
 
 LOG_FORMAT = "<green>{time:HH:mm:ss}</green> - <level>{level: <8}</level> - <white>{message}</white>"
+LOG_FILE = DATA_DIR.joinpath("logs", "image_generator.log")
+
+REDACT_LIMIT = 256
+SECRET_KEYS = frozenset({"authorization", "api_key", "password", "token"})
+
+_logger: typing.Optional["loguru.Logger"] = None
+_logger_lock = threading.RLock()
+
+
+def redact(value: typing.Any, limit: int = REDACT_LIMIT) -> typing.Any:
+    """Copy of `value` that is safe and cheap to log.
+
+    Strings and bytes longer than `limit` (base64 images) are replaced by
+    their size and a short hash, values under secret-looking keys are masked.
+    """
+    if isinstance(value, dict):
+        return {
+            key: "<secret>" if str(key).lower() in SECRET_KEYS else redact(item, limit)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, limit) for item in value]
+    if isinstance(value, (str, bytes)) and len(value) > limit:
+        data = value.encode() if isinstance(value, str) else value
+        return f"<{len(data)} bytes sha1:{hashlib.sha1(data).hexdigest()[:12]}>"
+    return value
+
+
+def setup_logger(debug: typing.Optional[bool] = None) -> None:
+    """Configure loguru from the [logging] section of config.toml.
+
+    Sinks are fed from a background queue, the file sink rotates and keeps
+    `retention` old files. `debug` overrides the configured level.
+    """
+    global _logger
+    with _logger_lock:
+        from loguru import logger as loguru_logger
+
+        config = get_config("logging")
+        level = config.get("level", "INFO")
+        if debug is not None:
+            level = "DEBUG" if debug else "INFO"
+        enqueue = config.get("enqueue", True)
+
+        loguru_logger.remove()
+        if sys.stdout is not None:
+            loguru_logger.add(
+                sys.stdout, level=level, format=LOG_FORMAT,
+                enqueue=enqueue, backtrace=False, diagnose=False,
+            )
+        if config.get("file", True):
+            loguru_logger.add(
+                config.get("path") or LOG_FILE,
+                level=level,
+                rotation=config.get("rotation", "10 MB"),
+                retention=config.get("retention", 5),
+                serialize=config.get("serialize", True),
+                encoding="utf-8",
+                enqueue=enqueue,
+                backtrace=False,
+                diagnose=False,
+            )
+        _logger = loguru_logger
+
+
+def get_logger() -> "loguru.Logger":
+    """Import and configure loguru on first use, it is slow to import"""
+    with _logger_lock:
+        if _logger is None:
+            setup_logger()
+        return _logger
 
 
-def setup_logger(debug: bool = False) -> None:
-    logger.remove()
-    logger.add(sys.stdout, level="DEBUG" if debug else "INFO", format=LOG_FORMAT)
+class LazyLogger:
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(_logger or get_logger(), name)
 
 
-setup_logger(True)
\ No newline at end of file
+logger = LazyLogger()
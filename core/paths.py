@@ -16,4 +16,7 @@ GUI_CSS = GUI_DIR.joinpath("css")
 
 IMG_DIR = BASE_DIR.joinpath("images")
 
+CACHE_DIR = Path.home().joinpath(".cache", "image_generator")
+DATA_DIR = Path.home().joinpath(".local", "share", "image_generator")
+
 SETTINGS_DIR = CORE_DIR.joinpath("settings")
\ No newline at end of file
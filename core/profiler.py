@@ -0,0 +1,51 @@
+import sys
+import time
+import typing
+import contextlib
+
+
+HEAVY_MODULES = ("requests", "urllib3", "bs4", "faker", "loguru", "asyncio", "aiohttp")
+
+
+class StartupProfiler:
+    """Wall-clock timings of the steps between process start and first paint"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.steps: typing.List[typing.Tuple[str, int, float, int]] = []
+        self._depth = 0
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def measure(self, name: str) -> typing.Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        index = len(self.steps)
+        self.steps.append((name, self._depth, 0.0, 0))
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.steps[index] = (name, self._depth, time.perf_counter() - start, len(sys.modules) - modules)
+
+    def report(self) -> str:
+        lines = [f"{'step':<40} {'ms':>9} {'modules':>8}"]
+        for name, depth, elapsed, modules in self.steps:
+            lines.append(f"{'  ' * depth + name:<40} {elapsed * 1000:>9.1f} {modules:>8}")
+        lines.append(f"{'total':<40} {(time.perf_counter() - self.origin) * 1000:>9.1f} {len(sys.modules):>8}")
+
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        lines.append(f"heavy modules loaded: {', '.join(loaded) if loaded else 'none'}")
+        return "\n".join(lines)
+
+
+startup = StartupProfiler()
@@ -1,22 +1,11 @@
+import json
+import typing
+import hashlib
 import tomllib
 
-from core import exceptions
 from core.paths import SETTINGS_DIR
 
 
-def get_api_key() -> str:
-    filepath = SETTINGS_DIR.joinpath("api.key")
-    file = open(filepath)
-    try:
-        api_key = file.read()
-        assert api_key, exceptions.NoApiKey
-        return api_key
-    except (FileExistsError, FileNotFoundError):
-        raise exceptions.NoFileWithApiKey
-    finally:
-        file.close()
-
-
 def get_models() -> str:
     filepath = SETTINGS_DIR.joinpath("models.toml")
     file = open(filepath, "rb")
@@ -27,3 +16,18 @@ def get_models() -> str:
         raise e
     finally:
         file.close()
+
+
+def get_config(section: str) -> dict:
+    filepath = SETTINGS_DIR.joinpath("config.toml")
+    try:
+        with open(filepath, "rb") as file:
+            config = tomllib.load(file)
+    except (FileExistsError, FileNotFoundError):
+        return {}
+    return config.get(section, {})
+
+
+def canonical_hash(value: typing.Any) -> str:
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
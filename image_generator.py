@@ -1,3 +1,16 @@
+import sys
+import multiprocessing
+
+from core.profiler import startup
+
+
 if __name__ == "__main__":
-    from core.gui.window import start_app
+    multiprocessing.freeze_support()
+    
+    if "--profile-startup" in sys.argv:
+        sys.argv.remove("--profile-startup")
+        startup.enable()
+    
+    with startup.measure("import core.gui.window"):
+        from core.gui.window import start_app
     start_app()
\ No newline at end of file
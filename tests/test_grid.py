@@ -0,0 +1,37 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from core.api.grid import ParameterGrid
+
+
+class GridSeedTest(unittest.TestCase):
+    def seeds(self, grid: ParameterGrid) -> list:
+        generator = grid.generator = mock.MagicMock()
+        generator.return_value.output_format = "png"
+        generator.return_value.submit_file.return_value = (None, None)
+        with tempfile.TemporaryDirectory() as directory:
+            for cell in grid.cells:
+                grid._generate(cell, Path(directory))
+        return [call.kwargs["seed"] for call in generator.call_args_list]
+
+    def test_cells_share_one_seed(self) -> None:
+        grid = ParameterGrid({"steps": [10, 20], "guidance": [5.0, 7.5]}, prompt="castle")
+        seeds = self.seeds(grid)
+        self.assertEqual(len(seeds), 4)
+        self.assertIsNotNone(grid.seed)
+        self.assertEqual(set(seeds), {grid.seed})
+
+    def test_given_seed_is_kept(self) -> None:
+        grid = ParameterGrid({"steps": [10, 20], "guidance": [5.0, 7.5]}, prompt="castle", seed=42)
+        self.assertEqual(set(self.seeds(grid)), {42})
+
+    def test_seed_axis(self) -> None:
+        grid = ParameterGrid({"seed": [1, 2], "steps": [10, 20]}, prompt="castle")
+        self.assertIsNone(grid.seed)
+        self.assertEqual(sorted(self.seeds(grid)), [1, 1, 2, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+from core.history import HistoryIndex
+
+
+class HistorySearchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.history = HistoryIndex(self.folder / "history.sqlite3")
+        for created, (name, prompt, negative) in enumerate([
+            ("a.png", "a castle on a hill", "blurry, low quality"),
+            ("b.png", "a castle at night", "watermark"),
+            ("c.png", "a forest path", "blurry"),
+        ]):
+            self.history.add(self.folder / name, {"prompt": prompt, "negative_prompt": negative}, created + 1)
+
+    def tearDown(self) -> None:
+        self.history.close()
+        self.tmp.cleanup()
+
+    def paths(self, query: str) -> list:
+        return [Path(entry.path).name for entry in self.history.search(query)]
+
+    def test_prompt_and_negative_terms(self) -> None:
+        self.assertEqual(self.paths("castle negative:blurry"), ["a.png"])
+
+    def test_single_column(self) -> None:
+        self.assertEqual(self.paths("castle"), ["b.png", "a.png"])
+        self.assertEqual(self.paths("negative:blurry"), ["c.png", "a.png"])
+
+
+class HistoryImportTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name).resolve()
+        self.history = HistoryIndex(self.folder / "history.sqlite3")
+        for name in ("a.png", "b.png"):
+            self.folder.joinpath(name).write_bytes(b"")
+
+    def tearDown(self) -> None:
+        self.history.close()
+        self.tmp.cleanup()
+
+    def test_reads_only_new_or_changed_files(self) -> None:
+        metadata = lambda path: {"prompt": "castle"} if path.endswith("a.png") else None
+        with mock.patch("core.history.read_metadata", side_effect=metadata) as read:
+            self.assertEqual(self.history.import_folder(self.folder), 1)
+            self.assertEqual(read.call_count, 2)
+
+            self.assertEqual(self.history.import_folder(self.folder), 0)
+            self.assertEqual(read.call_count, 2)
+
+            os.utime(self.folder / "b.png", ns=(0, 10**9))
+            self.history.import_folder(self.folder)
+            self.assertEqual([Path(call.args[0]).name for call in read.call_args_list[2:]], ["b.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()